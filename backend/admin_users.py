@@ -0,0 +1,40 @@
+"""Grant or revoke the admin role on an existing account.
+
+    cd backend && python -m admin_users grant <email>
+    cd backend && python -m admin_users revoke <email>
+
+The /api/admin routes check `role: "admin"` on the user document. No API route can set
+it, so an address alone (e.g. from an unverified signup) never carries admin rights.
+"""
+import argparse
+import asyncio
+import sys
+
+ADMIN_ROLE = "admin"
+DEFAULT_ROLE = "traveler"
+
+
+async def _cli(args):
+    # The server module owns the configured database connection
+    import server
+
+    if args.command == "grant":
+        result = await server.db.users.update_one({"email": args.email}, {"$set": {"role": ADMIN_ROLE}})
+    else:
+        # Only demotes admins, so other roles are left as they are
+        result = await server.db.users.update_one({"email": args.email, "role": ADMIN_ROLE}, {"$set": {"role": DEFAULT_ROLE}})
+    server.client.close()
+    if not result.matched_count:
+        sys.exit(f"User {args.email!r} not found" if args.command == "grant" else f"User {args.email!r} is not an admin")
+    print(f"{args.email}: {ADMIN_ROLE if args.command == 'grant' else DEFAULT_ROLE}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", choices=("grant", "revoke"))
+    parser.add_argument("email")
+    asyncio.run(_cli(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
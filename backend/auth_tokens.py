@@ -0,0 +1,109 @@
+"""JWT verification with a verified-token cache and per-user revocation epochs.
+
+Every token carries the user's `token_epoch` at issue time. Bumping the epoch on the
+user document revokes all of that user's earlier tokens. Workers keep the epochs of
+users who have ever revoked (a small set) in memory and refresh them periodically,
+so checking revocation never costs a MongoDB round-trip on the request path.
+"""
+import asyncio
+import hashlib
+import logging
+import time
+from typing import Dict, Optional
+
+import jwt
+from fastapi import HTTPException
+from pymongo import ReturnDocument
+
+from cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+class TokenVerifier:
+
+    def __init__(self, secret_key: str, algorithm: str, max_entries: int = 10000, max_cache_seconds: float = 300.0):
+        self.secret_key = secret_key
+        self.algorithm = algorithm
+        self.max_cache_seconds = max_cache_seconds
+        self.verified = TTLCache(max_entries=max_entries, ttl=max_cache_seconds)
+        self.epochs: Dict[str, int] = {}
+        self.rejected_revoked = 0
+        self.epoch_refreshes = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def _decode(self, token: str) -> dict:
+        try:
+            return jwt.decode(token, self.secret_key, algorithms=[self.algorithm])
+        except jwt.ExpiredSignatureError:
+            raise HTTPException(status_code=401, detail="Token expired")
+        except jwt.InvalidTokenError:
+            raise HTTPException(status_code=401, detail="Invalid token")
+
+    def verify(self, token: str) -> dict:
+        key = hashlib.sha256(token.encode()).digest()
+        payload = self.verified.get(key)
+        now = time.time()
+        if payload is None or payload.get("exp", now) <= now:
+            payload = self._decode(token)
+            if not payload.get("email"):
+                raise HTTPException(status_code=401, detail="Invalid token")
+            # Never cache a token past its own expiry
+            ttl = min(self.max_cache_seconds, payload.get("exp", now) - now)
+            if ttl > 0:
+                self.verified.set(key, payload, ttl=ttl)
+
+        if payload.get("epoch", 0) < self.epochs.get(payload["email"], 0):
+            self.rejected_revoked += 1
+            raise HTTPException(status_code=401, detail="Token revoked")
+        return payload
+
+    # ---------- revocation ----------
+
+    async def revoke_all(self, db, email: str) -> int:
+        user = await db.users.find_one_and_update(
+            {"email": email},
+            {"$inc": {"token_epoch": 1}},
+            projection={"token_epoch": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        epoch = user.get("token_epoch", 0) if user else 0
+        self.epochs[email] = max(self.epochs.get(email, 0), epoch)
+        return epoch
+
+    async def refresh_epochs(self, db):
+        epochs = {}
+        async for user in db.users.find({"token_epoch": {"$gt": 0}}, {"email": 1, "token_epoch": 1}):
+            epochs[user["email"]] = user["token_epoch"]
+        # Epochs only grow; keep a local revoke that raced with this read
+        for email, epoch in self.epochs.items():
+            epochs[email] = max(epochs.get(email, 0), epoch)
+        self.epochs = epochs
+        self.epoch_refreshes += 1
+
+    async def _run(self, db, refresh_seconds: float):
+        while True:
+            try:
+                await self.refresh_epochs(db)
+            except Exception:
+                logger.exception("Token epoch refresh failed")
+            await asyncio.sleep(refresh_seconds)
+
+    def start(self, db, refresh_seconds: float = 30.0):
+        self._task = asyncio.create_task(self._run(db, refresh_seconds))
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def stats(self) -> dict:
+        return {
+            "cache": self.verified.stats(),
+            "revoked_users": len(self.epochs),
+            "rejected_revoked": self.rejected_revoked,
+            "epoch_refreshes": self.epoch_refreshes,
+        }
@@ -0,0 +1,295 @@
+"""Throughput and tail latency of the API routes under concurrent load.
+
+Seeds a benchmark database, runs the app's startup hooks, then drives the real FastAPI
+routes in-process (httpx over ASGI, no network) and reports p50/p95/p99 latency and
+requests/sec per endpoint. Save a run with --output and compare a later one against
+it with --compare; the exit status is 1 when any endpoint regressed.
+
+    cd backend && python -m benchmarks.api_benchmark --mongo mock --chapters 10000
+    cd backend && python -m benchmarks.api_benchmark --output baseline.json
+    cd backend && python -m benchmarks.api_benchmark --compare baseline.json
+
+--mongo local (the default) uses MONGO_URL and drops/reseeds the --db database, which
+must start with "fictionverse_bench" unless --force is given.
+--mongo mock runs against mongomock_motor (pip install mongomock-motor), which is
+handy for comparing code paths but says nothing about MongoDB's own performance.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+from benchmarks.search_benchmark import percentile
+
+GENRES = ["Sci-Fi", "Noir", "Fantasy", "Cyberpunk", "Mystery"]
+WORDS = ("neon shadow signal archive drift ember vault cipher orbit relic harbor lantern "
+         "static glass tide ember circuit echo mirror furnace").split()
+
+BENCH_DB_PREFIX = "fictionverse_bench"
+BENCH_UNIVERSE = "Bench Universe 0"
+BENCH_USER = {"username": "bench", "email": "bench@fictionverse.io", "password": "bench-password"}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mongo", choices=["local", "mock"], default="local")
+    parser.add_argument("--db", default=BENCH_DB_PREFIX, help=f"database to drop and reseed; must start with {BENCH_DB_PREFIX!r}")
+    parser.add_argument("--force", action="store_true", help="drop --db even without the benchmark prefix")
+    parser.add_argument("--universes", type=int, default=50)
+    parser.add_argument("--chapters", type=int, default=10_000, help="chapters in the largest universe")
+    parser.add_argument("--chapter-words", type=int, default=2_000)
+    parser.add_argument("--characters", type=int, default=200)
+    parser.add_argument("--lore", type=int, default=200)
+    parser.add_argument("--forum-posts", type=int, default=5_000)
+    parser.add_argument("--replies", type=int, default=500, help="replies on the hottest thread")
+    parser.add_argument("--requests", type=int, default=500, help="requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--only", help="comma-separated substrings; run matching endpoints only")
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--compare", help="JSON results of an earlier run")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed p95 growth before flagging (0.2 = 20%%)")
+    parser.add_argument("--seed", type=int, default=7)
+    return parser.parse_args()
+
+
+def check_database(args):
+    # The run starts by dropping --db, so a typo must not reach the app database
+    if args.mongo == "local" and not args.force and not args.db.startswith(BENCH_DB_PREFIX):
+        sys.exit(f"refusing to drop {args.db!r}: benchmark databases start with {BENCH_DB_PREFIX!r} (or pass --force)")
+
+
+def configure_environment(args):
+    # Must run before the server module is imported: it reads these at import time
+    os.environ["DB_NAME"] = args.db
+    os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+    os.environ.setdefault("BCRYPT_ROUNDS", "4")
+    # Load comes from one client address; measure the API, not the limiter
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+    if args.mongo == "mock":
+        try:
+            import mongomock_motor
+        except ImportError:
+            sys.exit("--mongo mock needs mongomock-motor: pip install mongomock-motor")
+        import motor.motor_asyncio
+        motor.motor_asyncio.AsyncIOMotorClient = mongomock_motor.AsyncMongoMockClient
+
+
+# ---------- seeding ----------
+
+def text(rng, words):
+    return " ".join(rng.choices(WORDS, k=words))
+
+
+async def insert_batched(collection, docs, batch_size=1000):
+    batch = []
+    for doc in docs:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            await collection.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        await collection.insert_many(batch, ordered=False)
+
+
+async def seed(server, args, rng):
+    from chapter_bodies import detach_body
+
+    db = server.db
+    now = datetime.now(timezone.utc)
+    author = {"author": "Bench Author", "author_email": "author@fictionverse.io"}
+
+    await insert_batched(db.universes, (
+        {"title": f"Bench Universe {n}", "description": text(rng, 40), "type": "Original" if n % 3 else "Inspired",
+         "genre": GENRES[n % len(GENRES)], "status": "active", "is_premium": False,
+         "created_at": (now - timedelta(days=n)).isoformat(), **author}
+        for n in range(args.universes)
+    ))
+
+    # The largest universe carries the long story; bodies go through the chapter body store
+    body = text(rng, args.chapter_words)
+    for start in range(1, args.chapters + 1, 1000):
+        chapters = []
+        for number in range(start, min(start + 1000, args.chapters + 1)):
+            chapter = {"universe_id": BENCH_UNIVERSE, "title": f"Chapter {number}", "content": body,
+                       "chapter_number": number, "status": "published", "created_at": now.isoformat(), **author}
+            detach_body(chapter)
+            chapters.append(chapter)
+        await db.stories.insert_many(chapters, ordered=False)
+        await server.chapter_bodies.save_many({chapter["_id"]: body for chapter in chapters})
+
+    await insert_batched(db.characters, (
+        {"universe_id": BENCH_UNIVERSE, "name": f"Character {n}", "description": text(rng, 30), "role": "supporting",
+         "traits": rng.sample(WORDS, 3), "backstory": text(rng, 120), "created_at": now.isoformat()}
+        for n in range(args.characters)
+    ))
+    await insert_batched(db.lore, (
+        {"universe_id": BENCH_UNIVERSE, "title": f"Lore {n}", "content": text(rng, 200), "category": "history",
+         "created_at": now.isoformat()}
+        for n in range(args.lore)
+    ))
+
+    posts = [
+        {"title": text(rng, 6), "content": text(rng, 80), "category": rng.choice(["General", "Writing", "Theories"]),
+         "tags": rng.sample(WORDS, 2), "replies_count": 0, "first_replies": [],
+         "created_at": (now - timedelta(minutes=n)).isoformat(), "last_activity_at": (now - timedelta(minutes=n)).isoformat(),
+         **author}
+        for n in range(args.forum_posts)
+    ]
+    await insert_batched(db.forum_posts, posts)
+
+    # The newest post is the hot thread
+    hot_thread = str(posts[0]["_id"])
+    replies = [
+        {"post_id": hot_thread, "content": text(rng, 40), "created_at": (now + timedelta(seconds=n)).isoformat(), **author}
+        for n in range(args.replies)
+    ]
+    await insert_batched(db.forum_replies, replies)
+    await db.forum_posts.update_one({"_id": posts[0]["_id"]}, {"$set": {
+        "first_replies": replies[:server.THREAD_FIRST_PAGE],
+        "replies_count": len(replies),
+        "last_activity_at": replies[-1]["created_at"] if replies else posts[0]["created_at"],
+    }})
+    return hot_thread
+
+
+# ---------- load ----------
+
+def endpoints(hot_thread, replies_cursor, args, rng):
+    # name -> (method, path factory, json body factory)
+    chapter = lambda: f"/api/stories/{BENCH_UNIVERSE}/{rng.randint(1, max(1, args.chapters))}"
+    return {
+        "GET /universes": ("GET", lambda: "/api/universes", None),
+        "GET /universes/{id}": ("GET", lambda: f"/api/universes/Bench Universe {rng.randrange(args.universes)}", None),
+        "GET /universes/filter/{genre}": ("GET", lambda: f"/api/universes/filter/{rng.choice(GENRES)}", None),
+        "GET /stories/{universe}": ("GET", lambda: f"/api/stories/{BENCH_UNIVERSE}", None),
+        "GET /stories/{universe}/toc": ("GET", lambda: f"/api/stories/{BENCH_UNIVERSE}/toc?limit=200", None),
+        "GET /stories/{universe}/{chapter}": ("GET", chapter, None),
+        "GET /characters/{universe}": ("GET", lambda: f"/api/characters/{BENCH_UNIVERSE}", None),
+        "GET /lore/{universe}": ("GET", lambda: f"/api/lore/{BENCH_UNIVERSE}", None),
+        "GET /forum/posts": ("GET", lambda: "/api/forum/posts", None),
+        "GET /forum/posts/{hot}": ("GET", lambda: f"/api/forum/posts/{hot_thread}", None),
+        "GET /forum/posts/{hot}/replies": ("GET", lambda: f"/api/forum/posts/{hot_thread}/replies?cursor={replies_cursor or ''}", None),
+        "GET /search": ("GET", lambda: f"/api/search?q={'+'.join(rng.sample(WORDS, 2))}", None),
+        "GET /profile": ("GET", lambda: "/api/profile", None),
+        "POST /forum/replies": ("POST", lambda: "/api/forum/replies", lambda: {"post_id": hot_thread, "content": text(rng, 20)}),
+    }
+
+
+async def drive(client, method, make_path, make_body, total, concurrency):
+    latencies, errors = [], 0
+    remaining = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            path, body = make_path(), make_body() if make_body else None
+            started = time.perf_counter()
+            response = await client.request(method, path, json=body)
+            latencies.append((time.perf_counter() - started) * 1000)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": total,
+        "errors": errors,
+        "rps": round(total / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+    }
+
+
+def compare(results, baseline, threshold):
+    print(f"\n{'endpoint':<34}{'p95 ms':>10}{'base':>10}{'change':>9}{'req/s':>10}{'base':>10}")
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if not before:
+            continue
+        change = (result["p95_ms"] - before["p95_ms"]) / before["p95_ms"] if before["p95_ms"] else 0.0
+        # Sub-millisecond jitter is noise, not a regression
+        regressed = change > threshold and result["p95_ms"] - before["p95_ms"] > 1.0
+        if regressed:
+            regressions.append(name)
+        print(f"{name:<34}{result['p95_ms']:>10.2f}{before['p95_ms']:>10.2f}{change:>+9.0%}"
+              f"{result['rps']:>10.1f}{before['rps']:>10.1f}{'  REGRESSED' if regressed else ''}")
+    return regressions
+
+
+async def run(args):
+    import httpx
+    import server
+
+    rng = random.Random(args.seed)
+    await server.client.drop_database(args.db)
+
+    started = time.perf_counter()
+    hot_thread = await seed(server, args, rng)
+    print(f"seeded {args.universes} universes, {args.chapters:,} chapters, {args.forum_posts:,} posts "
+          f"in {time.perf_counter() - started:.1f}s")
+
+    if args.mongo == "mock":
+        # mongomock has no explain(), and index plans mean nothing to it
+        server.WARMUP_STEPS.remove(server.create_indexes)
+    for handler in server.app.router.on_startup:
+        await handler()
+    await server.startup_profiler.wait_for_warmup()
+    while not server.search_index.ready:
+        await asyncio.sleep(0.1)
+
+    transport = httpx.ASGITransport(app=server.app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            response = await client.post("/api/auth/signup", json=BENCH_USER)
+            if response.status_code >= 400:
+                sys.exit(f"signup failed: {response.text}")
+            thread = (await client.get(f"/api/forum/posts/{hot_thread}")).json()
+
+            selected = endpoints(hot_thread, thread.get("replies_next_cursor"), args, rng)
+            if args.only:
+                wanted = [s.strip() for s in args.only.split(",")]
+                selected = {name: spec for name, spec in selected.items() if any(w in name for w in wanted)}
+
+            print(f"{'endpoint':<34}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+            results = {}
+            for name, (method, make_path, make_body) in selected.items():
+                result = await drive(client, method, make_path, make_body, args.requests, args.concurrency)
+                results[name] = result
+                print(f"{name:<34}{result['rps']:>10.1f}{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}"
+                      f"{result['p99_ms']:>10.2f}{result['errors']:>8}")
+    finally:
+        for handler in server.app.router.on_shutdown:
+            await handler()
+    return results
+
+
+def main():
+    args = parse_args()
+    check_database(args)
+    configure_environment(args)
+    # httpx logs every request at INFO, which would flood the results table
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    results = asyncio.run(run(args))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} endpoint(s) regressed: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
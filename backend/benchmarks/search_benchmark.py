@@ -0,0 +1,89 @@
+"""Query latency of the in-process search index over a synthetic corpus.
+
+    cd backend && python -m benchmarks.search_benchmark --docs 100000
+"""
+import argparse
+import itertools
+import random
+import statistics
+import time
+
+from search import SEARCH_TYPES, SearchIndex
+
+
+def build_vocabulary(size: int, rng: random.Random):
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(letters) for _ in range(rng.randint(3, 10))))
+    words = sorted(words)
+    # Zipf-like frequencies, like natural text (cumulative, so choices() needn't rebuild them)
+    cum_weights = list(itertools.accumulate(1.0 / rank for rank in range(1, size + 1)))
+    return words, cum_weights
+
+
+def synthetic_document(doc_type: str, n: int, words, cum_weights, content_words: int, rng: random.Random):
+    text = lambda k: " ".join(rng.choices(words, cum_weights=cum_weights, k=k))
+    universe = f"Universe {n % 500}"
+    if doc_type == "universe":
+        return {"title": text(3), "genre": rng.choice(["Sci-Fi", "Noir", "Fantasy"]), "description": text(40)}
+    if doc_type == "chapter":
+        return {"universe_id": universe, "title": text(5), "content": text(content_words), "chapter_number": n}
+    if doc_type == "character":
+        return {"universe_id": universe, "name": text(2), "traits": text(4).split(), "description": text(20), "backstory": text(60)}
+    if doc_type == "lore":
+        return {"universe_id": universe, "title": text(4), "category": "history", "content": text(content_words // 2)}
+    return {"title": text(8), "tags": text(3).split(), "content": text(content_words // 3), "category": "general"}
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--docs", type=int, default=100_000)
+    parser.add_argument("--vocabulary", type=int, default=30_000)
+    parser.add_argument("--content-words", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    words, cum_weights = build_vocabulary(args.vocabulary, rng)
+    index = SearchIndex()
+    types = list(SEARCH_TYPES)
+
+    build_seconds = 0.0
+    for n in range(args.docs):
+        doc_type = types[n % len(types)]
+        doc = synthetic_document(doc_type, n, words, cum_weights, args.content_words, rng)
+        started = time.perf_counter()
+        index.add(doc_type, str(n), doc)
+        build_seconds += time.perf_counter() - started
+    print(f"indexed {len(index):,} docs, {len(index.postings):,} terms in {build_seconds:.1f}s "
+          f"({len(index) / build_seconds:,.0f} docs/s)")
+
+    scenarios = {
+        "1 term": lambda: rng.choices(words, cum_weights=cum_weights, k=1),
+        "2 terms": lambda: rng.choices(words, cum_weights=cum_weights, k=2),
+        "3 rare terms": lambda: rng.sample(words[len(words) // 10:], 3),
+        "2 terms, type=chapter": lambda: rng.choices(words, cum_weights=cum_weights, k=2),
+    }
+    print(f"{'scenario':<24}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'mean hits':>12}")
+    for name, make_query in scenarios.items():
+        latencies, hits = [], []
+        type_filter = ["chapter"] if "type=" in name else None
+        for _ in range(args.queries):
+            query = " ".join(make_query())
+            t0 = time.perf_counter()
+            total, _ = index.search(query, types=type_filter, limit=20)
+            latencies.append((time.perf_counter() - t0) * 1000)
+            hits.append(total)
+        print(f"{name:<24}{percentile(latencies, 50):>10.2f}{percentile(latencies, 95):>10.2f}"
+              f"{percentile(latencies, 99):>10.2f}{statistics.mean(hits):>12,.0f}")
+
+
+if __name__ == "__main__":
+    main()
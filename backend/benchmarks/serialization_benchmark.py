@@ -0,0 +1,95 @@
+"""Response serialization cost: FastAPI's default path vs. FastJSONRoute's orjson path.
+
+Builds response bodies shaped like large get_stories_by_universe and get_forum_posts
+pages and times turning them into bytes the way each path does.
+
+    cd backend && python -m benchmarks.serialization_benchmark --items 10000
+"""
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from benchmarks.search_benchmark import percentile
+from json_responses import dumps, orjson
+
+WORDS = "neon shadow signal archive drift ember vault cipher orbit relic harbor lantern".split()
+
+
+def text(rng, n):
+    return " ".join(rng.choices(WORDS, k=n))
+
+
+def stories_page(n, rng):
+    now = datetime.now(timezone.utc)
+    return {"items": [
+        {"universe_id": "Neon Shadows", "title": f"Chapter {i}: {text(rng, 4)}", "chapter_number": i,
+         "author": "Kira Nakamura", "author_email": "kira@fictionverse.io", "status": "published",
+         "word_count": rng.randint(1500, 6000), "excerpt": text(rng, 30)[:200],
+         "created_at": (now - timedelta(hours=i)).isoformat()}
+        for i in range(1, n + 1)
+    ], "next_cursor": "WzEseyIkb2lkIjoiNmFkM2MyYTQwMWJkMWNjYzc2YjNiODg4In1d"}
+
+
+def forum_page(n, rng):
+    # Documents read straight from MongoDB: real datetimes and ObjectIds
+    now = datetime.now(timezone.utc)
+    return {"items": [
+        {"_id": ObjectId(), "title": text(rng, 8), "content": text(rng, 60), "category": "Theories",
+         "tags": rng.sample(WORDS, 3), "author": "ghost", "author_email": "ghost@fictionverse.io",
+         "replies_count": rng.randint(0, 500), "created_at": now - timedelta(minutes=i),
+         "last_activity_at": now - timedelta(seconds=i)}
+        for i in range(n)
+    ], "next_cursor": None}
+
+
+# jsonable_encoder cannot encode ObjectId by itself
+OBJECT_ID = {ObjectId: str}
+
+PATHS = {
+    # What FastAPI does for a plain dict return with the default JSONResponse
+    "jsonable_encoder + json": lambda body: JSONResponse(jsonable_encoder(body, custom_encoder=OBJECT_ID)).body,
+    "jsonable_encoder + orjson": lambda body: dumps(jsonable_encoder(body, custom_encoder=OBJECT_ID)),
+    "FastJSONRoute (orjson)": lambda body: dumps(body),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=10_000, help="items per response")
+    parser.add_argument("--repeat", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    bodies = {
+        "get_stories_by_universe": stories_page(args.items, rng),
+        "get_forum_posts": forum_page(args.items, rng),
+    }
+    print(f"encoder: {'orjson ' + orjson.__version__ if orjson else 'stdlib json (orjson not installed)'}")
+    print(f"{'response':<26}{'path':<28}{'p50 ms':>10}{'p95 ms':>10}{'KiB':>9}{'speedup':>9}")
+    for name, body in bodies.items():
+        expected = json.loads(PATHS["jsonable_encoder + json"](body))
+        baseline = None
+        for path, render in PATHS.items():
+            rendered = render(body)
+            # Every path must produce the same document
+            assert json.loads(rendered) == expected, path
+            timings = []
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                render(body)
+                timings.append((time.perf_counter() - started) * 1000)
+            p50 = percentile(timings, 50)
+            baseline = baseline or p50
+            print(f"{name:<26}{path:<28}{p50:>10.2f}{percentile(timings, 95):>10.2f}"
+                  f"{len(rendered) / 1024:>9.0f}{baseline / p50:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
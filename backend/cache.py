@@ -0,0 +1,190 @@
+"""Bounded in-process read cache with TTL expiry and LRU eviction.
+
+A load that reads the database and then caches the result can race a write: if the
+read happens before the write and the set after the write's delete, the old document
+goes back into the cache until its TTL. Loads therefore take a generation before
+reading and pass it to set(), which skips the write if the key (or its group) was
+invalidated in between.
+"""
+import abc
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+_MISSING = object()
+
+
+class TTLCache:
+    # Entries belong to an optional group (e.g. ("lore", universe_id)) so writes can
+    # drop every cached page for one universe without touching the rest.
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 60.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._groups: dict = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._entries.get(key, _MISSING)
+        if entry is _MISSING:
+            self.misses += 1
+            return default
+        expires_at, _, value = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, group: Optional[Hashable] = None, ttl: Optional[float] = None):
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), group, value)
+        if group is not None:
+            self._groups.setdefault(group, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def delete(self, key: Hashable):
+        if key in self._entries:
+            self._remove(key)
+            self.invalidations += 1
+
+    def invalidate_group(self, group: Hashable):
+        for key in list(self._groups.get(group, ())):
+            self._remove(key)
+            self.invalidations += 1
+
+    def clear(self):
+        self._entries.clear()
+        self._groups.clear()
+
+    def _remove(self, key: Hashable):
+        _, group, _ = self._entries.pop(key)
+        if group is not None:
+            keys = self._groups.get(group)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._groups[group]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
+
+
+class Generations:
+    # Sequence number of the latest invalidation per key/group. Bounded: forgetting the
+    # oldest entries raises the floor, and any generation below the floor counts as
+    # changed, which only errs towards not caching.
+
+    def __init__(self, max_entries: int = 10_000):
+        self.max_entries = max_entries
+        self.seq = 0
+        self.floor = 0
+        self._bumped: "OrderedDict[Hashable, int]" = OrderedDict()
+        self.listeners = []
+
+    def bump(self, name: Hashable):
+        for listener in self.listeners:
+            listener(name)
+        self.seq += 1
+        self._bumped.pop(name, None)
+        self._bumped[name] = self.seq
+        while len(self._bumped) > self.max_entries:
+            _, self.floor = self._bumped.popitem(last=False)
+
+    def changed(self, generation: int, *names: Hashable) -> bool:
+        return generation < self.floor or any(self._bumped.get(name, 0) > generation for name in names)
+
+
+class CacheBackend(abc.ABC):
+    # Async interface the routes talk to; implementations decide where entries live.
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    def on_invalidate(self, listener):
+        # listener(("key", key) or ("group", group)) on every invalidation, including
+        # ones broadcast by other workers
+        self.generations.listeners.append(listener)
+
+    @abc.abstractmethod
+    async def get(self, key: Hashable, default: Any = None) -> Any:
+        ...
+
+    @abc.abstractmethod
+    async def generation(self, key: Hashable) -> Any:
+        """Token to take before a load reads the database and pass to set()."""
+
+    @abc.abstractmethod
+    async def set(self, key: Hashable, value: Any, group: Optional[Hashable] = None, ttl: Optional[float] = None, generation: Any = None):
+        """Store value, unless key or group was invalidated since `generation` was taken."""
+
+    @abc.abstractmethod
+    async def delete(self, key: Hashable):
+        ...
+
+    @abc.abstractmethod
+    async def invalidate_group(self, group: Hashable):
+        ...
+
+    @abc.abstractmethod
+    def stats(self) -> dict:
+        ...
+
+
+class MemoryCache(CacheBackend):
+    # Single-process backend. Fine for one worker; use RedisCache when running several.
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 60.0):
+        self.local = TTLCache(max_entries=max_entries, ttl=ttl)
+        self.generations = Generations()
+        self.stale_sets = 0
+
+    async def get(self, key, default=None):
+        return self.local.get(key, default)
+
+    async def generation(self, key):
+        return self.generations.seq
+
+    async def set(self, key, value, group=None, ttl=None, generation=None):
+        if generation is not None and self.generations.changed(generation, ("key", key), ("group", group)):
+            self.stale_sets += 1
+            return
+        self.local.set(key, value, group=group, ttl=ttl)
+
+    async def delete(self, key):
+        # Bumped even when nothing is cached: a load may be about to set it
+        self.generations.bump(("key", key))
+        self.local.delete(key)
+
+    async def invalidate_group(self, group):
+        self.generations.bump(("group", group))
+        self.local.invalidate_group(group)
+
+    def stats(self) -> dict:
+        return {"backend": "memory", "stale_sets": self.stale_sets, **self.local.stats()}
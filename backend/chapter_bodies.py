@@ -0,0 +1,186 @@
+"""Compressed chapter text, stored apart from the chapter metadata in `stories`.
+
+Bodies live in the `chapter_bodies` collection keyed by the story _id. Bodies that are
+still large after compression go to GridFS instead, so no chapter can push a document
+past MongoDB's size limit. Compressing or decompressing a long chapter takes long enough
+to stall other requests, so bodies above `offload_threshold` bytes are (de)compressed
+in the default thread pool instead of on the event loop.
+"""
+import asyncio
+import logging
+import zlib
+from typing import Dict, Iterable, List, Optional
+
+from bson import Binary
+from pymongo import UpdateOne
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+
+try:
+    import zstandard
+except ImportError:  # optional; zlib is always available
+    zstandard = None
+
+try:
+    import brotli
+except ImportError:  # optional
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+BODY_COLLECTION = "chapter_bodies"
+GRIDFS_BUCKET = "chapter_bodies_fs"
+EXCERPT_LENGTH = 200
+
+
+def available_codec(preferred: str) -> str:
+    modules = {"zstd": ("zstandard", zstandard), "brotli": ("brotli", brotli)}
+    if preferred in modules and modules[preferred][1] is None:
+        logger.warning("%s is not installed; storing chapter bodies with zlib", modules[preferred][0])
+        return "zlib"
+    return preferred if preferred in ("zstd", "brotli", "zlib") else "zlib"
+
+
+def compress(text: str, codec: str) -> bytes:
+    raw = text.encode("utf-8")
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=9).compress(raw)
+    if codec == "brotli":
+        # Quality 9: most of brotli's ratio at a fraction of quality 11's time
+        return brotli.compress(raw, quality=9)
+    return zlib.compress(raw, 6)
+
+
+def decompress(data: bytes, codec: str) -> str:
+    if codec == "zstd":
+        return zstandard.ZstdDecompressor().decompress(data).decode("utf-8")
+    if codec == "brotli":
+        return brotli.decompress(data).decode("utf-8")
+    return zlib.decompress(data).decode("utf-8")
+
+
+def make_excerpt(text: str, length: int = EXCERPT_LENGTH) -> str:
+    return text[:length]
+
+
+def count_words(text: str) -> int:
+    return len(text.split())
+
+
+def detach_body(story_dict: dict) -> str:
+    # The stories document keeps metadata only; the text goes to chapter_bodies
+    content = story_dict.pop("content")
+    story_dict["word_count"] = count_words(content)
+    story_dict["excerpt"] = make_excerpt(content)
+    return content
+
+
+class ChapterBodyStore:
+
+    def __init__(self, db, codec: str = "zlib", gridfs_threshold: int = 4 * 1024 * 1024, offload_threshold: int = 64 * 1024):
+        self.db = db
+        self.codec = available_codec(codec)
+        self.gridfs_threshold = gridfs_threshold
+        self.offload_threshold = offload_threshold
+        self.collection = db[BODY_COLLECTION]
+        self._bucket = None
+        self.offloaded = 0
+
+    @property
+    def bucket(self):
+        if self._bucket is None:
+            self._bucket = AsyncIOMotorGridFSBucket(self.db, bucket_name=GRIDFS_BUCKET)
+        return self._bucket
+
+    async def _run(self, size: int, fn, *args):
+        if size < self.offload_threshold:
+            return fn(*args)
+        self.offloaded += 1
+        return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+    async def _compress(self, text: str) -> bytes:
+        return await self._run(len(text), compress, text, self.codec)
+
+    async def save(self, story_id, text: str):
+        data = await self._compress(text)
+        previous = await self.collection.find_one({"_id": story_id}, {"gridfs_id": 1})
+
+        body = {"codec": self.codec, "raw_size": len(text.encode("utf-8")), "stored_size": len(data)}
+        if len(data) > self.gridfs_threshold:
+            body["gridfs_id"] = await self.bucket.upload_from_stream(str(story_id), data)
+            update = {"$set": body, "$unset": {"data": ""}}
+        else:
+            body["data"] = Binary(data)
+            update = {"$set": body, "$unset": {"gridfs_id": ""}}
+        await self.collection.update_one({"_id": story_id}, update, upsert=True)
+
+        if previous and previous.get("gridfs_id"):
+            await self.bucket.delete(previous["gridfs_id"])
+
+    async def save_many(self, bodies: Dict[object, str]):
+        # One bulk write for a batch of inline bodies; GridFS-sized ones go through save()
+        previous = {
+            doc["_id"]: doc["gridfs_id"]
+            async for doc in self.collection.find({"_id": {"$in": list(bodies)}, "gridfs_id": {"$exists": True}}, {"gridfs_id": 1})
+        }
+        operations = []
+        for story_id, text in bodies.items():
+            data = await self._compress(text)
+            if len(data) > self.gridfs_threshold:
+                previous.pop(story_id, None)
+                await self.save(story_id, text)
+                continue
+            body = {"codec": self.codec, "raw_size": len(text.encode("utf-8")), "stored_size": len(data), "data": Binary(data)}
+            operations.append(UpdateOne({"_id": story_id}, {"$set": body, "$unset": {"gridfs_id": ""}}, upsert=True))
+        if operations:
+            await self.collection.bulk_write(operations, ordered=False)
+
+        for gridfs_id in previous.values():
+            await self.bucket.delete(gridfs_id)
+
+    async def delete_many(self, story_ids: List[object]):
+        if not story_ids:
+            return
+        async for doc in self.collection.find({"_id": {"$in": story_ids}, "gridfs_id": {"$exists": True}}, {"gridfs_id": 1}):
+            await self.bucket.delete(doc["gridfs_id"])
+        await self.collection.delete_many({"_id": {"$in": story_ids}})
+
+    async def _decode(self, body: dict) -> str:
+        if body.get("gridfs_id") is not None:
+            stream = await self.bucket.open_download_stream(body["gridfs_id"])
+            data = await stream.read()
+        else:
+            data = bytes(body["data"])
+        return await self._run(body.get("raw_size", len(data)), decompress, data, body.get("codec", "zlib"))
+
+    async def load(self, story_id) -> Optional[str]:
+        body = await self.collection.find_one({"_id": story_id})
+        return await self._decode(body) if body else None
+
+    async def exists(self, story_id) -> bool:
+        return await self.collection.find_one({"_id": story_id}, {"_id": 1}) is not None
+
+    async def load_many(self, story_ids: Iterable) -> Dict[object, str]:
+        bodies = {}
+        async for body in self.collection.find({"_id": {"$in": list(story_ids)}}):
+            bodies[body["_id"]] = await self._decode(body)
+        return bodies
+
+    async def attach(self, db, docs: List[dict]):
+        # Fill in `content` on a batch of story documents (search indexing/snippets)
+        bodies = await self.load_many(doc["_id"] for doc in docs)
+        for doc in docs:
+            if "content" not in doc:
+                doc["content"] = bodies.get(doc["_id"], "")
+
+    async def stats(self) -> dict:
+        totals = await self.collection.aggregate([{"$group": {
+            "_id": None,
+            "chapters": {"$sum": 1},
+            "raw_bytes": {"$sum": "$raw_size"},
+            "stored_bytes": {"$sum": "$stored_size"},
+        }}]).to_list(1)
+        totals = totals[0] if totals else {"chapters": 0, "raw_bytes": 0, "stored_bytes": 0}
+        totals.pop("_id", None)
+        totals["codec"] = self.codec
+        totals["offloaded"] = self.offloaded
+        return totals
@@ -0,0 +1,176 @@
+"""Write-behind aggregation for engagement counters and other hot, mergeable updates.
+
+Handlers record increments (and last-write-wins sets, maxima and bit flags) in memory;
+a background task folds everything recorded for the same document into one update and
+flushes the lot with a single unordered bulk_write per collection. A popular thread then
+costs one write per interval instead of one per event. Pending values are flushed on
+shutdown; a hard crash loses at most one interval's worth.
+"""
+import asyncio
+import logging
+from typing import Dict, Optional, Tuple
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+
+class CounterAggregator:
+
+    def __init__(self, db, flush_seconds: float = 1.0, max_pending: int = 10000):
+        self.db = db
+        self.flush_seconds = flush_seconds
+        self.max_pending = max_pending
+        # (collection, _id) -> {"$inc": {...}, "$max": {...}, "$set": {...}, "$bit": {...}, "upsert": bool}
+        self.pending: Dict[Tuple[str, object], dict] = {}
+        # The batch a flush is writing, still overlaid until its bulk_write is acknowledged
+        self.in_flight: Dict[Tuple[str, object], dict] = {}
+        self.recorded = 0
+        self.flushed_updates = 0
+        self.flushes = 0
+        self.failures = 0
+        self._lock = asyncio.Lock()
+        self._wake = asyncio.Event()
+        self._stopping = False
+        self._task: Optional[asyncio.Task] = None
+
+    def _entry(self, collection: str, doc_id, upsert: bool = False) -> dict:
+        entry = self.pending.get((collection, doc_id))
+        if entry is None:
+            entry = self.pending[(collection, doc_id)] = {"$inc": {}, "$max": {}, "$set": {}, "$bit": {}, "upsert": upsert}
+            if len(self.pending) >= self.max_pending:
+                self._wake.set()
+        entry["upsert"] = entry["upsert"] or upsert
+        return entry
+
+    def increment(self, collection: str, doc_id, field: str, amount: int = 1, upsert: bool = False):
+        increments = self._entry(collection, doc_id, upsert)["$inc"]
+        increments[field] = increments.get(field, 0) + amount
+        self.recorded += 1
+
+    def maximum(self, collection: str, doc_id, field: str, value, upsert: bool = False):
+        # For "last activity" style fields: keep the latest value seen
+        maxima = self._entry(collection, doc_id, upsert)["$max"]
+        if field not in maxima or value > maxima[field]:
+            maxima[field] = value
+
+    def set(self, collection: str, doc_id, field: str, value, upsert: bool = False):
+        # Debounce: only the last value recorded in an interval is written
+        self._entry(collection, doc_id, upsert)["$set"][field] = value
+        self.recorded += 1
+
+    def bit_or(self, collection: str, doc_id, field: str, mask: int, upsert: bool = False):
+        bits = self._entry(collection, doc_id, upsert)["$bit"]
+        bits[field] = {"or": bits.get(field, {"or": 0})["or"] | mask}
+
+    def overlay(self, collection: str, doc_id, doc: dict) -> dict:
+        # Reads on this worker see its own not-yet-flushed updates, including the batch
+        # being written. A read landing between that write and its acknowledgement can
+        # count it twice for a moment; dropping it early would undercount instead.
+        for updates in (self.in_flight, self.pending):
+            entry = updates.get((collection, doc_id))
+            if entry:
+                _overlay_entry(doc, entry)
+        return doc
+
+    async def flush(self):
+        async with self._lock:
+            pending, self.pending = self.pending, {}
+            if not pending:
+                return
+            self.in_flight = dict(pending)
+            by_collection: Dict[str, list] = {}
+            for (collection, doc_id), entry in pending.items():
+                update = {op: fields for op, fields in entry.items() if op.startswith("$") and fields}
+                operation = UpdateOne({"_id": doc_id}, update, upsert=entry["upsert"])
+                by_collection.setdefault(collection, []).append(((collection, doc_id), operation))
+
+            for collection, operations in by_collection.items():
+                try:
+                    await self.db[collection].bulk_write([op for _, op in operations], ordered=False)
+                    self.flushed_updates += len(operations)
+                except BulkWriteError as exc:
+                    # Unordered: everything but the reported errors was applied
+                    failed = [operations[error["index"]] for error in exc.details.get("writeErrors", [])]
+                    self._requeue(collection, pending, failed, exc)
+                    self.flushed_updates += len(operations) - len(failed)
+                except PyMongoError as exc:
+                    # Outcome unknown (e.g. network error). Retrying may double-count a batch
+                    # that did land; dropping it would lose counts, which is worse.
+                    self._requeue(collection, pending, operations, exc)
+                finally:
+                    # Acknowledged (or requeued into pending): no longer in flight
+                    for key, _ in operations:
+                        self.in_flight.pop(key, None)
+            self.flushes += 1
+
+    def _requeue(self, collection: str, pending: dict, operations: list, exc: Exception):
+        # Merged with anything recorded since, and retried on the next flush
+        self.failures += 1
+        logger.error("Counter flush to %s failed for %d updates, will retry: %s", collection, len(operations), exc)
+        for (_, doc_id), _ in operations:
+            entry = pending[(collection, doc_id)]
+            current = self._entry(collection, doc_id, entry["upsert"])
+            for field, amount in entry["$inc"].items():
+                current["$inc"][field] = current["$inc"].get(field, 0) + amount
+            for field, value in entry["$max"].items():
+                self.maximum(collection, doc_id, field, value)
+            for field, value in entry["$set"].items():
+                # A value recorded since the failed flush is newer
+                current["$set"].setdefault(field, value)
+            for field, bit in entry["$bit"].items():
+                self.bit_or(collection, doc_id, field, bit["or"])
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Counter flush failed")
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        # Not cancelled: a flush interrupted mid-write would drop the batch it holds
+        self._stopping = True
+        self._wake.set()
+        if self._task:
+            await self._task
+        # Final flush so a clean shutdown loses nothing
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "pending_documents": len(self.pending),
+            "recorded": self.recorded,
+            "flushed_updates": self.flushed_updates,
+            "flushes": self.flushes,
+            "failures": self.failures,
+            "flush_seconds": self.flush_seconds,
+        }
+
+
+def _overlay_entry(doc: dict, entry: dict):
+    for field, amount in entry["$inc"].items():
+        _apply(doc, field, lambda old: (old or 0) + amount)
+    for field, value in entry["$max"].items():
+        _apply(doc, field, lambda old: value if old is None or value > old else old)
+    for field, value in entry["$set"].items():
+        _apply(doc, field, lambda old: value)
+    for field, bit in entry["$bit"].items():
+        _apply(doc, field, lambda old: (old or 0) | bit["or"])
+
+
+def _apply(doc: dict, path: str, update):
+    # Apply update(old value) at a dotted path, creating embedded documents on the way
+    *parents, last = path.split(".")
+    for part in parents:
+        doc = doc.setdefault(part, {})
+    doc[last] = update(doc.get(last))
@@ -0,0 +1,84 @@
+"""Conditional GET support (ETag / Last-Modified / 304) for single-document reads."""
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+
+from fastapi import Request, Response
+
+
+def _parse_timestamp(value) -> Optional[datetime]:
+    if isinstance(value, datetime):
+        parsed = value
+    elif isinstance(value, str):
+        try:
+            parsed = datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    else:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    # HTTP dates have one-second resolution
+    return parsed.astimezone(timezone.utc).replace(microsecond=0)
+
+
+def document_validators(document: dict, identity: str):
+    # Documents carry updated_at once edited, created_at otherwise; a document's
+    # identity plus that timestamp changes exactly when its content does.
+    version = document.get("updated_at") or document.get("created_at") or ""
+    digest = hashlib.sha1(f"{identity}|{version}".encode()).hexdigest()[:20]
+    return f'W/"{digest}"', _parse_timestamp(version)
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    # Weak comparison, as RFC 9110 requires for If-None-Match
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+def conditional_get(request: Request, response: Response, document: dict, identity: str, max_age: int) -> Optional[Response]:
+    """Set validator headers on `response`; return a 304 response if the client copy is current."""
+    etag, last_modified = document_validators(document, identity)
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={max_age}, must-revalidate",
+    }
+    if last_modified:
+        headers["Last-Modified"] = format_datetime(last_modified, usegmt=True)
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        not_modified = _etag_matches(if_none_match, etag)
+    else:
+        not_modified = False
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_modified_since and last_modified:
+            try:
+                since = parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError):
+                since = None
+            if since is not None:
+                if since.tzinfo is None:
+                    since = since.replace(tzinfo=timezone.utc)
+                not_modified = last_modified <= since
+
+    if not_modified:
+        # A returned Response replaces the handler's `response`, so carry over what the
+        # handler already set on it (e.g. X-Overview-Version, cookies)
+        not_modified_response = Response(status_code=304, headers=headers)
+        skip = {b"content-length", b"content-type", *(name.lower().encode("latin-1") for name in headers)}
+        not_modified_response.raw_headers.extend(
+            (name, value) for name, value in response.raw_headers if name.lower() not in skip
+        )
+        return not_modified_response
+    response.headers.update(headers)
+    return None
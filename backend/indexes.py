@@ -0,0 +1,114 @@
+"""Index declarations for the hot query shapes and explain()-based plan checks."""
+import logging
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import PyMongoError
+
+logger = logging.getLogger(__name__)
+
+INDEXES = {
+    "universes": [
+        IndexModel([("title", ASCENDING)], name="title_1"),
+        IndexModel([("type", ASCENDING), ("_id", ASCENDING)], name="type_1__id_1"),
+        IndexModel([("genre", ASCENDING), ("_id", ASCENDING)], name="genre_1__id_1"),
+        IndexModel([("updated_at", ASCENDING)], name="updated_at_1", sparse=True),
+    ],
+    "stories": [
+        IndexModel([("universe_id", ASCENDING), ("chapter_number", ASCENDING), ("_id", ASCENDING)], name="universe_id_1_chapter_number_1__id_1"),
+        IndexModel([("updated_at", ASCENDING)], name="updated_at_1", sparse=True),
+    ],
+    "characters": [
+        IndexModel([("universe_id", ASCENDING), ("_id", ASCENDING)], name="universe_id_1__id_1"),
+        IndexModel([("updated_at", ASCENDING)], name="updated_at_1", sparse=True),
+    ],
+    "lore": [
+        IndexModel([("universe_id", ASCENDING), ("_id", ASCENDING)], name="universe_id_1__id_1"),
+        IndexModel([("updated_at", ASCENDING)], name="updated_at_1", sparse=True),
+    ],
+    "forum_posts": [
+        IndexModel([("created_at", DESCENDING), ("_id", DESCENDING)], name="created_at_-1__id_-1"),
+        IndexModel([("category", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], name="category_1_created_at_-1__id_-1"),
+        IndexModel([("updated_at", ASCENDING)], name="updated_at_1", sparse=True),
+    ],
+    "forum_replies": [
+        IndexModel([("post_id", ASCENDING), ("created_at", ASCENDING), ("_id", ASCENDING)], name="post_id_1_created_at_1__id_1"),
+    ],
+    "challenges": [
+        IndexModel([("created_at", DESCENDING), ("_id", DESCENDING)], name="created_at_-1__id_-1"),
+    ],
+    "users": [
+        IndexModel([("email", ASCENDING)], name="email_1", unique=True),
+        IndexModel([("token_epoch", ASCENDING)], name="token_epoch_1", sparse=True),
+    ],
+}
+
+# (route, collection, filter, sort) for every read the API issues. Sample values are
+# placeholders: the planner only cares about the shape. Counts are checked as a find
+# with the count's filter, which is the $match count_documents runs.
+QUERY_SHAPES = [
+    ("get_universes", "universes", {"type": "Original"}, [("_id", ASCENDING)]),
+    ("get_universes:count", "universes", {"type": "Original"}, None),
+    ("get_universe", "universes", {"title": "?"}, None),
+    ("get_universe_overview", "universe_overviews", {"_id": "?"}, None),
+    ("filter_universes_by_genre", "universes", {"genre": "?"}, [("_id", ASCENDING)]),
+    ("filter_universes_by_genre:count", "universes", {"genre": "?"}, None),
+    ("get_stories_by_universe", "stories", {"universe_id": "?"}, [("chapter_number", ASCENDING), ("_id", ASCENDING)]),
+    ("get_story_chapter", "stories", {"universe_id": "?", "chapter_number": 1}, None),
+    ("get_characters", "characters", {"universe_id": "?"}, [("_id", ASCENDING)]),
+    ("get_lore", "lore", {"universe_id": "?"}, [("_id", ASCENDING)]),
+    ("get_forum_posts", "forum_posts", {}, [("created_at", DESCENDING), ("_id", DESCENDING)]),
+    ("get_forum_posts?category", "forum_posts", {"category": "?"}, [("created_at", DESCENDING), ("_id", DESCENDING)]),
+    ("get_forum_post", "forum_posts", {"_id": "?"}, None),
+    ("get_forum_replies", "forum_replies", {"post_id": "?"}, [("created_at", ASCENDING), ("_id", ASCENDING)]),
+    ("get_challenges", "challenges", {}, [("created_at", DESCENDING), ("_id", DESCENDING)]),
+    ("login", "users", {"email": "?"}, None),
+    ("token_epoch_refresh", "users", {"token_epoch": {"$gt": 0}}, None),
+    ("search_sync_edits:universes", "universes", {"updated_at": {"$gt": "?"}}, None),
+    ("search_sync_edits:stories", "stories", {"updated_at": {"$gt": "?"}}, None),
+    ("search_sync_edits:characters", "characters", {"updated_at": {"$gt": "?"}}, None),
+    ("search_sync_edits:lore", "lore", {"updated_at": {"$gt": "?"}}, None),
+    ("search_sync_edits:forum_posts", "forum_posts", {"updated_at": {"$gt": "?"}}, None),
+]
+
+
+async def ensure_indexes(db):
+    # create_indexes is a no-op for indexes that already exist with the same spec.
+    # Each collection is handled on its own so one bad index can't block startup.
+    for collection, models in INDEXES.items():
+        try:
+            await db[collection].create_indexes(models)
+        except PyMongoError as exc:
+            logger.error("Failed to create indexes on %s: %s", collection, exc)
+
+
+def _plan_stages(plan):
+    if not isinstance(plan, dict):
+        return []
+    stages = [plan["stage"]] if "stage" in plan else []
+    for key in ("inputStage", "queryPlan"):
+        stages.extend(_plan_stages(plan.get(key)))
+    for child in plan.get("inputStages", []):
+        stages.extend(_plan_stages(child))
+    return stages
+
+
+async def explain_query_shapes(db):
+    report = []
+    for route, collection, query, sort in QUERY_SHAPES:
+        cursor = db[collection].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        try:
+            explain = await cursor.explain()
+        except PyMongoError as exc:
+            report.append({"route": route, "collection": collection, "error": str(exc)})
+            continue
+        planner = explain.get("queryPlanner", {})
+        stages = _plan_stages(planner.get("winningPlan", {}))
+        report.append({
+            "route": route,
+            "collection": collection,
+            "stages": stages,
+            "collscan": "COLLSCAN" in stages,
+        })
+    return report
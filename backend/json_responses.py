@@ -0,0 +1,87 @@
+"""orjson response rendering that skips FastAPI's jsonable_encoder for plain returns.
+
+FastAPI passes every non-Response return value through jsonable_encoder, which walks
+and copies the whole structure in Python before the response class serializes it;
+for long chapter lists and forum threads that walk costs more than the encoding.
+FastJSONRoute renders dicts and lists straight to bytes instead. Headers, cookies and
+status set on an injected `response: Response` parameter are carried over.
+"""
+import functools
+import inspect
+import json
+from typing import Any, Optional
+
+from bson import ObjectId
+from fastapi import Response
+from fastapi.datastructures import DefaultPlaceholder
+from fastapi.routing import APIRoute
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # optional; falls back to the stdlib encoder
+    orjson = None
+
+
+def _default(value: Any):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    if orjson is None and hasattr(value, "isoformat"):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        # Non-str keys (e.g. ints in facet counts) are allowed, as the stdlib encoder does
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def _response_parameter(endpoint) -> Optional[str]:
+    for name, parameter in inspect.signature(endpoint).parameters.items():
+        if parameter.annotation is Response:
+            return name
+    return None
+
+
+def fast_json_endpoint(endpoint, status_code: Optional[int] = None):
+    response_param = _response_parameter(endpoint)
+
+    # functools.wraps keeps the original signature visible to FastAPI's dependency resolution
+    @functools.wraps(endpoint)
+    async def wrapper(*args, **kwargs):
+        result = await endpoint(*args, **kwargs)
+        if isinstance(result, Response):
+            return result
+        sub_response = kwargs.get(response_param) if response_param else None
+        status = (sub_response.status_code if sub_response is not None else None) or status_code or 200
+        response = FastJSONResponse(result, status_code=status)
+        if sub_response is not None:
+            response.raw_headers.extend(
+                (key, value) for key, value in sub_response.raw_headers if key not in (b"content-length", b"content-type")
+            )
+        return response
+
+    return wrapper
+
+
+class FastJSONRoute(APIRoute):
+    """APIRoute for handlers that return plain JSON-able data (no response_model)."""
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        response_model = kwargs.get("response_model")
+        if isinstance(response_model, DefaultPlaceholder):
+            response_model = response_model.value
+        if inspect.iscoroutinefunction(endpoint) and response_model is None:
+            endpoint = fast_json_endpoint(endpoint, kwargs.get("status_code"))
+        super().__init__(path, endpoint, **kwargs)
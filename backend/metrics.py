@@ -0,0 +1,199 @@
+"""Per-route request metrics: latency, MongoDB time and calls, response size.
+
+RequestMetricsMiddleware starts a RequestStats for every HTTP request and keeps it in a
+context variable. Motor runs each operation on an executor thread with a copy of the
+caller's context, so CommandMonitor (a pymongo command listener) can attribute every
+command to the request that issued it. Histograms are rendered in the Prometheus text
+format; requests slower than the threshold are logged with their query shapes.
+"""
+import bisect
+import contextvars
+import logging
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+_current: contextvars.ContextVar = contextvars.ContextVar("request_stats", default=None)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DB_CALL_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# Where each command keeps its filter
+_FILTER_KEYS = {"find": "filter", "count": "query", "distinct": "query", "delete": "deletes", "update": "updates"}
+
+
+def query_shape(command_name: str, command: dict) -> str:
+    """Command, collection and the field names it filters/sorts on, without values."""
+    collection = command.get(command_name)
+    parts = [command_name, str(collection) if isinstance(collection, str) else ""]
+    if command_name == "aggregate":
+        parts.append(">".join(next(iter(stage), "?") for stage in command.get("pipeline", [])))
+    elif command_name == "findAndModify":
+        parts.append("{" + ",".join(command.get("query", {})) + "}")
+    elif command_name in _FILTER_KEYS:
+        value = command.get(_FILTER_KEYS[command_name])
+        if isinstance(value, list):  # update/delete statements
+            value = value[0].get("q", {}) if value else {}
+        parts.append("{" + ",".join(value or {}) + "}")
+    if command.get("sort"):
+        parts.append("sort " + ",".join(command["sort"]))
+    return " ".join(p for p in parts if p)
+
+
+class RequestStats:
+
+    def __init__(self):
+        self.db_seconds = 0.0
+        self.db_calls = 0
+        self.queries: List[Tuple[str, float]] = []
+        self._pending: Dict[int, str] = {}
+        self._lock = threading.Lock()
+
+    def command_started(self, request_id: int, shape: str):
+        with self._lock:
+            self._pending[request_id] = shape
+
+    def command_finished(self, request_id: int, seconds: float):
+        with self._lock:
+            shape = self._pending.pop(request_id, "?")
+            self.db_seconds += seconds
+            self.db_calls += 1
+            self.queries.append((shape, seconds))
+
+
+class CommandMonitor(monitoring.CommandListener):
+    """Charges MongoDB commands to the current request, if any."""
+
+    def started(self, event):
+        stats = _current.get()
+        if stats is not None:
+            stats.command_started(event.request_id, query_shape(event.command_name, event.command))
+
+    def succeeded(self, event):
+        stats = _current.get()
+        if stats is not None:
+            stats.command_finished(event.request_id, event.duration_micros / 1e6)
+
+    def failed(self, event):
+        self.succeeded(event)
+
+
+class Histogram:
+
+    def __init__(self, name: str, help_text: str, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        # labels -> [bucket counts..., sum, count]
+        self.series: Dict[tuple, list] = {}
+
+    def observe(self, labels: tuple, value: float):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [0] * len(self.buckets) + [0.0, 0]
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            series[index] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self, label_names) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for labels, series in sorted(self.series.items()):
+            base = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(label_names, labels))
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{base},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{base},le="+Inf"}} {series[-1]}')
+            lines.append(f"{self.name}_sum{{{base}}} {series[-2]}")
+            lines.append(f"{self.name}_count{{{base}}} {series[-1]}")
+        return lines
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class RequestMetrics:
+
+    LABELS = ("method", "route")
+
+    def __init__(self, slow_request_seconds: float = 0.5):
+        self.slow_request_seconds = slow_request_seconds
+        self.latency = Histogram("fv_request_duration_seconds", "Total request latency", LATENCY_BUCKETS)
+        self.db_time = Histogram("fv_request_db_seconds", "Time spent in MongoDB commands per request", LATENCY_BUCKETS)
+        self.db_calls = Histogram("fv_request_db_calls", "MongoDB commands issued per request", DB_CALL_BUCKETS)
+        self.response_bytes = Histogram("fv_response_bytes", "Response body size on the wire", SIZE_BUCKETS)
+        self.responses: Dict[tuple, int] = {}
+        self.slow_requests = 0
+
+    def observe(self, method: str, route: str, status: int, seconds: float, size: int, stats: RequestStats):
+        labels = (method, route)
+        self.latency.observe(labels, seconds)
+        self.db_time.observe(labels, stats.db_seconds)
+        self.db_calls.observe(labels, stats.db_calls)
+        self.response_bytes.observe(labels, size)
+        key = (method, route, str(status))
+        self.responses[key] = self.responses.get(key, 0) + 1
+
+        if seconds >= self.slow_request_seconds:
+            self.slow_requests += 1
+            slowest = sorted(stats.queries, key=lambda q: q[1], reverse=True)[:5]
+            logger.warning(
+                "Slow request %s %s: %.0fms, db %.0fms in %d calls, %d bytes; slowest queries: %s",
+                method, route, seconds * 1000, stats.db_seconds * 1000, stats.db_calls, size,
+                "; ".join(f"{shape} ({s * 1000:.0f}ms)" for shape, s in slowest) or "none"
+            )
+
+    def render(self) -> str:
+        lines = ["# HELP fv_responses_total Responses by route and status", "# TYPE fv_responses_total counter"]
+        for (method, route, status), count in sorted(self.responses.items()):
+            lines.append(f'fv_responses_total{{method="{method}",route="{_escape(route)}",status="{status}"}} {count}')
+        for histogram in (self.latency, self.db_time, self.db_calls, self.response_bytes):
+            lines.extend(histogram.render(self.LABELS))
+        return "\n".join(lines) + "\n"
+
+
+class RequestMetricsMiddleware:
+    """Pure ASGI middleware, so streaming responses pass through untouched."""
+
+    def __init__(self, app, metrics: RequestMetrics, exclude=("/metrics",)):
+        self.app = app
+        self.metrics = metrics
+        self.exclude = set(exclude)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exclude:
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        status = 500
+        size = 0
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            # The router records the matched route; label by its template, not the raw path
+            route: Optional[object] = scope.get("route")
+            self.metrics.observe(
+                scope["method"], getattr(route, "path", "unmatched"), status,
+                time.perf_counter() - started, size, stats
+            )
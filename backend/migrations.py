@@ -0,0 +1,68 @@
+"""One-off data migrations, run once per database rather than once per worker start.
+
+Each completed migration leaves a marker document in `migrations` (_id = its name), so
+a worker starting against a migrated database pays one _id lookup and nothing else.
+Pending migrations run under the same `startup_locks` lease as sample seeding: one
+worker migrates while the others wait for its markers, since requests must not see
+documents in their old shape.
+"""
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, List, Tuple
+
+from pymongo.errors import DuplicateKeyError
+
+from seeding import acquire_lock, release_lock
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS = "migrations"
+
+
+async def _pending(db, names: List[str]) -> List[str]:
+    done = {doc["_id"] async for doc in db[MIGRATIONS].find({"_id": {"$in": names}}, {"_id": 1})}
+    return [name for name in names if name not in done]
+
+
+async def completed(db) -> List[str]:
+    return [doc["_id"] async for doc in db[MIGRATIONS].find({}, {"_id": 1})]
+
+
+async def run_migrations(db, steps: List[Tuple[str, Callable[[], Awaitable[None]]]],
+                         lease_seconds: float = 600.0, poll_seconds: float = 1.0) -> List[str]:
+    # steps: (name, coroutine function) in the order they must run; returns the names run here
+    names = [name for name, _ in steps]
+    owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+    while True:
+        if not await _pending(db, names):
+            return []
+        if await acquire_lock(db, "migrations", owner, lease_seconds):
+            break
+        # Another worker is migrating; its markers end the wait (or its lease expires)
+        await asyncio.sleep(poll_seconds)
+
+    ran = []
+    try:
+        # Re-read under the lease: the previous holder may have finished some
+        pending = set(await _pending(db, names))
+        for name, step in steps:
+            if name not in pending:
+                continue
+            # Renew before each step so a long migration keeps the lease
+            if not await acquire_lock(db, "migrations", owner, lease_seconds):
+                logger.warning("Migration lease expired and was taken over before %s", name)
+                break
+            await step()
+            try:
+                await db[MIGRATIONS].insert_one({"_id": name, "completed_at": datetime.now(timezone.utc).isoformat()})
+            except DuplicateKeyError:
+                pass
+            ran.append(name)
+            logger.info("Migration %s complete", name)
+    finally:
+        await release_lock(db, "migrations", owner)
+    return ran
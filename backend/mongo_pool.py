@@ -0,0 +1,162 @@
+"""MongoDB connection pool monitoring and the readiness check built on it.
+
+PoolMonitor is a pymongo pool listener that tracks, per server, how many connections
+are open, how many are checked out, and how many operations are queued waiting for
+one. Readiness combines that with a cached ping, so a worker whose pool is saturated
+(or that can't reach MongoDB) reports itself unready and the load balancer routes
+around it until it drains.
+"""
+import asyncio
+import importlib.util
+import logging
+import threading
+import time
+from typing import Dict, List, Optional
+
+from pymongo import monitoring, read_preferences
+
+logger = logging.getLogger(__name__)
+
+# Wire compressor -> module pymongo needs for it (zlib is built in)
+_COMPRESSOR_MODULES = {"zstd": "zstandard", "snappy": "snappy", "zlib": None}
+
+
+def available_compressors(preferred: str) -> List[str]:
+    compressors = []
+    for name in (c.strip() for c in preferred.split(",") if c.strip()):
+        module = _COMPRESSOR_MODULES.get(name, "")
+        if module is None or (module and importlib.util.find_spec(module)):
+            compressors.append(name)
+        else:
+            logger.info("MongoDB wire compressor %s is not installed; skipping it", name)
+    return compressors
+
+
+READ_PREFERENCES = {
+    "primary": read_preferences.Primary,
+    "primaryPreferred": read_preferences.PrimaryPreferred,
+    "secondary": read_preferences.Secondary,
+    "secondaryPreferred": read_preferences.SecondaryPreferred,
+    "nearest": read_preferences.Nearest,
+}
+
+
+def read_preference(mode: str, max_staleness: int = -1):
+    if mode not in READ_PREFERENCES:
+        raise ValueError(f"Unknown read preference {mode!r}; expected one of {', '.join(READ_PREFERENCES)}")
+    if mode == "primary":
+        return read_preferences.Primary()
+    # pymongo requires at least 90s when a staleness bound is set
+    return READ_PREFERENCES[mode](max_staleness=max_staleness)
+
+
+class PoolMonitor(monitoring.ConnectionPoolListener):
+    # Events arrive on driver threads
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.servers: Dict[str, Dict[str, int]] = {}
+        self.checkout_failures = 0
+        self.pool_clears = 0
+
+    def _bump(self, address, field: str, delta: int):
+        key = "%s:%s" % address
+        with self._lock:
+            counters = self.servers.setdefault(key, {"open": 0, "in_use": 0, "waiting": 0})
+            counters[field] = max(0, counters[field] + delta)
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pool_clears += 1
+
+    def pool_closed(self, event):
+        with self._lock:
+            self.servers.pop("%s:%s" % event.address, None)
+
+    def connection_created(self, event):
+        self._bump(event.address, "open", 1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._bump(event.address, "open", -1)
+
+    def connection_check_out_started(self, event):
+        self._bump(event.address, "waiting", 1)
+
+    def connection_check_out_failed(self, event):
+        self._bump(event.address, "waiting", -1)
+        with self._lock:
+            self.checkout_failures += 1
+
+    def connection_checked_out(self, event):
+        self._bump(event.address, "waiting", -1)
+        self._bump(event.address, "in_use", 1)
+
+    def connection_checked_in(self, event):
+        self._bump(event.address, "in_use", -1)
+
+    def stats(self, max_pool_size: int) -> dict:
+        with self._lock:
+            servers = {address: dict(counters) for address, counters in self.servers.items()}
+            failures, clears = self.checkout_failures, self.pool_clears
+        for counters in servers.values():
+            counters["utilization"] = round(counters["in_use"] / max_pool_size, 3) if max_pool_size else 0.0
+        return {"max_pool_size": max_pool_size, "servers": servers, "checkout_failures": failures, "pool_clears": clears}
+
+    def render(self, max_pool_size: int) -> str:
+        # Prometheus gauges, appended to GET /metrics
+        stats = self.stats(max_pool_size)
+        lines = []
+        for field, help_text in (("open", "Open connections"), ("in_use", "Connections checked out"),
+                                 ("waiting", "Operations waiting for a connection"), ("utilization", "in_use / maxPoolSize")):
+            lines.append(f"# HELP fv_mongo_pool_{field} {help_text}")
+            lines.append(f"# TYPE fv_mongo_pool_{field} gauge")
+            lines.extend(f'fv_mongo_pool_{field}{{server="{address}"}} {counters[field]}'
+                         for address, counters in sorted(stats["servers"].items()))
+        lines.append("# HELP fv_mongo_pool_checkout_failures_total Connection checkouts that failed or timed out")
+        lines.append("# TYPE fv_mongo_pool_checkout_failures_total counter")
+        lines.append(f"fv_mongo_pool_checkout_failures_total {stats['checkout_failures']}")
+        return "\n".join(lines) + "\n"
+
+
+class Readiness:
+
+    def __init__(self, client, pool_monitor: PoolMonitor, max_pool_size: int,
+                 max_utilization: float = 0.9, ping_timeout: float = 1.0, ping_interval: float = 2.0):
+        self.client = client
+        self.pool_monitor = pool_monitor
+        self.max_pool_size = max_pool_size
+        self.max_utilization = max_utilization
+        self.ping_timeout = ping_timeout
+        self.ping_interval = ping_interval
+        self._last_ping = 0.0
+        self._ping_error: Optional[str] = "not checked yet"
+
+    async def _ping(self) -> Optional[str]:
+        # Load balancers poll often; one ping per interval answers all of them
+        if time.monotonic() - self._last_ping >= self.ping_interval:
+            self._last_ping = time.monotonic()
+            try:
+                await asyncio.wait_for(self.client.admin.command("ping"), self.ping_timeout)
+                self._ping_error = None
+            except Exception as exc:
+                self._ping_error = f"MongoDB ping failed: {exc.__class__.__name__}"
+        return self._ping_error
+
+    async def check(self) -> dict:
+        reasons = []
+        ping_error = await self._ping()
+        if ping_error:
+            reasons.append(ping_error)
+        pool = self.pool_monitor.stats(self.max_pool_size)
+        for address, counters in pool["servers"].items():
+            if counters["utilization"] >= self.max_utilization and counters["waiting"]:
+                reasons.append(f"connection pool to {address} saturated")
+        return {"ready": not reasons, "reasons": reasons, "pool": pool}
@@ -0,0 +1,100 @@
+"""Opaque keyset cursors for the list routes."""
+import base64
+import binascii
+from typing import Any, List, Optional, Tuple
+
+from bson import json_util
+from bson.errors import BSONError
+from fastapi import HTTPException
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Sort specs used by the list routes. Every spec ends on _id so the key is unique.
+CHAPTER_SORT = [("chapter_number", 1), ("_id", 1)]
+INSERTION_SORT = [("_id", 1)]
+NEWEST_FIRST_SORT = [("created_at", -1), ("_id", -1)]
+OLDEST_FIRST_SORT = [("created_at", 1), ("_id", 1)]
+
+
+def encode_cursor(state: Any) -> str:
+    raw = json_util.dumps(state, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Any:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return json_util.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError, binascii.Error, BSONError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def parse_fields(fields: Optional[str], allowed) -> Optional[dict]:
+    # "title,chapter_number" -> {"title": 1, "chapter_number": 1}
+    if not fields:
+        return None
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = sorted(set(requested) - set(allowed))
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return {field: 1 for field in requested} or None
+
+
+def keyset_filter(sort: List[Tuple[str, int]], after: list) -> dict:
+    # (a, b) > (x, y)  ==>  a > x OR (a == x AND b > y), honouring each field's direction
+    if not isinstance(after, list) or len(after) != len(sort):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    clauses = []
+    for i, (field, direction) in enumerate(sort):
+        clause = {sort[j][0]: after[j] for j in range(i)}
+        clause[field] = {"$gt" if direction == 1 else "$lt": after[i]}
+        clauses.append(clause)
+    return {"$or": clauses}
+
+
+def _after_query(query: dict, sort, after: Optional[list]) -> dict:
+    if after is None:
+        return query
+    return {"$and": [query, keyset_filter(sort, after)]} if query else keyset_filter(sort, after)
+
+
+def _page_projection(projection: Optional[dict], sort):
+    projection = dict(projection or {})
+    projection.pop("_id", None)
+    # Inclusion projections still need the sort key to build the next cursor
+    hidden = []
+    if any(projection.values()):
+        hidden = [field for field, _ in sort if field != "_id" and field not in projection]
+        projection.update({field: 1 for field in hidden})
+    return projection, hidden
+
+
+def finish_page(docs: list, sort, limit: int, hidden=()):
+    """Trim a limit+1 fetch to one page; return (items, next_after)."""
+    next_after = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_after = [docs[-1].get(field) for field, _ in sort]
+    for doc in docs:
+        doc.pop("_id", None)
+        for field in hidden:
+            doc.pop(field, None)
+    return docs, next_after
+
+
+async def fetch_page(collection, query: dict, sort, limit: int, after: Optional[list] = None, projection: Optional[dict] = None):
+    """Return (items, next_after); next_after is None on the last page."""
+    projection, hidden = _page_projection(projection, sort)
+    cursor = collection.find(_after_query(query, sort, after), projection or None).sort(list(sort)).limit(limit + 1)
+    docs = await cursor.to_list(limit + 1)
+    return finish_page(docs, sort, limit, hidden)
+
+
+async def paginate(collection, query: dict, sort, limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None, projection: Optional[dict] = None) -> dict:
+    after = decode_cursor(cursor) if cursor else None
+    items, next_after = await fetch_page(collection, query, sort, limit, after, projection)
+    return {
+        "items": items,
+        "next_cursor": encode_cursor(next_after) if next_after is not None else None,
+    }
@@ -0,0 +1,71 @@
+"""bcrypt hashing on a bounded thread pool so logins don't block the event loop."""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from fastapi import HTTPException
+
+
+class PasswordHasher:
+    # bcrypt releases the GIL while hashing, so a thread pool gives real parallelism
+    # without the pickling overhead of a process pool.
+
+    def __init__(self, rounds: int = 12, max_workers: int = 4, max_queue: int = 64):
+        self.rounds = rounds
+        self._context = None
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bcrypt")
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.rejected = 0
+        self.rehashed = 0
+
+    @property
+    def context(self):
+        # passlib and its bcrypt backend load on first use, not at import
+        if self._context is None:
+            from passlib.context import CryptContext
+            self._context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=self.rounds)
+        return self._context
+
+    async def warm(self):
+        # Load the bcrypt backend off the event loop so the first login doesn't pay for it
+        await asyncio.get_running_loop().run_in_executor(self._executor, lambda: self.context.handler().get_backend())
+
+    async def _run(self, fn, *args):
+        # in_flight counts running + queued jobs; anything past the cap is queue overflow
+        if self.in_flight >= self.max_workers + self.max_queue:
+            self.rejected += 1
+            raise HTTPException(status_code=503, detail="Authentication service busy, try again shortly")
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self.in_flight -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self.context.hash, password)
+
+    async def verify_and_update(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        # Returns a replacement hash when the stored one uses outdated settings (e.g. cost factor)
+        verified, new_hash = await self._run(self.context.verify_and_update, password, hashed)
+        if new_hash:
+            self.rehashed += 1
+        return verified, new_hash
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "queue_depth": max(0, self.in_flight - self.max_workers),
+            "peak_in_flight": self.peak_in_flight,
+            "rejected": self.rejected,
+            "rehashed": self.rehashed,
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
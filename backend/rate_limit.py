@@ -0,0 +1,170 @@
+"""Token-bucket rate limiting keyed on client IP or on the signed-in user.
+
+Every (rule, key) pair has a bucket of up to `burst` tokens that refills continuously
+at count/period tokens per second. A request takes one token or is refused with 429
+and a Retry-After saying when the next token arrives. Refill is worked out on access,
+so a check is one dict lookup and idle buckets cost nothing but memory (bounded by
+LRU eviction). MemoryRateLimiter keeps buckets per worker; RedisRateLimiter
+(redis_rate_limit.py) shares them, so N workers don't each grant the full rate.
+
+IP-keyed rules need the real client address. X-Forwarded-For is only believed when the
+peer is a configured trusted proxy; otherwise anyone could pick their own bucket, and
+behind an untrusted-but-unconfigured proxy every client would share the proxy's.
+"""
+import abc
+import ipaddress
+import math
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Union
+
+from fastapi import Depends, HTTPException
+from starlette.requests import HTTPConnection
+
+
+class Rule:
+
+    def __init__(self, count: int, period: float, burst: Optional[int] = None):
+        if count <= 0 or period <= 0:
+            raise ValueError("Rate limit count and period must be positive")
+        self.count = count
+        self.period = period
+        self.burst = burst or count
+        self.rate = count / period  # tokens per second
+
+    @classmethod
+    def parse(cls, spec: str) -> "Rule":
+        # "30/60" = 30 requests per 60 seconds
+        count, _, period = spec.partition("/")
+        return cls(int(count), float(period or 1))
+
+    def __repr__(self):
+        return f"{self.count}/{self.period:g}s"
+
+
+def parse_rules(spec: str) -> Dict[str, Rule]:
+    # "default=600/60,login=10/60"
+    rules = {}
+    for item in (part.strip() for part in spec.split(",") if part.strip()):
+        name, _, rule = item.partition("=")
+        rules[name.strip()] = Rule.parse(rule.strip())
+    return rules
+
+
+def parse_networks(spec: str) -> List[Union[ipaddress.IPv4Network, ipaddress.IPv6Network]]:
+    # "10.0.0.0/8,192.168.1.7"
+    return [ipaddress.ip_network(item.strip(), strict=False) for item in spec.split(",") if item.strip()]
+
+
+def _trusted(address: str, trusted_proxies) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in trusted_proxies)
+
+
+def client_ip(connection: HTTPConnection, trusted_proxies=()) -> str:
+    peer = connection.client.host if connection.client else "unknown"
+    if not _trusted(peer, trusted_proxies):
+        return peer
+    # Each proxy appends the address it got the request from, so walk from the right
+    # past our own proxies; the first address they didn't add is the client
+    hops = [hop.strip() for hop in connection.headers.get("x-forwarded-for", "").split(",") if hop.strip()]
+    for hop in reversed(hops):
+        if not _trusted(hop, trusted_proxies):
+            return hop
+    return hops[0] if hops else peer
+
+
+class RateLimiterBackend(abc.ABC):
+
+    async def close(self):
+        pass
+
+    @abc.abstractmethod
+    async def take(self, key: str, rule: Rule) -> float:
+        """Take a token; returns 0 if allowed, else seconds until one is available."""
+
+    @abc.abstractmethod
+    def stats(self) -> dict:
+        pass
+
+
+class MemoryRateLimiter(RateLimiterBackend):
+    # Single-process backend. Limits are per worker; use RedisRateLimiter for several.
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, tuple]" = OrderedDict()
+        self.evictions = 0
+
+    async def take(self, key: str, rule: Rule) -> float:
+        now = time.monotonic()
+        tokens, updated = self._buckets.pop(key, (rule.burst, now))
+        tokens = min(rule.burst, tokens + (now - updated) * rule.rate)
+        if tokens >= 1:
+            tokens -= 1
+            wait = 0.0
+        else:
+            wait = (1 - tokens) / rule.rate
+        # Re-inserted at the end, so the least recently seen bucket is evicted first;
+        # an evicted bucket comes back full, which only errs towards allowing
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+            self.evictions += 1
+        return wait
+
+    def stats(self) -> dict:
+        return {"backend": "memory", "buckets": len(self._buckets), "max_keys": self.max_keys, "evictions": self.evictions}
+
+
+class RateLimits:
+    """Named rules plus the FastAPI dependencies that enforce them."""
+
+    def __init__(self, backend: RateLimiterBackend, rules: Dict[str, Rule], enabled: bool = True, trusted_proxies=()):
+        self.backend = backend
+        self.rules = rules
+        self.enabled = enabled
+        self.trusted_proxies = list(trusted_proxies)
+        self.allowed: Dict[str, int] = {}
+        self.limited: Dict[str, int] = {}
+
+    async def check(self, rule_name: str, key: str):
+        rule = self.rules.get(rule_name)
+        if not self.enabled or rule is None:
+            return
+        wait = await self.backend.take(f"{rule_name}:{key}", rule)
+        if wait > 0:
+            self.limited[rule_name] = self.limited.get(rule_name, 0) + 1
+            raise HTTPException(
+                status_code=429,
+                detail="Too many requests, slow down",
+                headers={"Retry-After": str(math.ceil(wait))}
+            )
+        self.allowed[rule_name] = self.allowed.get(rule_name, 0) + 1
+
+    def by_ip(self, rule_name: str):
+        async def limit_by_ip(connection: HTTPConnection):
+            # WebSocket handshakes are left alone; a 429 can't be sent on them
+            if connection.scope["type"] == "http":
+                await self.check(rule_name, client_ip(connection, self.trusted_proxies))
+        return limit_by_ip
+
+    def by_user(self, rule_name: str, current_user_dependency):
+        # FastAPI caches dependencies per request, so the route's own
+        # Depends(get_current_user) reuses this lookup
+        async def limit_by_user(current_user: dict = Depends(current_user_dependency)):
+            await self.check(rule_name, current_user["email"])
+        return limit_by_user
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "rules": {name: repr(rule) for name, rule in self.rules.items()},
+            "trusted_proxies": [str(network) for network in self.trusted_proxies],
+            "allowed": dict(self.allowed),
+            "limited": dict(self.limited),
+            **self.backend.stats(),
+        }
@@ -0,0 +1,100 @@
+"""Reading progress and bookmarks, kept in one compact document per user.
+
+    {_id: email,
+     universes: {<key>: {universe_id, last_chapter, position, updated_at, read: {<word>: bits}}},
+     bookmarks: {<key>_<chapter>: {universe_id, chapter_number, created_at}}}
+
+<key> is a short hash of the universe title, since titles may contain "." or "$" and
+can't be used in update paths. Chapters read form a bitmap split into 63-bit words and
+set with $bit, so updates from several tabs or workers merge instead of overwriting.
+Position updates arrive on every scroll; they go through the write-behind aggregator,
+so each reader costs at most one upsert per flush interval.
+"""
+import hashlib
+from datetime import datetime, timezone
+from typing import Dict, List
+
+COLLECTION = "reading_progress"
+WORD_BITS = 63  # stays clear of the int64 sign bit
+READ_THRESHOLD = 0.9  # scrolled this far = chapter read
+
+
+def universe_key(universe_id: str) -> str:
+    return hashlib.sha1(universe_id.encode("utf-8")).hexdigest()[:12]
+
+
+def chapter_bit(chapter_number: int):
+    index = chapter_number - 1
+    return str(index // WORD_BITS), 1 << (index % WORD_BITS)
+
+
+def chapters_read(words: Dict[str, int]) -> List[int]:
+    chapters = []
+    for word, bits in words.items():
+        base = int(word) * WORD_BITS
+        chapters.extend(base + bit + 1 for bit in range(WORD_BITS) if bits >> bit & 1)
+    return sorted(chapters)
+
+
+def _universe_summary(entry: dict) -> dict:
+    return {
+        "universe_id": entry.get("universe_id"),
+        "last_chapter": entry.get("last_chapter"),
+        "position": entry.get("position", 0.0),
+        "chapters_read": sum(bin(bits).count("1") for bits in entry.get("read", {}).values()),
+        "updated_at": entry.get("updated_at"),
+    }
+
+
+class ReadingProgress:
+
+    def __init__(self, db, aggregator):
+        self.collection = db[COLLECTION]
+        self.aggregator = aggregator
+
+    def record(self, email: str, universe_id: str, chapter_number: int, position: float):
+        prefix = f"universes.{universe_key(universe_id)}"
+        record = self.aggregator.set
+        record(COLLECTION, email, f"{prefix}.universe_id", universe_id, upsert=True)
+        record(COLLECTION, email, f"{prefix}.last_chapter", chapter_number, upsert=True)
+        record(COLLECTION, email, f"{prefix}.position", position, upsert=True)
+        record(COLLECTION, email, f"{prefix}.updated_at", datetime.now(timezone.utc).isoformat(), upsert=True)
+        if position >= READ_THRESHOLD:
+            word, mask = chapter_bit(chapter_number)
+            self.aggregator.bit_or(COLLECTION, email, f"{prefix}.read.{word}", mask, upsert=True)
+
+    async def _load(self, email: str, projection=None) -> dict:
+        doc = await self.collection.find_one({"_id": email}, projection) or {}
+        return self.aggregator.overlay(COLLECTION, email, doc)
+
+    async def summary(self, email: str) -> dict:
+        # Everything the profile page shows, from a single _id lookup
+        doc = await self._load(email)
+        universes = [_universe_summary(entry) for entry in doc.get("universes", {}).values()]
+        universes.sort(key=lambda u: u["updated_at"] or "", reverse=True)
+        bookmarks = sorted(doc.get("bookmarks", {}).values(), key=lambda b: b["created_at"], reverse=True)
+        return {"universes": universes, "bookmarks": bookmarks}
+
+    async def universe(self, email: str, universe_id: str) -> dict:
+        key = universe_key(universe_id)
+        doc = await self._load(email, {f"universes.{key}": 1})
+        entry = doc.get("universes", {}).get(key, {"universe_id": universe_id})
+        progress = _universe_summary(entry)
+        progress["read"] = chapters_read(entry.get("read", {}))
+        return progress
+
+    async def add_bookmark(self, email: str, universe_id: str, chapter_number: int) -> dict:
+        # Deliberate clicks, not scroll events: written straight through
+        bookmark = {
+            "universe_id": universe_id,
+            "chapter_number": chapter_number,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+        }
+        field = f"bookmarks.{universe_key(universe_id)}_{chapter_number}"
+        await self.collection.update_one({"_id": email}, {"$set": {field: bookmark}}, upsert=True)
+        return bookmark
+
+    async def remove_bookmark(self, email: str, universe_id: str, chapter_number: int) -> bool:
+        field = f"bookmarks.{universe_key(universe_id)}_{chapter_number}"
+        result = await self.collection.update_one({"_id": email, field: {"$exists": True}}, {"$unset": {field: ""}})
+        return result.modified_count > 0
@@ -0,0 +1,190 @@
+"""Real-time push of new forum posts, forum replies and chapters.
+
+Handlers publish events to named channels ("universe:<id>", "thread:<post_id>",
+"forum"); the hub fans each event out to the connections subscribed to that channel.
+Every connection has a bounded buffer: a client that falls that far behind is
+disconnected rather than letting its backlog grow, and is expected to reload and
+reconnect. With several workers, a broker relays events between them.
+"""
+import asyncio
+import json
+import logging
+import uuid
+from typing import Dict, Iterable, Optional, Set
+
+from pymongo.errors import CollectionInvalid, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+EVENTS_COLLECTION = "realtime_events"
+
+
+class Subscription:
+
+    def __init__(self, buffer_size: int):
+        self.channels: Set[str] = set()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=buffer_size)
+        self.overflowed = False
+        self.closed = False
+
+    def offer(self, message: str) -> bool:
+        if self.overflowed:
+            return False
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            # Wake the sender so it can close the connection
+            self.overflowed = True
+            self.queue.get_nowait()
+            self.queue.put_nowait(None)
+            return False
+
+    async def get(self) -> Optional[str]:
+        # None means the subscription overflowed and should be closed
+        return await self.queue.get()
+
+
+class LocalBroker:
+    """Single worker: events only need to reach this process's subscribers."""
+
+    async def start(self, hub):
+        pass
+
+    async def publish(self, channel: str, message: str):
+        pass
+
+    async def stop(self):
+        pass
+
+
+class ChangeStreamBroker:
+    """Relays events between workers through a capped collection and a change stream.
+
+    Change streams need a replica set (or sharded cluster); on a standalone server the
+    broker logs the failure and each worker only sees its own events.
+    """
+
+    def __init__(self, db, size_bytes: int = 16 * 1024 * 1024, retry_seconds: float = 5.0):
+        self.db = db
+        self.size_bytes = size_bytes
+        self.retry_seconds = retry_seconds
+        self.origin = uuid.uuid4().hex
+        self.relayed = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self, hub):
+        try:
+            await self.db.create_collection(EVENTS_COLLECTION, capped=True, size=self.size_bytes)
+        except CollectionInvalid:
+            pass  # already exists
+        except PyMongoError as exc:
+            logger.error("Could not create %s: %s", EVENTS_COLLECTION, exc)
+        self._task = asyncio.create_task(self._run(hub))
+
+    async def _run(self, hub):
+        pipeline = [{"$match": {"operationType": "insert", "fullDocument.origin": {"$ne": self.origin}}}]
+        while True:
+            try:
+                async with self.db[EVENTS_COLLECTION].watch(pipeline) as stream:
+                    async for change in stream:
+                        event = change["fullDocument"]
+                        hub.dispatch(event["channel"], event["message"])
+                        self.relayed += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Realtime change stream failed; retrying in %.0fs", self.retry_seconds)
+            await asyncio.sleep(self.retry_seconds)
+
+    async def publish(self, channel: str, message: str):
+        await self.db[EVENTS_COLLECTION].insert_one({"channel": channel, "message": message, "origin": self.origin})
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+
+class RealtimeHub:
+
+    def __init__(self, broker=None, buffer_size: int = 100, max_channels: int = 20):
+        self.broker = broker or LocalBroker()
+        self.buffer_size = buffer_size
+        self.max_channels = max_channels
+        self.channels: Dict[str, Set[Subscription]] = {}
+        self.connections = 0
+        self.published = 0
+        self.delivered = 0
+        self.overflows = 0
+
+    def subscribe(self, channels: Iterable[str] = ()) -> Subscription:
+        subscription = Subscription(self.buffer_size)
+        self.connections += 1
+        for channel in channels:
+            self.add_channel(subscription, channel)
+        return subscription
+
+    def add_channel(self, subscription: Subscription, channel: str) -> bool:
+        if subscription.closed:
+            return False
+        if channel not in subscription.channels and len(subscription.channels) >= self.max_channels:
+            return False
+        subscription.channels.add(channel)
+        self.channels.setdefault(channel, set()).add(subscription)
+        return True
+
+    def remove_channel(self, subscription: Subscription, channel: str):
+        subscription.channels.discard(channel)
+        subscribers = self.channels.get(channel)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self.channels[channel]
+
+    def unsubscribe(self, subscription: Subscription):
+        if subscription.closed:
+            return
+        subscription.closed = True
+        for channel in list(subscription.channels):
+            self.remove_channel(subscription, channel)
+        self.connections -= 1
+
+    def dispatch(self, channel: str, message: str):
+        # Never awaits: a slow client can only fill its own buffer
+        for subscription in list(self.channels.get(channel, ())):
+            if subscription.offer(message):
+                self.delivered += 1
+            elif not subscription.closed:
+                self.overflows += 1
+                self.unsubscribe(subscription)
+
+    async def publish(self, channel: str, event_type: str, data: dict):
+        # Serialized once here, not once per subscriber
+        message = json.dumps({"type": event_type, "channel": channel, "data": data}, default=str)
+        self.published += 1
+        self.dispatch(channel, message)
+        try:
+            await self.broker.publish(channel, message)
+        except PyMongoError as exc:
+            # The write has already succeeded; a missed push only delays other workers' clients
+            logger.error("Realtime broker publish failed: %s", exc)
+
+    async def start(self):
+        await self.broker.start(self)
+
+    async def stop(self):
+        await self.broker.stop()
+
+    def stats(self) -> dict:
+        return {
+            "broker": type(self.broker).__name__,
+            "connections": self.connections,
+            "channels": len(self.channels),
+            "published": self.published,
+            "delivered": self.delivered,
+            "overflows": self.overflows,
+        }
@@ -0,0 +1,237 @@
+"""Shared cache backend speaking the Redis protocol, with pub/sub invalidation.
+
+Each worker keeps a short-lived local copy of what it reads (a near cache) in front
+of Redis. Invalidations delete the shared entry and are broadcast on a channel so
+every other worker drops its local copy too. Any Redis-protocol server works; for
+local runs pass a client bound to fakeredis.FakeServer() to RedisCache directly.
+
+Generations (see cache.py) are shared too: invalidations bump a Redis sequence, and
+the shared write is a script that compares it, so a load on one worker can't cache
+what a write on another has just invalidated.
+"""
+import asyncio
+import json
+import logging
+import uuid
+from typing import Any, Hashable, Optional
+
+import redis.asyncio as redis_asyncio
+from bson import json_util
+from redis.exceptions import RedisError
+
+from cache import CacheBackend, Generations, TTLCache
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "fv:cache:invalidate"
+
+# KEYS: entry, key generation[, group generation, group members]
+# ARGV: generation taken before the load ('' to store unconditionally), value, ttl in ms
+SET_IF_CURRENT_SCRIPT = """
+if ARGV[1] ~= '' then
+    local generation = tonumber(ARGV[1])
+    for i = 2, math.min(#KEYS, 3) do
+        if tonumber(redis.call('GET', KEYS[i]) or '0') > generation then
+            return 0
+        end
+    end
+end
+redis.call('SET', KEYS[1], ARGV[2], 'PX', ARGV[3])
+if KEYS[4] then
+    redis.call('SADD', KEYS[4], KEYS[1])
+    redis.call('PEXPIRE', KEYS[4], ARGV[3])
+end
+return 1
+"""
+
+# KEYS: sequence, generation of the invalidated key or group; ARGV: generation ttl in ms
+BUMP_SCRIPT = """
+local seq = redis.call('INCR', KEYS[1])
+redis.call('SET', KEYS[2], seq, 'PX', ARGV[1])
+return seq
+"""
+
+
+def _freeze(value):
+    # JSON turns tuple keys into lists; turn them back so they hash like the originals
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+class RedisCache(CacheBackend):
+
+    def __init__(self, redis, ttl: float = 60.0, local_max_entries: int = 1024, local_ttl: float = 5.0, prefix: str = "fv:cache:"):
+        self.redis = redis
+        self.ttl = ttl
+        self.prefix = prefix
+        self.local = TTLCache(max_entries=local_max_entries, ttl=min(local_ttl, ttl))
+        # Local invalidations and received broadcasts, for the near cache
+        self.generations = Generations()
+        self._set_if_current = redis.register_script(SET_IF_CURRENT_SCRIPT)
+        self._bump = redis.register_script(BUMP_SCRIPT)
+        self.instance_id = uuid.uuid4().hex
+        self.stale_sets = 0
+        self.shared_hits = 0
+        self.shared_misses = 0
+        self.errors = 0
+        self.broadcasts_sent = 0
+        self.broadcasts_received = 0
+        self._listener: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs) -> "RedisCache":
+        return cls(redis_asyncio.from_url(url), **kwargs)
+
+    def _key(self, key: Hashable) -> str:
+        return self.prefix + json.dumps(key, separators=(",", ":"))
+
+    def _group_key(self, group: Hashable) -> str:
+        return self.prefix + "group:" + json.dumps(group, separators=(",", ":"))
+
+    def _generation_key(self, name) -> str:
+        return self.prefix + "gen:" + json.dumps(name, separators=(",", ":"))
+
+    async def _bump_shared(self, name):
+        # Outlives any load that could have started before this invalidation
+        await self._bump(keys=[self.prefix + "seq", self._generation_key(name)], args=[int(self.ttl * 2000)])
+
+    async def start(self):
+        self._listener = asyncio.create_task(self._listen())
+
+    async def close(self):
+        if self._listener:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+        await self.redis.aclose()
+
+    async def _listen(self):
+        while True:
+            pubsub = self.redis.pubsub()
+            try:
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        self._apply_broadcast(message["data"])
+            except asyncio.CancelledError:
+                await pubsub.aclose()
+                raise
+            except (RedisError, OSError) as exc:
+                # Broadcasts may have been missed while disconnected, so drop the near cache
+                logger.warning("Cache invalidation subscriber disconnected: %s", exc)
+                self.local.clear()
+                await pubsub.aclose()
+                await asyncio.sleep(1)
+
+    def _apply_broadcast(self, data):
+        payload = json.loads(data)
+        if payload.get("origin") == self.instance_id:
+            return
+        self.broadcasts_received += 1
+        for key in payload.get("keys", []):
+            self.generations.bump(("key", _freeze(key)))
+            self.local.delete(_freeze(key))
+        for group in payload.get("groups", []):
+            self.generations.bump(("group", _freeze(group)))
+            self.local.invalidate_group(_freeze(group))
+
+    async def _broadcast(self, keys=(), groups=()):
+        message = json.dumps({"origin": self.instance_id, "keys": list(keys), "groups": list(groups)})
+        await self.redis.publish(INVALIDATION_CHANNEL, message)
+        self.broadcasts_sent += 1
+
+    async def get(self, key: Hashable, default: Any = None) -> Any:
+        value = self.local.get(key, default)
+        if value is not default:
+            return value
+        try:
+            raw = await self.redis.get(self._key(key))
+        except (RedisError, OSError) as exc:
+            self.errors += 1
+            logger.warning("Shared cache read failed: %s", exc)
+            return default
+        if raw is None:
+            self.shared_misses += 1
+            return default
+        self.shared_hits += 1
+        entry = json_util.loads(raw)
+        group = _freeze(entry["g"])
+        self.local.set(key, entry["v"], group=group)
+        return entry["v"]
+
+    async def generation(self, key: Hashable):
+        # (shared sequence, local sequence); the shared part is None while Redis is down
+        try:
+            shared = int(await self.redis.get(self.prefix + "seq") or 0)
+        except (RedisError, OSError) as exc:
+            self.errors += 1
+            logger.warning("Shared cache read failed: %s", exc)
+            shared = None
+        return shared, self.generations.seq
+
+    async def set(self, key: Hashable, value: Any, group: Optional[Hashable] = None, ttl: Optional[float] = None, generation: Any = None):
+        if generation is not None:
+            shared_generation, local_generation = generation
+            if shared_generation is None:
+                # Redis was unreachable when the load began, so it can't be checked
+                return
+            if self.generations.changed(local_generation, ("key", key), ("group", group)):
+                self.stale_sets += 1
+                return
+        ttl = self.ttl if ttl is None else ttl
+        keys = [self._key(key), self._generation_key(["key", key])]
+        if group is not None:
+            keys += [self._generation_key(["group", group]), self._group_key(group)]
+        try:
+            stored = await self._set_if_current(
+                keys=keys,
+                args=["" if generation is None else generation[0], json_util.dumps({"g": group, "v": value}), int(ttl * 1000)]
+            )
+        except (RedisError, OSError) as exc:
+            self.errors += 1
+            logger.warning("Shared cache write failed: %s", exc)
+            return
+        if not stored:
+            self.stale_sets += 1
+            return
+        self.local.set(key, value, group=group)
+
+    async def delete(self, key: Hashable):
+        self.generations.bump(("key", key))
+        self.local.delete(key)
+        try:
+            await self._bump_shared(["key", key])
+            await self.redis.delete(self._key(key))
+            await self._broadcast(keys=[key])
+        except (RedisError, OSError) as exc:
+            self.errors += 1
+            logger.error("Shared cache invalidation failed for %s: %s", key, exc)
+
+    async def invalidate_group(self, group: Hashable):
+        self.generations.bump(("group", group))
+        self.local.invalidate_group(group)
+        group_key = self._group_key(group)
+        try:
+            await self._bump_shared(["group", group])
+            members = await self.redis.smembers(group_key)
+            await self.redis.delete(group_key, *members)
+            await self._broadcast(groups=[group])
+        except (RedisError, OSError) as exc:
+            self.errors += 1
+            logger.error("Shared cache invalidation failed for group %s: %s", group, exc)
+
+    def stats(self) -> dict:
+        return {
+            "backend": "redis",
+            "ttl_seconds": self.ttl,
+            "stale_sets": self.stale_sets,
+            "shared_hits": self.shared_hits,
+            "shared_misses": self.shared_misses,
+            "errors": self.errors,
+            "broadcasts_sent": self.broadcasts_sent,
+            "broadcasts_received": self.broadcasts_received,
+            "local": self.local.stats(),
+        }
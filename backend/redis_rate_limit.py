@@ -0,0 +1,62 @@
+"""Rate-limit buckets shared between workers in a Redis-protocol store.
+
+The refill-and-take step runs as one Lua script, so concurrent workers can't both
+spend the last token, and it reads the clock from Redis (TIME) so worker clock skew
+doesn't matter. Buckets expire once they would have refilled completely. If Redis is
+unreachable requests are allowed: a limiter outage shouldn't become an API outage.
+"""
+import logging
+
+import redis.asyncio as redis_asyncio
+from redis.exceptions import RedisError
+
+from rate_limit import RateLimiterBackend, Rule
+
+logger = logging.getLogger(__name__)
+
+TAKE_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or burst
+local updated = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000))
+return tostring(wait)
+"""
+
+
+class RedisRateLimiter(RateLimiterBackend):
+
+    def __init__(self, redis, prefix: str = "fv:ratelimit:"):
+        self.redis = redis
+        self.prefix = prefix
+        self._take = redis.register_script(TAKE_SCRIPT)
+        self.errors = 0
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs) -> "RedisRateLimiter":
+        return cls(redis_asyncio.from_url(url), **kwargs)
+
+    async def take(self, key: str, rule: Rule) -> float:
+        try:
+            return float(await self._take(keys=[self.prefix + key], args=[rule.rate, rule.burst]))
+        except (RedisError, OSError) as exc:
+            self.errors += 1
+            logger.warning("Rate limiter unavailable, allowing request: %s", exc)
+            return 0.0
+
+    async def close(self):
+        await self.redis.aclose()
+
+    def stats(self) -> dict:
+        return {"backend": "redis", "errors": self.errors}
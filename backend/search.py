@@ -0,0 +1,317 @@
+"""In-process BM25 search over universes, chapters, characters, lore and forum posts.
+
+The inverted index lives in each worker. It is built from MongoDB in the background at
+startup, updated directly by the create/update handlers, and topped up periodically with
+documents other workers inserted (an _id past the last one seen) or edited (an
+updated_at since the previous sync). Only postings and a little display metadata are
+kept in memory; snippet text is fetched from MongoDB for the page of results being
+returned. Scoring and index updates run on one thread of their own, in the order they
+were submitted, so a query never holds up the event loop or sees a half-applied update.
+"""
+import asyncio
+import heapq
+import html
+import logging
+import math
+import re
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional
+
+from bson import ObjectId
+
+logger = logging.getLogger(__name__)
+
+# type -> (collection, {field: weight}, snippet fields in order of preference)
+SEARCH_TYPES = {
+    "universe": ("universes", {"title": 3, "genre": 2, "description": 1}, ("description",)),
+    "chapter": ("stories", {"title": 3, "content": 1}, ("content",)),
+    "character": ("characters", {"name": 3, "traits": 2, "description": 1, "backstory": 1}, ("description", "backstory")),
+    "lore": ("lore", {"title": 3, "category": 2, "content": 1}, ("content",)),
+    "forum_post": ("forum_posts", {"title": 3, "tags": 2, "content": 1}, ("content",)),
+}
+
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have he her his i in is it its of on or "
+    "she that the their them they this to was were will with you your".split()
+)
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# Edits are re-read from this far before the previous sync, to allow for clock skew
+# between workers; indexing a document twice is harmless
+EDIT_OVERLAP = timedelta(seconds=60)
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+def _field_text(value) -> str:
+    if isinstance(value, (list, tuple)):
+        return " ".join(str(v) for v in value)
+    return str(value) if value is not None else ""
+
+
+def _display_meta(doc_type: str, doc: dict) -> dict:
+    meta = {"title": doc.get("name") if doc_type == "character" else doc.get("title")}
+    if doc_type == "universe":
+        meta["universe_id"] = doc.get("title")
+    elif doc_type in ("chapter", "character", "lore"):
+        meta["universe_id"] = doc.get("universe_id")
+    if doc_type == "chapter":
+        meta["chapter_number"] = doc.get("chapter_number")
+    if doc_type == "forum_post":
+        meta["category"] = doc.get("category")
+    return meta
+
+
+class SearchIndex:
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, common_term_ratio: float = 0.25, loaders: Optional[dict] = None):
+        # loaders: doc type -> async fn(db, docs) filling in fields not stored on the document itself
+        self.loaders = loaders or {}
+        self.k1 = k1
+        self.b = b
+        self.common_term_ratio = common_term_ratio
+        # term -> doc type -> {(doc type, id): weighted tf}; split by type so type filters skip whole lists
+        self.postings: Dict[str, Dict[str, Dict[tuple, float]]] = {}
+        self.doc_freq: Dict[str, int] = {}
+        self.doc_terms: Dict[tuple, tuple] = {}
+        self.doc_lengths: Dict[tuple, float] = {}
+        self.doc_meta: Dict[tuple, dict] = {}
+        self.total_length = 0.0
+        self.ready = False
+        self.queries = 0
+        self.query_seconds = 0.0
+        self._last_ids: Dict[str, object] = {}
+        self._synced_at: Optional[datetime] = None
+        self._task: Optional[asyncio.Task] = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="search-index")
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    # ---------- indexing ----------
+
+    def add(self, doc_type: str, doc_id: str, doc: dict):
+        key = (doc_type, doc_id)
+        if key in self.doc_lengths:
+            self.remove(doc_type, doc_id)
+
+        _, weights, _ = SEARCH_TYPES[doc_type]
+        frequencies: Counter = Counter()
+        length = 0.0
+        for field, weight in weights.items():
+            tokens = tokenize(_field_text(doc.get(field)))
+            length += weight * len(tokens)
+            for token in tokens:
+                frequencies[token] += weight
+
+        for term, tf in frequencies.items():
+            self.postings.setdefault(term, {}).setdefault(doc_type, {})[key] = tf
+            self.doc_freq[term] = self.doc_freq.get(term, 0) + 1
+        self.doc_terms[key] = tuple(frequencies)
+        self.doc_lengths[key] = length
+        self.doc_meta[key] = _display_meta(doc_type, doc)
+        self.total_length += length
+
+    def remove(self, doc_type: str, doc_id: str):
+        key = (doc_type, doc_id)
+        if key not in self.doc_lengths:
+            return
+        for term in self.doc_terms.pop(key):
+            by_type = self.postings.get(term, {})
+            postings = by_type.get(doc_type)
+            if postings is None or postings.pop(key, None) is None:
+                continue
+            if not postings:
+                del by_type[doc_type]
+            self.doc_freq[term] -= 1
+            if not self.doc_freq[term]:
+                del self.doc_freq[term]
+                del self.postings[term]
+        self.total_length -= self.doc_lengths.pop(key)
+        self.doc_meta.pop(key, None)
+
+    # ---------- querying ----------
+
+    def search(self, query: str, types: Optional[Iterable[str]] = None, universe_id: Optional[str] = None, limit: int = 20):
+        """Return (total_matches, [(score, key), ...]) best first."""
+        started = time.perf_counter()
+        n_docs = len(self.doc_lengths)
+        terms = [t for t in set(tokenize(query)) if t in self.doc_freq]
+        if not terms or not n_docs:
+            return 0, []
+
+        # Terms in most documents score almost nothing but dominate the work; when the
+        # query has anything more selective, treat them like stopwords.
+        selective = [t for t in terms if self.doc_freq[t] <= n_docs * self.common_term_ratio]
+        terms = selective or terms
+
+        k1, b = self.k1, self.b
+        length_factor = k1 * b * n_docs / (self.total_length or 1.0)
+        base = k1 * (1 - b)
+        doc_lengths, doc_meta = self.doc_lengths, self.doc_meta
+        scores: Dict[tuple, float] = {}
+        for term in terms:
+            df = self.doc_freq[term]
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5)) * (k1 + 1)
+            for doc_type, postings in self.postings[term].items():
+                if types and doc_type not in types:
+                    continue
+                for key, tf in postings.items():
+                    if universe_id is not None and doc_meta[key].get("universe_id") != universe_id:
+                        continue
+                    scores[key] = scores.get(key, 0.0) + idf * tf / (tf + base + length_factor * doc_lengths[key])
+
+        top = heapq.nlargest(limit, ((score, key) for key, score in scores.items()))
+        self.queries += 1
+        self.query_seconds += time.perf_counter() - started
+        return len(scores), top
+
+    def _search_with_meta(self, query: str, types, universe_id, limit: int):
+        total, hits = self.search(query, types=types, universe_id=universe_id, limit=limit)
+        return total, [(score, key, dict(self.doc_meta[key])) for score, key in hits]
+
+    # ---------- event-loop entry points (run on the index thread) ----------
+
+    def _run_on_index_thread(self, fn, *args):
+        return asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    async def query(self, query: str, types: Optional[Iterable[str]] = None, universe_id: Optional[str] = None, limit: int = 20):
+        """search() off the event loop; returns (total_matches, [(score, key, display meta), ...])."""
+        return await self._run_on_index_thread(self._search_with_meta, query, types, universe_id, limit)
+
+    def update(self, doc_type: str, doc_id: str, doc: dict):
+        # Queued ahead of any later query, so a search right after a write sees it
+        future = self._executor.submit(self.add, doc_type, doc_id, dict(doc))
+        future.add_done_callback(self._log_failure)
+
+    @staticmethod
+    def _log_failure(future):
+        if not future.cancelled() and future.exception() is not None:
+            logger.error("Search index update failed", exc_info=future.exception())
+
+    # ---------- syncing with MongoDB ----------
+
+    async def sync(self, db, batch_size: int = 1000):
+        started = datetime.now(timezone.utc)
+        for doc_type, (collection, weights, _) in SEARCH_TYPES.items():
+            projection = {field: 1 for field in weights}
+            projection.update({"universe_id": 1, "chapter_number": 1, "category": 1})
+            # New documents: everything past the last _id seen
+            query = {"_id": {"$gt": self._last_ids[collection]}} if collection in self._last_ids else {}
+            cursor = db[collection].find(query, projection).sort("_id", 1).batch_size(batch_size)
+            async for last_id in self._index_cursor(db, doc_type, cursor):
+                self._last_ids[collection] = last_id
+            # Edited documents: updated_at since the previous sync began
+            if self._synced_at is not None:
+                since = (self._synced_at - EDIT_OVERLAP).isoformat()
+                cursor = db[collection].find({"updated_at": {"$gt": since}}, projection).batch_size(batch_size)
+                async for _ in self._index_cursor(db, doc_type, cursor):
+                    pass
+        self._synced_at = started
+
+    async def _index_cursor(self, db, doc_type: str, cursor):
+        # Yields the last _id of each batch once it is indexed
+        batch = []
+        async for doc in cursor:
+            batch.append(doc)
+            if len(batch) >= 200:
+                yield await self._index_batch(db, doc_type, batch)
+                batch = []
+        if batch:
+            yield await self._index_batch(db, doc_type, batch)
+
+    async def _index_batch(self, db, doc_type: str, docs: List[dict]):
+        loader = self.loaders.get(doc_type)
+        if loader:
+            await loader(db, docs)
+        await self._run_on_index_thread(self._add_batch, doc_type, docs)
+        return docs[-1]["_id"]
+
+    def _add_batch(self, doc_type: str, docs: List[dict]):
+        for doc in docs:
+            self.add(doc_type, str(doc["_id"]), doc)
+
+    async def _run(self, db, refresh_seconds: float):
+        while True:
+            try:
+                await self.sync(db)
+                if not self.ready:
+                    self.ready = True
+                    logger.info("Search index built with %d documents", len(self))
+            except Exception:
+                logger.exception("Search index sync failed")
+            await asyncio.sleep(refresh_seconds)
+
+    def start(self, db, refresh_seconds: float = 30.0):
+        self._task = asyncio.create_task(self._run(db, refresh_seconds))
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    async def snippets(self, db, keys: Iterable[tuple], query: str) -> Dict[tuple, Optional[str]]:
+        # One $in query per result type, for the current page of hits only
+        terms = tokenize(query)
+        by_type: Dict[str, List[str]] = {}
+        for doc_type, doc_id in keys:
+            by_type.setdefault(doc_type, []).append(doc_id)
+
+        snippets = {}
+        for doc_type, doc_ids in by_type.items():
+            collection, _, fields = SEARCH_TYPES[doc_type]
+            ids = [ObjectId(i) if ObjectId.is_valid(i) else i for i in doc_ids]
+            docs = await db[collection].find({"_id": {"$in": ids}}, {field: 1 for field in fields}).to_list(len(ids))
+            loader = self.loaders.get(doc_type)
+            if loader:
+                await loader(db, docs)
+            for doc in docs:
+                snippet = None
+                for field in fields:
+                    snippet = highlight(_field_text(doc.get(field)), terms)
+                    if snippet:
+                        break
+                snippets[(doc_type, str(doc["_id"]))] = snippet
+        return snippets
+
+    def stats(self) -> dict:
+        return {
+            "ready": self.ready,
+            "documents": len(self),
+            "terms": len(self.postings),
+            "queries": self.queries,
+            "avg_query_ms": round(1000 * self.query_seconds / self.queries, 3) if self.queries else 0.0,
+        }
+
+
+def highlight(text: str, terms: Iterable[str], radius: int = 80) -> Optional[str]:
+    """HTML-escaped excerpt around the first match, with matches wrapped in <mark>."""
+    terms = [t for t in terms if t]
+    if not text or not terms:
+        return None
+    pattern = re.compile(r"\b(" + "|".join(re.escape(t) for t in terms) + r")\b", re.IGNORECASE)
+    match = pattern.search(text)
+    if not match:
+        return None
+    start = max(0, match.start() - radius)
+    end = min(len(text), match.end() + radius)
+    # Matches are found on the raw text and each piece escaped on its own, so a term
+    # like "amp" can't match inside an entity the escaping produced
+    parts = []
+    position = start
+    for found in pattern.finditer(text, start, end):
+        parts.append(html.escape(text[position:found.start()]))
+        parts.append(f"<mark>{html.escape(found.group(0))}</mark>")
+        position = found.end()
+    parts.append(html.escape(text[position:end]))
+    return ("…" if start > 0 else "") + "".join(parts) + ("…" if end < len(text) else "")
@@ -0,0 +1,260 @@
+"""Sample content for an empty database, seeded by whichever worker gets there first.
+
+Every worker calls seed() at startup. Once the database has content this costs one
+concurrent round of estimated_document_count calls and nothing else. Otherwise a lease
+document in `startup_locks` lets a single worker seed while the others move on, and each
+sample is upserted on its natural key with $setOnInsert, so a retry after a crash or an
+expired lease never duplicates anything. Production deployments turn it off entirely
+(SEED_SAMPLE_DATA=false).
+"""
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from chapter_bodies import detach_body
+
+logger = logging.getLogger(__name__)
+
+LOCKS = "startup_locks"
+
+SAMPLE_UNIVERSES = [
+    {
+        "title": "Chronicles of Aether",
+        "description": "A mystical realm where magic and technology intertwine. Follow heroes as they navigate floating cities and ancient mysteries.",
+        "type": "Original",
+        "genre": "Fantasy",
+        "author": "Nova Starweaver",
+        "author_email": "nova@fictionverse.io",
+        "status": "active",
+        "is_premium": False
+    },
+    {
+        "title": "Neon Shadows",
+        "description": "In a cyberpunk dystopia, hackers fight against corporate overlords. High-tech thrills meet underground resistance.",
+        "type": "Original",
+        "genre": "Cyberpunk",
+        "author": "Cipher Echo",
+        "author_email": "cipher@fictionverse.io",
+        "status": "active",
+        "is_premium": False
+    },
+    {
+        "title": "The Last Garden",
+        "description": "After Earth's collapse, survivors discover a hidden sanctuary. Hope blooms in the most unexpected places.",
+        "type": "Original",
+        "genre": "Sci-Fi",
+        "author": "Eden Bloom",
+        "author_email": "eden@fictionverse.io",
+        "status": "active",
+        "is_premium": False
+    },
+    {
+        "title": "Wizards United",
+        "description": "Expanding on the magical world we love, new students discover hidden chambers and forgotten spells at Hogwarts.",
+        "type": "Inspired",
+        "genre": "Fantasy",
+        "author": "Mystic Quill",
+        "author_email": "mystic@fictionverse.io",
+        "status": "active",
+        "is_premium": False
+    },
+    {
+        "title": "Middle Earth: The Fourth Age",
+        "description": "Long after the Ring was destroyed, new threats emerge. Descendants of heroes must rise once more.",
+        "type": "Inspired",
+        "genre": "Fantasy",
+        "author": "Ranger's Tale",
+        "author_email": "ranger@fictionverse.io",
+        "status": "active",
+        "is_premium": False
+    },
+    {
+        "title": "Starfleet Academy Chronicles",
+        "description": "Before the Enterprise, cadets learn what it means to explore strange new worlds and seek out new life.",
+        "type": "Inspired",
+        "genre": "Sci-Fi",
+        "author": "Commander Stellar",
+        "author_email": "stellar@fictionverse.io",
+        "status": "active",
+        "is_premium": False
+    }
+]
+
+SAMPLE_STORIES = [
+    {
+        "universe_id": "Neon Shadows",
+        "title": "Chapter 1: The Network Breach",
+        "content": "The city never sleeps, and neither do its digital ghosts. Rain cascaded down the neon-lit streets of Neo-Tokyo as Kira pulled her hood tighter, her neural implant buzzing with encrypted data streams. Tonight's job was supposed to be simple: breach the Omnicorp mainframe, extract the files, disappear into the digital fog. But nothing in the shadows is ever simple.\n\nHer fingers danced across the holographic interface, code flowing like liquid light. The corporation's firewall was a beast—adaptive, learning, almost alive. Almost. Kira had faced worse. In the underworld of cyber-warfare, she was known as Ghost Protocol, a whisper in the machine, impossible to trace.\n\n'You're in,' came the voice through her earpiece. Jax, her partner, monitoring from a safe house across the city. 'But there's movement. Corp security is mobilizing.'\n\n'Let them come,' Kira muttered, her eyes reflecting the cascading data. She had thirty seconds before the trace completed. Thirty seconds to change everything.",
+        "chapter_number": 1,
+        "author": "Cipher Echo",
+        "author_email": "cipher@fictionverse.io",
+        "status": "published"
+    },
+    {
+        "universe_id": "Neon Shadows",
+        "title": "Chapter 2: Corporate Shadows",
+        "content": "The extraction went sideways faster than Kira anticipated. Omnicorp wasn't just another megacorp—they had something new, something dangerous. As the data flooded her neural interface, fragmented images flashed: black sites, human experiments, a project codenamed 'Eclipse.'\n\n'Ghost, you need to abort!' Jax's voice cracked with static. 'They're using hunter-drones. Military grade!'\n\nKira's heart raced as she severed the connection, yanking the data spike from the terminal. The warehouse erupted in crimson warning lights. Through the grimy windows, she saw them: sleek, spider-like drones descending from the perpetual smog, their optical sensors scanning for heat signatures.\n\nShe bolted for the fire escape, her augmented legs propelling her up the rusted ladder. Behind her, plasma rounds scorched the metal, melting through decades of corrosion. The city sprawled beneath her, a labyrinth of light and shadow. Somewhere in that maze, answers waited. And so did the people who wanted her dead.",
+        "chapter_number": 2,
+        "author": "Cipher Echo",
+        "author_email": "cipher@fictionverse.io",
+        "status": "published"
+    }
+]
+
+SAMPLE_CHARACTERS = [
+    {
+        "universe_id": "Neon Shadows",
+        "name": "Kira 'Ghost Protocol' Chen",
+        "description": "Elite hacker and data thief operating in Neo-Tokyo's underbelly",
+        "role": "protagonist",
+        "traits": ["Brilliant", "Resourceful", "Haunted by past", "Loyal"],
+        "backstory": "Once a corporate security analyst, Kira witnessed Omnicorp's dark experiments firsthand. She faked her death and emerged as Ghost Protocol, dedicated to exposing corporate corruption one breach at a time."
+    },
+    {
+        "universe_id": "Neon Shadows",
+        "name": "Jax Rivera",
+        "description": "Former military tech specialist and Kira's trusted partner",
+        "role": "supporting",
+        "traits": ["Tactical", "Protective", "Tech-savvy", "Cynical"],
+        "backstory": "Discharged after questioning orders, Jax found purpose in the underground resistance. His military connections provide invaluable intel."
+    }
+]
+
+SAMPLE_LORE = [
+    {
+        "universe_id": "Neon Shadows",
+        "title": "Neo-Tokyo Overview",
+        "content": "Neo-Tokyo rose from the ashes of the old world, a vertical city of impossible scale. Three hundred million souls packed into megastructures that pierce the perpetual smog. The upper levels belong to the elite, bathed in artificial sunlight. The lower levels—the Undercity—exist in eternal twilight, where the law is whatever the corps say it is.",
+        "category": "geography"
+    },
+    {
+        "universe_id": "Neon Shadows",
+        "title": "Neural Implants",
+        "content": "Every citizen above Level 50 has neural implants—direct brain-computer interfaces that allow seamless interaction with the digital world. But the corps control the firmware. Every thought, every transaction, monitored. In the Undercity, hackers trade in black-market mods that promise freedom. At a price.",
+        "category": "technology"
+    }
+]
+
+SAMPLE_CLUBS = [
+    {
+        "name": "Cyberpunk Writers Circle",
+        "description": "A community for architects crafting dystopian futures and neon-soaked narratives",
+        "type": "writing",
+        "creator": "System",
+        "members": []
+    },
+    {
+        "name": "Fantasy Realm Readers",
+        "description": "Travelers who explore magical universes and epic quests together",
+        "type": "reading",
+        "creator": "System",
+        "members": []
+    }
+]
+
+SAMPLE_FORUM_POSTS = [
+    {
+        "title": "Theory: Is Project Eclipse connected to the old world governments?",
+        "content": "I've been reading through the Neon Shadows chapters and noticed some interesting details about Project Eclipse. The timing of the experiments coincides with the fall of the UN. Anyone else notice this pattern?",
+        "author": "DataHunter",
+        "author_email": "hunter@fictionverse.io",
+        "category": "theory",
+        "tags": ["Neon Shadows", "Eclipse", "Theory"],
+        "replies_count": 0,
+        "first_replies": [],
+        "replies_embedded": True
+    },
+    {
+        "title": "Writing Critique: How to write better dialogue in cyberpunk settings?",
+        "content": "Fellow architects, I'm working on my own cyber-noir universe and struggling with authentic-feeling dialogue. It either sounds too modern or too forced. Any tips from experienced writers here?",
+        "author": "NoviceArchitect",
+        "author_email": "novice@fictionverse.io",
+        "category": "critique",
+        "tags": ["Writing Tips", "Cyberpunk", "Dialogue"],
+        "replies_count": 0,
+        "first_replies": [],
+        "replies_embedded": True
+    }
+]
+
+SAMPLE_CHALLENGES = [
+    {
+        "title": "The 100-Word Universe Challenge",
+        "description": "Create an entire universe in exactly 100 words. Show us a world worth exploring.",
+        "prompt": "In 100 words, describe a unique fictional universe. Include: setting, one character, one conflict, and the rules that make your world distinct. Make every word count.",
+        "type": "worldbuilding",
+        "deadline": None,
+        "submissions": []
+    }
+]
+
+# (collection, natural key, documents); created_at is stamped when they are written
+SEEDS = [
+    ("universes", ("title",), SAMPLE_UNIVERSES),
+    ("stories", ("universe_id", "chapter_number"), SAMPLE_STORIES),
+    ("characters", ("universe_id", "name"), SAMPLE_CHARACTERS),
+    ("lore", ("universe_id", "title"), SAMPLE_LORE),
+    ("clubs", ("name",), SAMPLE_CLUBS),
+    ("forum_posts", ("title",), SAMPLE_FORUM_POSTS),
+    ("challenges", ("title",), SAMPLE_CHALLENGES),
+]
+
+
+async def acquire_lock(db, name: str, owner: str, lease_seconds: float) -> bool:
+    # Taken if free, expired (its holder died mid-seed) or already ours
+    now = datetime.now(timezone.utc)
+    try:
+        await db[LOCKS].find_one_and_update(
+            {"_id": name, "$or": [{"owner": owner}, {"expires_at": {"$lt": now}}]},
+            {"$set": {"owner": owner, "expires_at": now + timedelta(seconds=lease_seconds)}},
+            upsert=True
+        )
+        return True
+    except DuplicateKeyError:
+        # The filter missed, so the upsert collided with a live holder's document
+        return False
+
+
+async def release_lock(db, name: str, owner: str):
+    await db[LOCKS].delete_one({"_id": name, "owner": owner})
+
+
+async def _seed_collection(db, chapter_bodies, collection: str, key, documents) -> int:
+    now = datetime.now(timezone.utc).isoformat()
+    documents = [dict(doc, created_at=now) for doc in documents]
+    bodies = [detach_body(doc) for doc in documents] if collection == "stories" else None
+    operations = [UpdateOne({field: doc[field] for field in key}, {"$setOnInsert": doc}, upsert=True) for doc in documents]
+    result = await db[collection].bulk_write(operations, ordered=False)
+    if bodies and result.upserted_ids:
+        # Only chapters inserted by this run get a body; existing ones keep theirs
+        await chapter_bodies.save_many({story_id: bodies[index] for index, story_id in result.upserted_ids.items()})
+    return result.upserted_count
+
+
+async def seed(db, chapter_bodies, lease_seconds: float = 60.0) -> dict:
+    counts = await asyncio.gather(*(db[collection].estimated_document_count() for collection, _, _ in SEEDS))
+    empty = [seed for seed, count in zip(SEEDS, counts) if count == 0]
+    if not empty:
+        return {}
+
+    owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+    if not await acquire_lock(db, "seed", owner, lease_seconds):
+        logger.info("Another worker is seeding sample data; skipping")
+        return {}
+    try:
+        inserted = await asyncio.gather(*(
+            _seed_collection(db, chapter_bodies, collection, key, documents) for collection, key, documents in empty
+        ))
+    finally:
+        await release_lock(db, "seed", owner)
+
+    seeded = {collection: count for (collection, _, _), count in zip(empty, inserted) if count}
+    for collection, count in seeded.items():
+        logger.info("Seeded %d sample %s", count, collection.replace("_", " "))
+    return seeded
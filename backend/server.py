@@ -1,7 +1,8 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Response, Cookie, Depends
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, APIRouter, HTTPException, Request, Response, Cookie, Depends, Query, WebSocket
+from fastapi.responses import JSONResponse, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
+from starlette.middleware.gzip import GZipMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
 import logging
@@ -9,31 +10,206 @@ from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict, EmailStr
 from typing import List, Optional
 import uuid
+import asyncio
+import json
 from datetime import datetime, timezone, timedelta
-from passlib.context import CryptContext
 import jwt
+from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+
+from admin_users import ADMIN_ROLE
+from auth_tokens import TokenVerifier
+from cache import MemoryCache
+from chapter_bodies import ChapterBodyStore, count_words, detach_body, make_excerpt
+from counters import CounterAggregator
+from http_caching import conditional_get
+from indexes import ensure_indexes, explain_query_shapes
+from json_responses import FastJSONResponse, FastJSONRoute
+from metrics import CommandMonitor, RequestMetrics, RequestMetricsMiddleware
+from migrations import completed as completed_migrations, run_migrations as run_pending_migrations
+from mongo_pool import PoolMonitor, Readiness, available_compressors, read_preference
+from pagination import (
+    DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, CHAPTER_SORT, INSERTION_SORT, NEWEST_FIRST_SORT, OLDEST_FIRST_SORT,
+    decode_cursor, encode_cursor, fetch_page, paginate, parse_fields,
+)
+from passwords import PasswordHasher
+from rate_limit import MemoryRateLimiter, RateLimits, parse_networks, parse_rules
+from reading_progress import ReadingProgress
+from realtime import ChangeStreamBroker, RealtimeHub
+from search import SEARCH_TYPES, SearchIndex
+from single_flight import SingleFlight
+from seeding import seed as seed_sample_data
+from startup_profile import StartupProfiler
+from universe_archive import UniverseImporter, export_universe, iter_lines
+from universe_overviews import UniverseOverviews
+
+# Init cost per component (see startup_profile.py; imports are profiled separately)
+startup_profiler = StartupProfiler()
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
+startup_profiler.mark("config")
+
+# Per-route latency, MongoDB time and response size (GET /metrics)
+request_metrics = RequestMetrics(slow_request_seconds=float(os.environ.get('SLOW_REQUEST_MS', '500')) / 1000)
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', '100'))
+pool_monitor = PoolMonitor()
+client = AsyncIOMotorClient(
+    mongo_url,
+    maxPoolSize=MONGO_MAX_POOL_SIZE,
+    minPoolSize=int(os.environ.get('MONGO_MIN_POOL_SIZE', '10')),
+    # Fail fast with an error instead of queueing forever behind a saturated pool
+    waitQueueTimeoutMS=int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', '2000')),
+    maxIdleTimeMS=int(os.environ.get('MONGO_MAX_IDLE_TIME_MS', '300000')),
+    serverSelectionTimeoutMS=int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', '5000')),
+    compressors=available_compressors(os.environ.get('MONGO_COMPRESSORS', 'zstd,zlib')),
+    event_listeners=[CommandMonitor(), pool_monitor]
+)
 db = client[os.environ['DB_NAME']]
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Read-only content routes (universes, chapters, characters, lore) may read from
+# secondaries. Replication lag means a just-created chapter can be missing for a
+# moment; MONGO_MAX_STALENESS_SECONDS bounds how far behind a secondary may be.
+content_read_preference = read_preference(
+    os.environ.get('MONGO_CONTENT_READ_PREFERENCE', 'primary'),
+    max_staleness=int(os.environ.get('MONGO_MAX_STALENESS_SECONDS', '-1'))
+)
+read_db = client.get_database(os.environ['DB_NAME'], read_preference=content_read_preference)
+
+readiness = Readiness(
+    client, pool_monitor, MONGO_MAX_POOL_SIZE,
+    max_utilization=float(os.environ.get('READY_MAX_POOL_UTILIZATION', '0.9'))
+)
+startup_profiler.mark("mongo_client")
+
+# Password hashing (runs on a bounded thread pool, see passwords.py)
+password_hasher = PasswordHasher(
+    rounds=int(os.environ.get('BCRYPT_ROUNDS', '12')),
+    max_workers=int(os.environ.get('PASSWORD_HASH_WORKERS', '4')),
+    max_queue=int(os.environ.get('PASSWORD_HASH_MAX_QUEUE', '64'))
+)
+
+# Read cache for the hot reader routes; writes invalidate the affected keys.
+# CACHE_BACKEND=redis shares it between workers (see redis_cache.py).
+if os.environ.get('CACHE_BACKEND', 'memory') == 'redis':
+    from redis_cache import RedisCache
+    read_cache = RedisCache.from_url(
+        os.environ['REDIS_URL'],
+        ttl=float(os.environ.get('READ_CACHE_TTL_SECONDS', '60')),
+        local_max_entries=int(os.environ.get('READ_CACHE_MAX_ENTRIES', '1024')),
+        local_ttl=float(os.environ.get('READ_CACHE_LOCAL_TTL_SECONDS', '5'))
+    )
+else:
+    read_cache = MemoryCache(
+        max_entries=int(os.environ.get('READ_CACHE_MAX_ENTRIES', '1024')),
+        ttl=float(os.environ.get('READ_CACHE_TTL_SECONDS', '60'))
+    )
+
+# Token-bucket rate limits per route, keyed on client IP, user or account (RATE_LIMITS
+# overrides, e.g. "login=5/60"). RATE_LIMIT_BACKEND=redis shares buckets between workers.
+# Signup and login are limited per IP (behind a proxy that needs TRUSTED_PROXIES, or every
+# client lands in the proxy's bucket); login_account caps attempts on one account from
+# any number of addresses. A blanket per-IP rule is opt-in, e.g. "default=600/60".
+RATE_LIMIT_RULES = parse_rules('signup=5/600,login=10/60,login_account=10/300,forum_post=10/60,forum_reply=30/60')
+RATE_LIMIT_RULES.update(parse_rules(os.environ.get('RATE_LIMITS', '')))
+if os.environ.get('RATE_LIMIT_BACKEND', 'memory') == 'redis':
+    from redis_rate_limit import RedisRateLimiter
+    rate_limiter = RedisRateLimiter.from_url(os.environ['REDIS_URL'])
+else:
+    rate_limiter = MemoryRateLimiter(max_keys=int(os.environ.get('RATE_LIMIT_MAX_KEYS', '100000')))
+rate_limits = RateLimits(
+    rate_limiter,
+    RATE_LIMIT_RULES,
+    enabled=os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() in ('1', 'true', 'yes'),
+    # Proxy addresses/CIDRs whose X-Forwarded-For is believed, e.g. "10.0.0.0/8"
+    trusted_proxies=parse_networks(os.environ.get('TRUSTED_PROXIES', ''))
+)
+
+# Identical concurrent cache misses share one MongoDB load
+single_flight = SingleFlight()
+
+def forget_in_flight(name):
+    # A load in flight read before this write; later callers start a fresh one
+    kind, value = name
+    if kind == "key":
+        single_flight.forget(value)
+    else:
+        single_flight.forget_group(value)
+
+read_cache.on_invalidate(forget_in_flight)
+
+# Browsers/CDNs may reuse single-document reads this long before revalidating
+CONTENT_MAX_AGE = int(os.environ.get('CONTENT_CACHE_MAX_AGE', '60'))
+
+# get_universes response buckets and the universe type each one holds
+UNIVERSE_BUCKETS = (("original", "Original"), ("inspired", "Inspired"))
+
+# Engagement counters are coalesced in memory and flushed in bulk
+counter_aggregator = CounterAggregator(
+    db,
+    flush_seconds=float(os.environ.get('COUNTER_FLUSH_SECONDS', '1.0')),
+    max_pending=int(os.environ.get('COUNTER_MAX_PENDING', '10000'))
+)
+
+# Reading progress is debounced through the counter aggregator
+reading_progress = ReadingProgress(db, counter_aggregator)
+
+# Universe Detail page data in one document, patched as chapters/characters/lore are added
+universe_overviews = UniverseOverviews(
+    db,
+    read_db=read_db,
+    max_chapters=int(os.environ.get('OVERVIEW_MAX_CHAPTERS', '500')),
+    max_entries=int(os.environ.get('OVERVIEW_MAX_ENTRIES', '100'))
+)
+
+# Replies embedded in a forum post document (the rest are paged from forum_replies)
+THREAD_FIRST_PAGE = 20
+
+# Fields returned by the chapter table of contents
+TOC_PROJECTION = {"title": 1, "chapter_number": 1, "status": 1, "word_count": 1, "created_at": 1}
+
+# Chapter text is stored compressed outside the stories collection
+chapter_bodies = ChapterBodyStore(
+    db,
+    codec=os.environ.get('CHAPTER_BODY_CODEC', 'zlib'),  # zlib, zstd or brotli
+    gridfs_threshold=int(os.environ.get('CHAPTER_GRIDFS_THRESHOLD_BYTES', str(4 * 1024 * 1024))),
+    offload_threshold=int(os.environ.get('CHAPTER_COMPRESS_OFFLOAD_BYTES', str(64 * 1024)))
+)
+
+# Full-text search index (in-process BM25, kept in sync with MongoDB)
+search_index = SearchIndex(loaders={"chapter": chapter_bodies.attach})
+
+# Push channel for new posts, replies and chapters; the change-stream broker relays
+# events between workers (needs a replica set)
+realtime_hub = RealtimeHub(
+    broker=ChangeStreamBroker(db) if os.environ.get('REALTIME_BROKER', 'local') == 'changestream' else None,
+    buffer_size=int(os.environ.get('REALTIME_BUFFER_SIZE', '100')),
+    max_channels=int(os.environ.get('REALTIME_MAX_CHANNELS', '20'))
+)
 
 # JWT settings
 SECRET_KEY = os.environ.get('JWT_SECRET', 'fictionverse-secret-key-change-in-production')
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_DAYS = 7
+token_verifier = TokenVerifier(
+    SECRET_KEY,
+    ALGORITHM,
+    max_entries=int(os.environ.get('TOKEN_CACHE_MAX_ENTRIES', '10000')),
+    max_cache_seconds=float(os.environ.get('TOKEN_CACHE_SECONDS', '300'))
+)
+
+startup_profiler.mark("components")
 
 # Create the main app
-app = FastAPI()
+app = FastAPI(default_response_class=FastJSONResponse)
 
 # Create a router with the /api prefix
-api_router = APIRouter(prefix="/api")
+# Plain dict/list returns are rendered with orjson, skipping jsonable_encoder
+# Every /api route also counts against the per-IP "default" rate limit
+api_router = APIRouter(prefix="/api", route_class=FastJSONRoute, dependencies=[Depends(rate_limits.by_ip("default"))])
 
 
 # ========== MODELS ==========
@@ -42,7 +218,7 @@ class User(BaseModel):
     model_config = ConfigDict(extra="ignore")
     username: str
     email: EmailStr
-    role: str = "traveler"  # traveler, architect, commander
+    role: str = "traveler"  # traveler, architect, commander, admin
     bio: Optional[str] = None
     avatar_url: Optional[str] = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
@@ -86,6 +262,8 @@ class Story(BaseModel):
     author: str
     author_email: str
     status: str = "published"  # draft, published, archived
+    word_count: int = 0
+    excerpt: str = ""
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class StoryCreate(BaseModel):
@@ -152,6 +330,7 @@ class ForumPost(BaseModel):
     category: str  # theory, critique, general, announcement
     tags: List[str] = []
     replies_count: int = 0
+    last_activity_at: Optional[datetime] = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class ForumPostCreate(BaseModel):
@@ -189,14 +368,35 @@ class ChallengeCreate(BaseModel):
     type: str
     deadline: Optional[datetime] = None
 
+class ProgressUpdate(BaseModel):
+    chapter_number: int = Field(ge=1, le=100000)
+    position: float = Field(0.0, ge=0.0, le=1.0)  # fraction of the chapter scrolled
+
+class BookmarkCreate(BaseModel):
+    universe_id: str
+    chapter_number: int = Field(ge=1, le=100000)
+
+
+# Validation for each record kind in a universe archive (see universe_archive.py)
+ARCHIVE_MODELS = {
+    "universe": UniverseCreate,
+    "chapter": StoryCreate,
+    "character": CharacterCreate,
+    "lore": LoreEntryCreate,
+}
 
 # ========== HELPER FUNCTIONS ==========
 
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+async def hash_password(password: str) -> str:
+    return await password_hasher.hash(password)
+
+async def verify_password(plain_password: str, hashed_password: str):
+    # Returns (verified, new_hash); new_hash is set when the stored hash needs upgrading
+    return await password_hasher.verify_and_update(plain_password, hashed_password)
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+def as_object_id(value: str):
+    # Documents inserted by the API use ObjectId keys; anything else is matched as-is
+    return ObjectId(value) if ObjectId.is_valid(value) else value
 
 def create_access_token(data: dict):
     to_encode = data.copy()
@@ -205,24 +405,26 @@ def create_access_token(data: dict):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def get_current_user(token: str = Cookie(None, alias="fv_token")):
+async def get_current_user(token: str = Cookie(None, alias="fv_token")):
+    # async so the dependency runs on the event loop instead of a threadpool hop;
+    # verification is a cache lookup for tokens seen recently
     if not token:
         raise HTTPException(status_code=401, detail="Not authenticated")
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email = payload.get("email")
-        if not email:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        return {"email": email, "username": payload.get("username")}
-    except jwt.ExpiredSignatureError:
-        raise HTTPException(status_code=401, detail="Token expired")
-    except jwt.JWTError:
-        raise HTTPException(status_code=401, detail="Invalid token")
+    payload = token_verifier.verify(token)
+    return {"email": payload["email"], "username": payload.get("username")}
+
+async def get_admin_user(current_user: dict = Depends(get_current_user)):
+    # The role is set server-side only (python -m admin_users grant <email>) and read on
+    # every call, so a revoke takes effect without waiting for tokens to expire
+    user = await db.users.find_one({"email": current_user["email"]}, {"role": 1})
+    if not user or user.get("role") != ADMIN_ROLE:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return current_user
 
 
 # ========== AUTH ROUTES ==========
 
-@api_router.post("/auth/signup")
+@api_router.post("/auth/signup", dependencies=[Depends(rate_limits.by_ip("signup"))])
 async def signup(user_data: UserCreate, response: Response):
     # Check if user exists
     existing_user = await db.users.find_one({"email": user_data.email})
@@ -233,7 +435,7 @@ async def signup(user_data: UserCreate, response: Response):
     user_dict = {
         "username": user_data.username,
         "email": user_data.email,
-        "password": hash_password(user_data.password),
+        "password": await hash_password(user_data.password),
         "role": "traveler",
         "bio": None,
         "avatar_url": None,
@@ -243,7 +445,7 @@ async def signup(user_data: UserCreate, response: Response):
     await db.users.insert_one(user_dict)
     
     # Create JWT token
-    token = create_access_token({"email": user_data.email, "username": user_data.username})
+    token = create_access_token({"email": user_data.email, "username": user_data.username, "epoch": 0})
     
     # Set HTTP-Only cookie
     response.set_cookie(
@@ -263,15 +465,25 @@ async def signup(user_data: UserCreate, response: Response):
         }
     }
 
-@api_router.post("/auth/login")
+@api_router.post("/auth/login", dependencies=[Depends(rate_limits.by_ip("login"))])
 async def login(credentials: UserLogin, response: Response):
+    # Per account, so credential stuffing spread over many addresses is throttled too
+    await rate_limits.check("login_account", credentials.email.lower())
+
     # Find user
     user = await db.users.find_one({"email": credentials.email})
-    if not user or not verify_password(credentials.password, user["password"]):
+    if not user:
         raise HTTPException(status_code=401, detail="Invalid credentials")
+    verified, new_hash = await verify_password(credentials.password, user["password"])
+    if not verified:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    
+    # Transparently upgrade hashes made with an old cost factor
+    if new_hash:
+        await db.users.update_one({"_id": user["_id"]}, {"$set": {"password": new_hash}})
     
     # Create JWT token
-    token = create_access_token({"email": user["email"], "username": user["username"]})
+    token = create_access_token({"email": user["email"], "username": user["username"], "epoch": user.get("token_epoch", 0)})
     
     # Set HTTP-Only cookie
     response.set_cookie(
@@ -296,22 +508,51 @@ async def logout(response: Response):
     response.delete_cookie("fv_token")
     return {"message": "Logged out successfully"}
 
+@api_router.post("/auth/logout-all")
+async def logout_all(response: Response, current_user: dict = Depends(get_current_user)):
+    # Revokes every token issued to this user so far, on all devices
+    await token_verifier.revoke_all(db, current_user["email"])
+    response.delete_cookie("fv_token")
+    return {"message": "Logged out of all sessions"}
+
 
 # ========== UNIVERSES ROUTES ==========
 
 @api_router.get("/universes")
-async def get_universes():
-    # Fetch all universes
-    universes = await db.universes.find({}, {"_id": 0}).to_list(1000)
+async def get_universes(limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None, fields: Optional[str] = None):
+    projection = parse_fields(fields, Universe.model_fields)
+    cache_key = ("universes", limit, cursor, fields)
+    cached = await read_cache.get(cache_key)
+    if cached is not None:
+        return cached
     
-    # Separate by type
-    original = [u for u in universes if u.get("type") == "Original"]
-    inspired = [u for u in universes if u.get("type") == "Inspired"]
+    generation = await read_cache.generation(cache_key)
+    # The cursor carries one position per bucket; a bucket missing from it is exhausted
+    state = decode_cursor(cursor) if cursor else {"original": None, "inspired": None}
+    if not isinstance(state, dict):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
     
-    return {
-        "original": original,
-        "inspired": inspired
-    }
+    # A page of each bucket and each bucket's total, all concurrently; every one is
+    # served from the (type, _id) index
+    buckets = [(bucket, universe_type) for bucket, universe_type in UNIVERSE_BUCKETS if bucket in state]
+    pages = asyncio.gather(*(
+        fetch_page(read_db.universes, {"type": universe_type}, INSERTION_SORT, limit, state[bucket], projection)
+        for bucket, universe_type in buckets
+    ))
+    counts = asyncio.gather(*(read_db.universes.count_documents({"type": universe_type}) for _, universe_type in UNIVERSE_BUCKETS))
+    pages, counts = await asyncio.gather(pages, counts)
+    
+    result = {"original": [], "inspired": []}
+    next_state = {}
+    for (bucket, _), (items, next_after) in zip(buckets, pages):
+        result[bucket] = items
+        if next_after is not None:
+            next_state[bucket] = next_after
+    
+    result["counts"] = {bucket: count for (bucket, _), count in zip(UNIVERSE_BUCKETS, counts)}
+    result["next_cursor"] = encode_cursor(next_state) if next_state else None
+    await read_cache.set(cache_key, result, group="universes", generation=generation)
+    return result
 
 @api_router.post("/universes")
 async def create_universe(universe: UniverseCreate, current_user: dict = Depends(get_current_user)):
@@ -323,64 +564,207 @@ async def create_universe(universe: UniverseCreate, current_user: dict = Depends
     
     result = await db.universes.insert_one(universe_dict)
     universe_dict["_id"] = str(result.inserted_id)
+    await read_cache.invalidate_group("universes")
+    await read_cache.delete(("universe", universe_dict["title"]))
+    search_index.update("universe", universe_dict["_id"], universe_dict)
     
     return universe_dict
 
-@api_router.get("/universes/{universe_id}")
-async def get_universe(universe_id: str):
-    universe = await db.universes.find_one({"title": universe_id}, {"_id": 0})
+@api_router.post("/universes/import")
+async def import_universe(request: Request, current_user: dict = Depends(get_current_user)):
+    # Body is an NDJSON archive, read as a stream and written in batches
+    async def on_batch(kind: str, docs: List[dict]):
+        if kind == "universe":
+            await read_cache.invalidate_group("universes")
+            await read_cache.delete(("universe", docs[0]["title"]))
+        elif kind == "chapter":
+            for doc in docs:
+                await read_cache.delete(("chapter", doc["universe_id"], doc["chapter_number"]))
+        else:
+            await read_cache.invalidate_group((kind if kind == "lore" else "characters", docs[0]["universe_id"]))
+        for doc in docs:
+            search_index.update(kind, str(doc["_id"]), doc)
+    
+    importer = UniverseImporter(
+        db, chapter_bodies, ARCHIVE_MODELS, current_user, on_batch=on_batch,
+        batch_size=int(os.environ.get('IMPORT_BATCH_SIZE', '500'))
+    )
+    result = await importer.run(iter_lines(request.stream()))
+    if result["universe"]:
+        await universe_overviews.rebuild(result["universe"])
+    return result
+
+@api_router.get("/universes/{universe_id}/export")
+async def export_universe_archive(universe_id: str, current_user: dict = Depends(get_current_user)):
+    universe = await db.universes.find_one({"title": universe_id})
     if not universe:
         raise HTTPException(status_code=404, detail="Universe not found")
-    return universe
+    if universe.get("author_email") != current_user["email"]:
+        raise HTTPException(status_code=403, detail="Only the universe author can export it")
+    
+    filename = "".join(c if c.isalnum() or c in "-_" else "-" for c in universe_id) or "universe"
+    return StreamingResponse(
+        export_universe(db, chapter_bodies, universe),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}.ndjson"'}
+    )
+
+@api_router.get("/universes/{universe_id}")
+async def get_universe(universe_id: str, request: Request, response: Response):
+    cache_key = ("universe", universe_id)
+    
+    async def load():
+        # Taken before the read, so a write landing meanwhile keeps this result out of the cache
+        generation = await read_cache.generation(cache_key)
+        universe = await read_db.universes.find_one({"title": universe_id}, {"_id": 0})
+        if not universe:
+            raise HTTPException(status_code=404, detail="Universe not found")
+        await read_cache.set(cache_key, universe, generation=generation)
+        return universe
+    
+    universe = await read_cache.get(cache_key)
+    if universe is None:
+        universe = await single_flight.do(cache_key, load)
+    
+    not_modified = conditional_get(request, response, universe, f"universe:{universe_id}", CONTENT_MAX_AGE)
+    return not_modified or universe
+
+async def count_genres() -> dict:
+    # Genre names come off the (genre, _id) index and each count is an index count,
+    # so neither touches the universe documents; most common genre first
+    genres = [g for g in await read_db.universes.distinct("genre") if g is not None]
+    counts = await asyncio.gather(*(read_db.universes.count_documents({"genre": g}) for g in genres))
+    return dict(sorted(zip(genres, counts), key=lambda item: -item[1]))
 
 @api_router.get("/universes/filter/{genre}")
-async def filter_universes_by_genre(genre: str):
-    universes = await db.universes.find({"genre": genre}, {"_id": 0}).to_list(1000)
-    return universes
+async def filter_universes_by_genre(genre: str, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None, fields: Optional[str] = None):
+    projection = parse_fields(fields, Universe.model_fields)
+    after = decode_cursor(cursor) if cursor else None
+    page = fetch_page(read_db.universes, {"genre": genre}, INSERTION_SORT, limit, after, projection)
+    (items, next_after), genre_counts = await asyncio.gather(page, count_genres())
+    return {
+        "items": items,
+        "genre_counts": genre_counts,
+        "next_cursor": encode_cursor(next_after) if next_after is not None else None
+    }
+
+@api_router.get("/universes/{universe_id}/overview")
+async def get_universe_overview(universe_id: str, request: Request, response: Response):
+    # Universe, chapter index, characters and lore for the detail page in one read
+    overview = await universe_overviews.get(universe_id)
+    if overview is None:
+        raise HTTPException(status_code=404, detail="Universe not found")
+    overview.pop("_id", None)
+    
+    response.headers["X-Overview-Version"] = str(overview["version"])
+    not_modified = conditional_get(request, response, overview, f"overview:{universe_id}:{overview['version']}", CONTENT_MAX_AGE)
+    return not_modified or overview
 
 
 # ========== STORIES/CHAPTERS ROUTES ==========
 
 @api_router.get("/stories/{universe_id}")
-async def get_stories_by_universe(universe_id: str):
-    stories = await db.stories.find({"universe_id": universe_id}, {"_id": 0}).sort("chapter_number", 1).to_list(1000)
-    return stories
+async def get_stories_by_universe(universe_id: str, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None, fields: Optional[str] = None):
+    # Chapter text is not stored on `stories`; it is only served by get_story_chapter
+    projection = parse_fields(fields, set(Story.model_fields) - {"content"})
+    return await paginate(read_db.stories, {"universe_id": universe_id}, CHAPTER_SORT, limit, cursor, projection)
+
+@api_router.get("/stories/{universe_id}/toc")
+async def get_story_toc(universe_id: str, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None):
+    # Chapter list without bodies, for navigation and listing pages
+    return await paginate(read_db.stories, {"universe_id": universe_id}, CHAPTER_SORT, limit, cursor, TOC_PROJECTION)
 
 @api_router.get("/stories/{universe_id}/{chapter_number}")
-async def get_story_chapter(universe_id: str, chapter_number: int):
-    story = await db.stories.find_one({"universe_id": universe_id, "chapter_number": chapter_number}, {"_id": 0})
-    if not story:
-        raise HTTPException(status_code=404, detail="Chapter not found")
-    return story
+async def get_story_chapter(universe_id: str, chapter_number: int, request: Request, response: Response):
+    cache_key = ("chapter", universe_id, chapter_number)
+    
+    async def load():
+        generation = await read_cache.generation(cache_key)
+        story = await read_db.stories.find_one({"universe_id": universe_id, "chapter_number": chapter_number})
+        if not story:
+            raise HTTPException(status_code=404, detail="Chapter not found")
+        body = await chapter_bodies.load(story.pop("_id"))
+        # Chapters the inline-body migration hasn't reached yet still carry their text
+        story["content"] = body if body is not None else story.get("content", "")
+        await read_cache.set(cache_key, story, generation=generation)
+        return story
+    
+    story = await read_cache.get(cache_key)
+    if story is None:
+        # Readers piling onto a freshly published chapter share one load
+        story = await single_flight.do(cache_key, load)
+    
+    not_modified = conditional_get(request, response, story, f"chapter:{universe_id}:{chapter_number}", CONTENT_MAX_AGE)
+    return not_modified or story
 
 @api_router.post("/stories")
 async def create_story(story: StoryCreate, current_user: dict = Depends(get_current_user)):
     story_dict = story.model_dump()
+    content = detach_body(story_dict)
     story_dict["author"] = current_user["username"]
     story_dict["author_email"] = current_user["email"]
     story_dict["created_at"] = datetime.now(timezone.utc).isoformat()
     
     result = await db.stories.insert_one(story_dict)
+    await chapter_bodies.save(result.inserted_id, content)
     story_dict["_id"] = str(result.inserted_id)
+    story_dict["content"] = content
+    await read_cache.delete(("chapter", story.universe_id, story.chapter_number))
+    search_index.update("chapter", story_dict["_id"], story_dict)
+    await universe_overviews.add_chapter(story_dict)
+    await realtime_hub.publish(f"universe:{story.universe_id}", "story_created", {
+        "_id": story_dict["_id"],
+        "universe_id": story.universe_id,
+        "chapter_number": story.chapter_number,
+        "title": story.title,
+        "author": story_dict["author"]
+    })
     
     return story_dict
 
 @api_router.put("/stories/{story_id}")
 async def update_story(story_id: str, story: StoryCreate, current_user: dict = Depends(get_current_user)):
     # Update story
-    await db.stories.update_one(
-        {"_id": story_id, "author_email": current_user["email"]},
-        {"$set": story.model_dump()}
+    object_id = as_object_id(story_id)
+    story_dict = story.model_dump()
+    content = detach_body(story_dict)
+    story_dict["updated_at"] = datetime.now(timezone.utc).isoformat()
+    previous = await db.stories.find_one_and_update(
+        {"_id": object_id, "author_email": current_user["email"]},
+        # Drop any inline body left from before the migration so it can't overwrite this edit
+        {"$set": story_dict, "$unset": {"content": ""}},
+        projection={"universe_id": 1, "chapter_number": 1},
+        return_document=ReturnDocument.BEFORE
     )
+    
+    # The chapter may have been moved, so drop both its old and new cache slots
+    if previous:
+        await chapter_bodies.save(previous["_id"], content)
+        await read_cache.delete(("chapter", previous["universe_id"], previous["chapter_number"]))
+        await read_cache.delete(("chapter", story.universe_id, story.chapter_number))
+        search_index.update("chapter", str(previous["_id"]), story.model_dump())
+        for universe_id in {previous["universe_id"], story.universe_id}:
+            await universe_overviews.rebuild(universe_id)
     return {"message": "Story updated"}
 
 
 # ========== CHARACTERS ROUTES ==========
 
 @api_router.get("/characters/{universe_id}")
-async def get_characters(universe_id: str):
-    characters = await db.characters.find({"universe_id": universe_id}, {"_id": 0}).to_list(1000)
-    return characters
+async def get_characters(universe_id: str, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None, fields: Optional[str] = None):
+    projection = parse_fields(fields, Character.model_fields)
+    cache_key = ("characters", universe_id, limit, cursor, fields)
+    cached = await read_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
+    async def load():
+        generation = await read_cache.generation(cache_key)
+        page = await paginate(read_db.characters, {"universe_id": universe_id}, INSERTION_SORT, limit, cursor, projection)
+        await read_cache.set(cache_key, page, group=("characters", universe_id), generation=generation)
+        return page
+    
+    return await single_flight.do(cache_key, load, group=("characters", universe_id))
 
 @api_router.post("/characters")
 async def create_character(character: CharacterCreate, current_user: dict = Depends(get_current_user)):
@@ -389,6 +773,9 @@ async def create_character(character: CharacterCreate, current_user: dict = Depe
     
     result = await db.characters.insert_one(character_dict)
     character_dict["_id"] = str(result.inserted_id)
+    await read_cache.invalidate_group(("characters", character.universe_id))
+    search_index.update("character", character_dict["_id"], character_dict)
+    await universe_overviews.add_character(character_dict)
     
     return character_dict
 
@@ -396,9 +783,20 @@ async def create_character(character: CharacterCreate, current_user: dict = Depe
 # ========== LORE ROUTES ==========
 
 @api_router.get("/lore/{universe_id}")
-async def get_lore(universe_id: str):
-    lore_entries = await db.lore.find({"universe_id": universe_id}, {"_id": 0}).to_list(1000)
-    return lore_entries
+async def get_lore(universe_id: str, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None, fields: Optional[str] = None):
+    projection = parse_fields(fields, LoreEntry.model_fields)
+    cache_key = ("lore", universe_id, limit, cursor, fields)
+    cached = await read_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
+    async def load():
+        generation = await read_cache.generation(cache_key)
+        page = await paginate(read_db.lore, {"universe_id": universe_id}, INSERTION_SORT, limit, cursor, projection)
+        await read_cache.set(cache_key, page, group=("lore", universe_id), generation=generation)
+        return page
+    
+    return await single_flight.do(cache_key, load, group=("lore", universe_id))
 
 @api_router.post("/lore")
 async def create_lore(lore: LoreEntryCreate, current_user: dict = Depends(get_current_user)):
@@ -407,6 +805,9 @@ async def create_lore(lore: LoreEntryCreate, current_user: dict = Depends(get_cu
     
     result = await db.lore.insert_one(lore_dict)
     lore_dict["_id"] = str(result.inserted_id)
+    await read_cache.invalidate_group(("lore", lore.universe_id))
+    search_index.update("lore", lore_dict["_id"], lore_dict)
+    await universe_overviews.add_lore(lore_dict)
     
     return lore_dict
 
@@ -414,9 +815,9 @@ async def create_lore(lore: LoreEntryCreate, current_user: dict = Depends(get_cu
 # ========== CLUBS ROUTES ==========
 
 @api_router.get("/clubs")
-async def get_clubs():
-    clubs = await db.clubs.find({}, {"_id": 0}).to_list(1000)
-    return clubs
+async def get_clubs(limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None, fields: Optional[str] = None):
+    projection = parse_fields(fields, Club.model_fields)
+    return await paginate(db.clubs, {}, INSERTION_SORT, limit, cursor, projection)
 
 @api_router.post("/clubs")
 async def create_club(club: ClubCreate, current_user: dict = Depends(get_current_user)):
@@ -442,61 +843,152 @@ async def join_club(club_id: str, current_user: dict = Depends(get_current_user)
 # ========== FORUM ROUTES ==========
 
 @api_router.get("/forum/posts")
-async def get_forum_posts(category: Optional[str] = None):
+async def get_forum_posts(category: Optional[str] = None, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None, fields: Optional[str] = None):
     query = {"category": category} if category else {}
-    posts = await db.forum_posts.find(query, {"_id": 0}).sort("created_at", -1).to_list(1000)
-    return posts
+    projection = parse_fields(fields, ForumPost.model_fields) or {"first_replies": 0, "replies_embedded": 0}
+    return await paginate(db.forum_posts, query, NEWEST_FIRST_SORT, limit, cursor, projection)
 
 @api_router.get("/forum/posts/{post_id}")
 async def get_forum_post(post_id: str):
-    post = await db.forum_posts.find_one({"_id": post_id}, {"_id": 0})
+    # The post document carries its first page of replies, so this is one indexed read
+    object_id = as_object_id(post_id)
+    post = await db.forum_posts.find_one({"_id": object_id}, {"_id": 0})
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
+    counter_aggregator.overlay("forum_posts", object_id, post)
     
-    # Get replies
-    replies = await db.forum_replies.find({"post_id": post_id}, {"_id": 0}).sort("created_at", 1).to_list(1000)
+    replies = post.pop("first_replies", None)
+    post.pop("replies_embedded", None)
+    if replies is None:
+        # Thread not moved to the read model yet
+        replies = await db.forum_replies.find({"post_id": post_id}).sort(OLDEST_FIRST_SORT).to_list(THREAD_FIRST_PAGE)
+    next_cursor = None
+    # Decided by the count: a thread with exactly one full page has nothing after it
+    if replies and post.get("replies_count", 0) > len(replies):
+        next_cursor = encode_cursor([replies[-1]["created_at"], replies[-1]["_id"]])
+    for reply in replies:
+        reply.pop("_id", None)
     post["replies"] = replies
+    post["replies_next_cursor"] = next_cursor
     
     return post
 
-@api_router.post("/forum/posts")
+@api_router.get("/forum/posts/{post_id}/replies")
+async def get_forum_replies(post_id: str, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None):
+    return await paginate(db.forum_replies, {"post_id": post_id}, OLDEST_FIRST_SORT, limit, cursor)
+
+@api_router.post("/forum/posts", dependencies=[Depends(rate_limits.by_user("forum_post", get_current_user))])
 async def create_forum_post(post: ForumPostCreate, current_user: dict = Depends(get_current_user)):
     post_dict = post.model_dump()
     post_dict["author"] = current_user["username"]
     post_dict["author_email"] = current_user["email"]
     post_dict["replies_count"] = 0
     post_dict["created_at"] = datetime.now(timezone.utc).isoformat()
+    post_dict["last_activity_at"] = post_dict["created_at"]
+    post_dict["first_replies"] = []
+    post_dict["replies_embedded"] = True
     
     result = await db.forum_posts.insert_one(post_dict)
     post_dict["_id"] = str(result.inserted_id)
+    del post_dict["first_replies"], post_dict["replies_embedded"]
+    search_index.update("forum_post", post_dict["_id"], post_dict)
+    await realtime_hub.publish("forum", "forum_post_created", post_dict)
     
     return post_dict
 
-@api_router.post("/forum/replies")
+@api_router.post("/forum/replies", dependencies=[Depends(rate_limits.by_user("forum_reply", get_current_user))])
 async def create_forum_reply(reply: ForumReplyCreate, current_user: dict = Depends(get_current_user)):
     reply_dict = reply.model_dump()
     reply_dict["author"] = current_user["username"]
     reply_dict["author_email"] = current_user["email"]
     reply_dict["created_at"] = datetime.now(timezone.utc).isoformat()
     
-    result = await db.forum_replies.insert_one(reply_dict)
+    # The reply is stored first, so the post never embeds or counts a reply that a
+    # failure part-way through left unsaved
+    await db.forum_replies.insert_one(reply_dict)
     
-    # Increment reply count on post
-    await db.forum_posts.update_one(
-        {"_id": reply.post_id},
-        {"$inc": {"replies_count": 1}}
+    # While the embedded first page has room, counter, activity timestamp and reply go
+    # in one atomic update. Past it (the hot threads) the post document is only read, and
+    # the counter and timestamp are coalesced by the write-behind aggregator.
+    post_id = as_object_id(reply.post_id)
+    result = await db.forum_posts.update_one(
+        {"_id": post_id, f"first_replies.{THREAD_FIRST_PAGE - 1}": {"$exists": False}},
+        {
+            "$inc": {"replies_count": 1},
+            "$max": {"last_activity_at": reply_dict["created_at"]},
+            "$push": {"first_replies": {"$each": [reply_dict], "$slice": THREAD_FIRST_PAGE}}
+        }
     )
+    if result.matched_count == 0:
+        if not await db.forum_posts.count_documents({"_id": post_id}, limit=1):
+            await db.forum_replies.delete_one({"_id": reply_dict["_id"]})
+            raise HTTPException(status_code=404, detail="Post not found")
+        counter_aggregator.increment("forum_posts", post_id, "replies_count")
+        counter_aggregator.maximum("forum_posts", post_id, "last_activity_at", reply_dict["created_at"])
     
-    reply_dict["_id"] = str(result.inserted_id)
+    reply_dict["_id"] = str(reply_dict["_id"])
+    await realtime_hub.publish(f"thread:{reply.post_id}", "forum_reply_created", reply_dict)
     return reply_dict
 
 
+# ========== REALTIME ROUTES ==========
+
+def realtime_channel(value) -> Optional[str]:
+    if value == "forum":
+        return value
+    if isinstance(value, str) and value.startswith(("universe:", "thread:")) and len(value) <= 200:
+        return value
+    return None
+
+@api_router.websocket("/realtime")
+async def realtime(websocket: WebSocket, universe: List[str] = Query([]), thread: List[str] = Query([]), forum: bool = False):
+    # Initial channels come from the query string; clients change them with
+    # {"action": "subscribe" | "unsubscribe", "channel": "thread:<post_id>"}
+    await websocket.accept()
+    channels = [f"universe:{u}" for u in universe] + [f"thread:{t}" for t in thread] + (["forum"] if forum else [])
+    subscription = realtime_hub.subscribe(channels)
+    
+    async def send():
+        while True:
+            message = await subscription.get()
+            if message is None:
+                # Too far behind: the client reloads and reconnects
+                await websocket.close(code=1013, reason="Subscriber buffer overflow")
+                return
+            await websocket.send_text(message)
+    
+    async def receive():
+        while True:
+            try:
+                request = json.loads(await websocket.receive_text())
+            except ValueError:
+                continue
+            channel = realtime_channel(request.get("channel")) if isinstance(request, dict) else None
+            if channel is None:
+                await websocket.send_json({"type": "error", "detail": "Invalid channel"})
+            elif request.get("action") == "subscribe":
+                if not realtime_hub.add_channel(subscription, channel):
+                    await websocket.send_json({"type": "error", "detail": "Too many channels"})
+            elif request.get("action") == "unsubscribe":
+                realtime_hub.remove_channel(subscription, channel)
+    
+    tasks = [asyncio.create_task(send()), asyncio.create_task(receive())]
+    try:
+        # Either side finishing (disconnect, overflow) ends the connection
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        realtime_hub.unsubscribe(subscription)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
 # ========== CHALLENGES ROUTES ==========
 
 @api_router.get("/challenges")
-async def get_challenges():
-    challenges = await db.challenges.find({}, {"_id": 0}).sort("created_at", -1).to_list(1000)
-    return challenges
+async def get_challenges(limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None, fields: Optional[str] = None):
+    projection = parse_fields(fields, Challenge.model_fields)
+    return await paginate(db.challenges, {}, NEWEST_FIRST_SORT, limit, cursor, projection)
 
 @api_router.post("/challenges")
 async def create_challenge(challenge: ChallengeCreate, current_user: dict = Depends(get_current_user)):
@@ -510,6 +1002,66 @@ async def create_challenge(challenge: ChallengeCreate, current_user: dict = Depe
     return challenge_dict
 
 
+# ========== SEARCH ROUTES ==========
+
+@api_router.get("/search")
+async def search(
+    q: str = Query(..., min_length=1, max_length=200),
+    types: Optional[str] = None,
+    universe_id: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=50)
+):
+    type_filter = [t.strip() for t in types.split(",") if t.strip()] if types else None
+    if type_filter:
+        unknown = sorted(set(type_filter) - set(SEARCH_TYPES))
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown types: {', '.join(unknown)}")
+    
+    # Scored on the index's own thread, not the event loop
+    total, hits = await search_index.query(q, types=type_filter, universe_id=universe_id, limit=limit)
+    snippets = await search_index.snippets(db, [key for _, key, _ in hits], q)
+    
+    results = []
+    for score, key, meta in hits:
+        doc_type, doc_id = key
+        results.append({
+            "type": doc_type,
+            "id": doc_id,
+            "score": round(score, 4),
+            **meta,
+            "snippet": snippets.get(key)
+        })
+    
+    return {"query": q, "total": total, "results": results}
+
+
+# ========== READING PROGRESS ROUTES ==========
+
+@api_router.get("/progress")
+async def get_reading_progress(current_user: dict = Depends(get_current_user)):
+    # Every universe's progress plus bookmarks, for the profile page
+    return await reading_progress.summary(current_user["email"])
+
+@api_router.get("/progress/{universe_id}")
+async def get_universe_progress(universe_id: str, current_user: dict = Depends(get_current_user)):
+    return await reading_progress.universe(current_user["email"], universe_id)
+
+@api_router.put("/progress/{universe_id}")
+async def update_reading_progress(universe_id: str, progress: ProgressUpdate, current_user: dict = Depends(get_current_user)):
+    reading_progress.record(current_user["email"], universe_id, progress.chapter_number, progress.position)
+    return {"message": "Progress recorded"}
+
+@api_router.post("/bookmarks")
+async def add_bookmark(bookmark: BookmarkCreate, current_user: dict = Depends(get_current_user)):
+    return await reading_progress.add_bookmark(current_user["email"], bookmark.universe_id, bookmark.chapter_number)
+
+@api_router.delete("/bookmarks/{universe_id}/{chapter_number}")
+async def remove_bookmark(universe_id: str, chapter_number: int, current_user: dict = Depends(get_current_user)):
+    if not await reading_progress.remove_bookmark(current_user["email"], universe_id, chapter_number):
+        raise HTTPException(status_code=404, detail="Bookmark not found")
+    return {"message": "Bookmark removed"}
+
+
 # ========== USER PROFILE ROUTES ==========
 
 @api_router.get("/profile")
@@ -535,6 +1087,35 @@ async def update_profile(bio: Optional[str] = None, avatar_url: Optional[str] =
     return {"message": "Profile updated successfully"}
 
 
+# ========== ADMIN ROUTES ==========
+
+@api_router.get("/admin/query-plans")
+async def get_query_plans(current_user: dict = Depends(get_admin_user)):
+    plans = await explain_query_shapes(db)
+    return {
+        "collscans": [p["route"] for p in plans if p.get("collscan")],
+        "plans": plans
+    }
+
+@api_router.get("/admin/stats")
+async def get_stats(current_user: dict = Depends(get_admin_user)):
+    return {
+        "password_hasher": password_hasher.stats(),
+        "read_cache": read_cache.stats(),
+        "token_verifier": token_verifier.stats(),
+        "search_index": search_index.stats(),
+        "chapter_bodies": await chapter_bodies.stats(),
+        "realtime": realtime_hub.stats(),
+        "counters": counter_aggregator.stats(),
+        "mongo_pool": pool_monitor.stats(MONGO_MAX_POOL_SIZE),
+        "startup": startup_profiler.stats(),
+        "migrations": await completed_migrations(db),
+        "rate_limits": rate_limits.stats(),
+        "single_flight": single_flight.stats(),
+        "universe_overviews": universe_overviews.stats()
+    }
+
+
 # ========== BASIC ROUTES ==========
 
 @api_router.get("/")
@@ -545,6 +1126,9 @@ async def root():
 # Include the router in the main app
 app.include_router(api_router)
 
+# Compress large JSON bodies (chapter lists, forum threads) on the wire
+app.add_middleware(GZipMiddleware, minimum_size=int(os.environ.get('GZIP_MIN_SIZE', '1024')))
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -553,241 +1137,146 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Outermost, so latency and response size include compression
+app.add_middleware(RequestMetricsMiddleware, metrics=request_metrics, exclude=("/metrics", "/api/ready"))
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    body = request_metrics.render() + pool_monitor.render(MONGO_MAX_POOL_SIZE) + single_flight.render()
+    return Response(body, media_type="text/plain; version=0.0.4")
+
+@app.get("/api/ready", include_in_schema=False)
+async def ready():
+    # Load balancer readiness probe: 503 while MongoDB is unreachable or the pool is saturated
+    status = await readiness.check()
+    # Warmup (indexes, seeding, search index) is reported but doesn't hold traffic back
+    status["warmup_pending"] = startup_profiler.warmup_pending
+    return FastJSONResponse(status, status_code=200 if status["ready"] else 503)
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
+startup_profiler.mark("routes")
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await realtime_hub.stop()
+    # Flush pending counters while the client is still open
+    await counter_aggregator.stop()
+    await startup_profiler.stop()
     client.close()
+    await read_cache.close()
+    await rate_limiter.close()
+    await search_index.stop()
+    await token_verifier.stop()
+    password_hasher.shutdown()
+
+@app.on_event("startup")
+@startup_profiler.timed("read_cache")
+async def start_read_cache():
+    await read_cache.start()
+
+@app.on_event("startup")
+@startup_profiler.timed("counter_aggregator")
+async def start_counter_aggregator():
+    counter_aggregator.start()
+
+@app.on_event("startup")
+@startup_profiler.timed("realtime_hub")
+async def start_realtime_hub():
+    await realtime_hub.start()
 
-# Seed some sample data on startup
 @app.on_event("startup")
+@startup_profiler.timed("token_verifier")
+async def start_token_verifier():
+    token_verifier.start(db, refresh_seconds=float(os.environ.get('TOKEN_EPOCH_REFRESH_SECONDS', '30')))
+
+# ----- Migrations: run before the app serves -----
+
+async def migrate_inline_chapter_bodies():
+    # Chapters stored before bodies moved out of `stories`; touches each old chapter once
+    updates = []
+    async for story in db.stories.find({"content": {"$exists": True}}, {"content": 1}):
+        if await chapter_bodies.exists(story["_id"]):
+            # Edited since: the stored body is newer than the inline one
+            updates.append(UpdateOne({"_id": story["_id"]}, {"$unset": {"content": ""}}))
+        else:
+            content = story["content"]
+            await chapter_bodies.save(story["_id"], content)
+            updates.append(UpdateOne({"_id": story["_id"]}, {
+                "$set": {"word_count": count_words(content), "excerpt": make_excerpt(content)},
+                "$unset": {"content": ""}
+            }))
+        if len(updates) >= 500:
+            await db.stories.bulk_write(updates, ordered=False)
+            updates = []
+    if updates:
+        await db.stories.bulk_write(updates, ordered=False)
+
+async def build_thread_read_models():
+    # Threads from before posts embedded their first page of replies, including ones a
+    # reply reached first (its $push started a partial page). Rebuilt from forum_replies;
+    # the size guard retries when a reply is embedded meanwhile.
+    async for post in db.forum_posts.find({"replies_embedded": {"$exists": False}}, {"created_at": 1}):
+        query = {"post_id": str(post["_id"])}
+        for _ in range(3):
+            current = await db.forum_posts.find_one({"_id": post["_id"]}, {"first_replies": 1})
+            if current is None:
+                break
+            embedded = current.get("first_replies")
+            replies, total, latest = await asyncio.gather(
+                db.forum_replies.find(query).sort(OLDEST_FIRST_SORT).to_list(THREAD_FIRST_PAGE),
+                db.forum_replies.count_documents(query),
+                db.forum_replies.find_one(query, {"created_at": 1}, sort=NEWEST_FIRST_SORT),
+            )
+            maximum = {"replies_count": total}
+            last_activity = latest["created_at"] if latest else post.get("created_at")
+            if last_activity:
+                maximum["last_activity_at"] = last_activity
+            result = await db.forum_posts.update_one(
+                {"_id": post["_id"], "first_replies": {"$exists": False} if embedded is None else {"$size": len(embedded)}},
+                {"$set": {"first_replies": replies, "replies_embedded": True}, "$max": maximum}
+            )
+            if result.matched_count:
+                break
+
+@app.on_event("startup")
+@startup_profiler.timed("migrations")
+async def run_migrations():
+    # Blocking, so requests only ever see chapters and threads in their current shape.
+    # Each runs once per database; later starts skip it after one marker lookup.
+    await run_pending_migrations(db, [
+        ("inline_chapter_bodies", migrate_inline_chapter_bodies),
+        ("thread_read_models", build_thread_read_models),
+    ], lease_seconds=float(os.environ.get('MIGRATION_LOCK_SECONDS', '600')))
+
+# ----- Warmup: runs in the background once the app is serving -----
+
+async def create_indexes():
+    await ensure_indexes(db)
+    for plan in await explain_query_shapes(db):
+        if plan.get("collscan"):
+            logger.warning("Query shape %s on %s falls back to COLLSCAN", plan["route"], plan["collection"])
+
+# Seed sample content into an empty database (off in production: SEED_SAMPLE_DATA=false)
 async def seed_data():
-    # Seed universes if empty
-    universes_count = await db.universes.count_documents({})
-    if universes_count == 0:
-        sample_universes = [
-            {
-                "title": "Chronicles of Aether",
-                "description": "A mystical realm where magic and technology intertwine. Follow heroes as they navigate floating cities and ancient mysteries.",
-                "type": "Original",
-                "genre": "Fantasy",
-                "author": "Nova Starweaver",
-                "author_email": "nova@fictionverse.io",
-                "status": "active",
-                "is_premium": False,
-                "created_at": datetime.now(timezone.utc).isoformat()
-            },
-            {
-                "title": "Neon Shadows",
-                "description": "In a cyberpunk dystopia, hackers fight against corporate overlords. High-tech thrills meet underground resistance.",
-                "type": "Original",
-                "genre": "Cyberpunk",
-                "author": "Cipher Echo",
-                "author_email": "cipher@fictionverse.io",
-                "status": "active",
-                "is_premium": False,
-                "created_at": datetime.now(timezone.utc).isoformat()
-            },
-            {
-                "title": "The Last Garden",
-                "description": "After Earth's collapse, survivors discover a hidden sanctuary. Hope blooms in the most unexpected places.",
-                "type": "Original",
-                "genre": "Sci-Fi",
-                "author": "Eden Bloom",
-                "author_email": "eden@fictionverse.io",
-                "status": "active",
-                "is_premium": False,
-                "created_at": datetime.now(timezone.utc).isoformat()
-            },
-            {
-                "title": "Wizards United",
-                "description": "Expanding on the magical world we love, new students discover hidden chambers and forgotten spells at Hogwarts.",
-                "type": "Inspired",
-                "genre": "Fantasy",
-                "author": "Mystic Quill",
-                "author_email": "mystic@fictionverse.io",
-                "status": "active",
-                "is_premium": False,
-                "created_at": datetime.now(timezone.utc).isoformat()
-            },
-            {
-                "title": "Middle Earth: The Fourth Age",
-                "description": "Long after the Ring was destroyed, new threats emerge. Descendants of heroes must rise once more.",
-                "type": "Inspired",
-                "genre": "Fantasy",
-                "author": "Ranger's Tale",
-                "author_email": "ranger@fictionverse.io",
-                "status": "active",
-                "is_premium": False,
-                "created_at": datetime.now(timezone.utc).isoformat()
-            },
-            {
-                "title": "Starfleet Academy Chronicles",
-                "description": "Before the Enterprise, cadets learn what it means to explore strange new worlds and seek out new life.",
-                "type": "Inspired",
-                "genre": "Sci-Fi",
-                "author": "Commander Stellar",
-                "author_email": "stellar@fictionverse.io",
-                "status": "active",
-                "is_premium": False,
-                "created_at": datetime.now(timezone.utc).isoformat()
-            }
-        ]
-        await db.universes.insert_many(sample_universes)
-        logger.info("Sample universes seeded successfully")
-    
-    # Seed stories if empty
-    stories_count = await db.stories.count_documents({})
-    if stories_count == 0:
-        # Seed sample stories for Neon Shadows
-        sample_stories = [
-            {
-                "universe_id": "Neon Shadows",
-                "title": "Chapter 1: The Network Breach",
-                "content": "The city never sleeps, and neither do its digital ghosts. Rain cascaded down the neon-lit streets of Neo-Tokyo as Kira pulled her hood tighter, her neural implant buzzing with encrypted data streams. Tonight's job was supposed to be simple: breach the Omnicorp mainframe, extract the files, disappear into the digital fog. But nothing in the shadows is ever simple.\n\nHer fingers danced across the holographic interface, code flowing like liquid light. The corporation's firewall was a beast—adaptive, learning, almost alive. Almost. Kira had faced worse. In the underworld of cyber-warfare, she was known as Ghost Protocol, a whisper in the machine, impossible to trace.\n\n'You're in,' came the voice through her earpiece. Jax, her partner, monitoring from a safe house across the city. 'But there's movement. Corp security is mobilizing.'\n\n'Let them come,' Kira muttered, her eyes reflecting the cascading data. She had thirty seconds before the trace completed. Thirty seconds to change everything.",
-                "chapter_number": 1,
-                "author": "Cipher Echo",
-                "author_email": "cipher@fictionverse.io",
-                "status": "published",
-                "created_at": datetime.now(timezone.utc).isoformat()
-            },
-            {
-                "universe_id": "Neon Shadows",
-                "title": "Chapter 2: Corporate Shadows",
-                "content": "The extraction went sideways faster than Kira anticipated. Omnicorp wasn't just another megacorp—they had something new, something dangerous. As the data flooded her neural interface, fragmented images flashed: black sites, human experiments, a project codenamed 'Eclipse.'\n\n'Ghost, you need to abort!' Jax's voice cracked with static. 'They're using hunter-drones. Military grade!'\n\nKira's heart raced as she severed the connection, yanking the data spike from the terminal. The warehouse erupted in crimson warning lights. Through the grimy windows, she saw them: sleek, spider-like drones descending from the perpetual smog, their optical sensors scanning for heat signatures.\n\nShe bolted for the fire escape, her augmented legs propelling her up the rusted ladder. Behind her, plasma rounds scorched the metal, melting through decades of corrosion. The city sprawled beneath her, a labyrinth of light and shadow. Somewhere in that maze, answers waited. And so did the people who wanted her dead.",
-                "chapter_number": 2,
-                "author": "Cipher Echo",
-                "author_email": "cipher@fictionverse.io",
-                "status": "published",
-                "created_at": datetime.now(timezone.utc).isoformat()
-            }
-        ]
-        await db.stories.insert_many(sample_stories)
-        logger.info("Sample stories seeded successfully")
-    
-    # Seed characters if empty
-    characters_count = await db.characters.count_documents({})
-    if characters_count == 0:
-        # Seed sample characters
-        sample_characters = [
-            {
-                "universe_id": "Neon Shadows",
-                "name": "Kira 'Ghost Protocol' Chen",
-                "description": "Elite hacker and data thief operating in Neo-Tokyo's underbelly",
-                "role": "protagonist",
-                "traits": ["Brilliant", "Resourceful", "Haunted by past", "Loyal"],
-                "backstory": "Once a corporate security analyst, Kira witnessed Omnicorp's dark experiments firsthand. She faked her death and emerged as Ghost Protocol, dedicated to exposing corporate corruption one breach at a time.",
-                "created_at": datetime.now(timezone.utc).isoformat()
-            },
-            {
-                "universe_id": "Neon Shadows",
-                "name": "Jax Rivera",
-                "description": "Former military tech specialist and Kira's trusted partner",
-                "role": "supporting",
-                "traits": ["Tactical", "Protective", "Tech-savvy", "Cynical"],
-                "backstory": "Discharged after questioning orders, Jax found purpose in the underground resistance. His military connections provide invaluable intel.",
-                "created_at": datetime.now(timezone.utc).isoformat()
-            }
-        ]
-        await db.characters.insert_many(sample_characters)
-        logger.info("Sample characters seeded successfully")
-    
-    # Seed lore if empty
-    lore_count = await db.lore.count_documents({})
-    if lore_count == 0:
-        # Seed sample lore
-        sample_lore = [
-            {
-                "universe_id": "Neon Shadows",
-                "title": "Neo-Tokyo Overview",
-                "content": "Neo-Tokyo rose from the ashes of the old world, a vertical city of impossible scale. Three hundred million souls packed into megastructures that pierce the perpetual smog. The upper levels belong to the elite, bathed in artificial sunlight. The lower levels—the Undercity—exist in eternal twilight, where the law is whatever the corps say it is.",
-                "category": "geography",
-                "created_at": datetime.now(timezone.utc).isoformat()
-            },
-            {
-                "universe_id": "Neon Shadows",
-                "title": "Neural Implants",
-                "content": "Every citizen above Level 50 has neural implants—direct brain-computer interfaces that allow seamless interaction with the digital world. But the corps control the firmware. Every thought, every transaction, monitored. In the Undercity, hackers trade in black-market mods that promise freedom. At a price.",
-                "category": "technology",
-                "created_at": datetime.now(timezone.utc).isoformat()
-            }
-        ]
-        await db.lore.insert_many(sample_lore)
-        logger.info("Sample lore seeded successfully")
-    
-    # Seed clubs if empty
-    clubs_count = await db.clubs.count_documents({})
-    if clubs_count == 0:
-        # Seed sample clubs
-        sample_clubs = [
-            {
-                "name": "Cyberpunk Writers Circle",
-                "description": "A community for architects crafting dystopian futures and neon-soaked narratives",
-                "type": "writing",
-                "creator": "System",
-                "members": [],
-                "created_at": datetime.now(timezone.utc).isoformat()
-            },
-            {
-                "name": "Fantasy Realm Readers",
-                "description": "Travelers who explore magical universes and epic quests together",
-                "type": "reading",
-                "creator": "System",
-                "members": [],
-                "created_at": datetime.now(timezone.utc).isoformat()
-            }
-        ]
-        await db.clubs.insert_many(sample_clubs)
-        logger.info("Sample clubs seeded successfully")
-    
-    # Seed forum posts if empty
-    forum_count = await db.forum_posts.count_documents({})
-    if forum_count == 0:
-        # Seed sample forum posts
-        sample_forum_posts = [
-            {
-                "title": "Theory: Is Project Eclipse connected to the old world governments?",
-                "content": "I've been reading through the Neon Shadows chapters and noticed some interesting details about Project Eclipse. The timing of the experiments coincides with the fall of the UN. Anyone else notice this pattern?",
-                "author": "DataHunter",
-                "author_email": "hunter@fictionverse.io",
-                "category": "theory",
-                "tags": ["Neon Shadows", "Eclipse", "Theory"],
-                "replies_count": 0,
-                "created_at": datetime.now(timezone.utc).isoformat()
-            },
-            {
-                "title": "Writing Critique: How to write better dialogue in cyberpunk settings?",
-                "content": "Fellow architects, I'm working on my own cyber-noir universe and struggling with authentic-feeling dialogue. It either sounds too modern or too forced. Any tips from experienced writers here?",
-                "author": "NoviceArchitect",
-                "author_email": "novice@fictionverse.io",
-                "category": "critique",
-                "tags": ["Writing Tips", "Cyberpunk", "Dialogue"],
-                "replies_count": 0,
-                "created_at": datetime.now(timezone.utc).isoformat()
-            }
-        ]
-        await db.forum_posts.insert_many(sample_forum_posts)
-        logger.info("Sample forum posts seeded successfully")
-    
-    # Seed challenges if empty
-    challenges_count = await db.challenges.count_documents({})
-    if challenges_count == 0:
-        # Seed sample challenge
-        sample_challenges = [
-            {
-                "title": "The 100-Word Universe Challenge",
-                "description": "Create an entire universe in exactly 100 words. Show us a world worth exploring.",
-                "prompt": "In 100 words, describe a unique fictional universe. Include: setting, one character, one conflict, and the rules that make your world distinct. Make every word count.",
-                "type": "worldbuilding",
-                "deadline": None,
-                "submissions": [],
-                "created_at": datetime.now(timezone.utc).isoformat()
-            }
-        ]
-        await db.challenges.insert_many(sample_challenges)
-        logger.info("Sample challenges seeded successfully")
+    if os.environ.get('SEED_SAMPLE_DATA', 'true').lower() in ('1', 'true', 'yes'):
+        await seed_sample_data(db, chapter_bodies, lease_seconds=float(os.environ.get('SEED_LOCK_SECONDS', '60')))
+
+async def start_search_index():
+    # Builds in the background after seeding; requests are served meanwhile
+    search_index.start(db, refresh_seconds=float(os.environ.get('SEARCH_REFRESH_SECONDS', '30')))
+
+async def warm_password_hasher():
+    await password_hasher.warm()
+
+WARMUP_STEPS = [create_indexes, seed_data, start_search_index, warm_password_hasher]
+
+@app.on_event("startup")
+async def start_warmup():
+    # Last startup hook: from here on the app serves and /api/ready can pass
+    startup_profiler.start_warmup(WARMUP_STEPS)
+    startup_profiler.mark_ready()
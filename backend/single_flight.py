@@ -0,0 +1,71 @@
+"""Request coalescing: identical concurrent reads share one in-flight load.
+
+On a cache miss the first request for a key starts the load; requests for the same
+key arriving while it runs wait for that result instead of issuing their own query.
+When a new chapter drops, hundreds of readers then cost one find_one rather than
+hundreds. The load runs as its own task, so a leader whose client disconnects doesn't
+cancel it for everyone else; its exception (e.g. a 404) is shared the same way.
+
+A write invalidating a key (or its group) makes the server forget the flight: callers
+arriving afterwards start a fresh load instead of joining one that read before the
+write. Callers already waiting still get the load they joined.
+"""
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, Optional, Set
+
+
+class SingleFlight:
+
+    def __init__(self):
+        self._flights: Dict[Hashable, asyncio.Task] = {}
+        self._groups: Dict[Hashable, Set[Hashable]] = {}
+        # per-route counts: loads actually run vs. requests that joined one
+        self.loads: Dict[str, int] = {}
+        self.coalesced: Dict[str, int] = {}
+        self.forgotten = 0
+
+    async def do(self, key: Hashable, load: Callable[[], Awaitable], group: Optional[Hashable] = None):
+        name = key[0] if isinstance(key, tuple) else str(key)
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = self._flights[key] = asyncio.ensure_future(load())
+            flight.add_done_callback(lambda task: self._landed(key, group, task))
+            if group is not None:
+                self._groups.setdefault(group, set()).add(key)
+            self.loads[name] = self.loads.get(name, 0) + 1
+        else:
+            self.coalesced[name] = self.coalesced.get(name, 0) + 1
+        return await asyncio.shield(flight)
+
+    def forget(self, key: Hashable):
+        if self._flights.pop(key, None) is not None:
+            self.forgotten += 1
+
+    def forget_group(self, group: Hashable):
+        for key in self._groups.pop(group, ()):
+            self.forget(key)
+
+    def _landed(self, key: Hashable, group: Optional[Hashable], task: asyncio.Task):
+        # A forgotten flight may have been replaced by a fresh one under the same key
+        if self._flights.get(key) is task:
+            del self._flights[key]
+            if group is not None and key in self._groups.get(group, ()):
+                self._groups[group].discard(key)
+                if not self._groups[group]:
+                    del self._groups[group]
+        if not task.cancelled():
+            # Marks the exception retrieved even if every waiter has gone away
+            task.exception()
+
+    def render(self) -> str:
+        # Prometheus counters, appended to GET /metrics
+        lines = []
+        for metric, counts, help_text in (("fv_singleflight_loads_total", self.loads, "Loads run on a cache miss"),
+                                          ("fv_singleflight_coalesced_total", self.coalesced, "Requests that joined an in-flight load")):
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} counter")
+            lines.extend(f'{metric}{{route="{name}"}} {count}' for name, count in sorted(counts.items()))
+        return "\n".join(lines) + "\n"
+
+    def stats(self) -> dict:
+        return {"in_flight": len(self._flights), "loads": dict(self.loads), "coalesced": dict(self.coalesced), "forgotten": self.forgotten}
@@ -0,0 +1,144 @@
+"""Startup cost accounting and the background warmup that keeps it off the critical path.
+
+StartupProfiler records how long each phase of bringing a worker up takes: module
+initialization, each startup hook, and the warmup steps (index checks, migrations,
+seeding) that run in the background once the app is already serving. The timings are
+logged when warmup finishes and shown in /api/admin/stats.
+
+Per-module import cost is measured separately, in a clean interpreter:
+
+    cd backend && python -m startup_profile
+"""
+import asyncio
+import functools
+import logging
+import os
+import re
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class StartupProfiler:
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._last_mark = self.started
+        self.timings: Dict[str, float] = {}
+        self.ready_seconds: Optional[float] = None
+        self.warmup_pending: List[str] = []
+        self.warmup_failed: List[str] = []
+        self._warmup: Optional[asyncio.Task] = None
+
+    def mark(self, name: str):
+        # Time since the previous mark, for straight-line module code
+        now = time.perf_counter()
+        self.timings[name] = now - self._last_mark
+        self._last_mark = now
+
+    @contextmanager
+    def measure(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = time.perf_counter() - started
+
+    def timed(self, name: str):
+        def decorator(fn):
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                with self.measure(name):
+                    return await fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def mark_ready(self):
+        self.ready_seconds = time.perf_counter() - self.started
+        logger.info("Ready to serve %.0fms after startup began", self.ready_seconds * 1000)
+
+    def start_warmup(self, steps):
+        self.warmup_pending = [step.__name__ for step in steps]
+        self._warmup = asyncio.create_task(self._run_warmup(steps))
+
+    async def _run_warmup(self, steps):
+        # One at a time: later steps (seeding, search) expect the earlier ones done
+        for step in steps:
+            try:
+                with self.measure(step.__name__):
+                    await step()
+            except Exception:
+                logger.exception("Warmup step %s failed", step.__name__)
+                self.warmup_failed.append(step.__name__)
+            self.warmup_pending.remove(step.__name__)
+        logger.info("Startup profile: %s", ", ".join(f"{name} {seconds * 1000:.0f}ms" for name, seconds in self.timings.items()))
+
+    async def wait_for_warmup(self):
+        if self._warmup:
+            await asyncio.shield(self._warmup)
+
+    async def stop(self):
+        if self._warmup and not self._warmup.done():
+            self._warmup.cancel()
+            try:
+                await self._warmup
+            except asyncio.CancelledError:
+                pass
+
+    def stats(self) -> dict:
+        return {
+            "ready_ms": round(self.ready_seconds * 1000, 1) if self.ready_seconds is not None else None,
+            "components_ms": {name: round(seconds * 1000, 1) for name, seconds in self.timings.items()},
+            "warmup_pending": list(self.warmup_pending),
+            "warmup_failed": list(self.warmup_failed),
+        }
+
+
+_IMPORT_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def import_costs(module: str = "server") -> List[tuple]:
+    """Cumulative import time per top-level package, from `python -X importtime`."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    costs: Dict[str, int] = {}
+    for line in result.stderr.splitlines():
+        match = _IMPORT_LINE.match(line)
+        # Only direct imports of `module` (one level of nesting) add up to its total
+        if match and len(match.group(3)) == 3:
+            package = match.group(4).split(".")[0]
+            costs[package] = costs.get(package, 0) + int(match.group(2))
+    return sorted(((package, us / 1000) for package, us in costs.items()), key=lambda item: -item[1])
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Import and init cost of the API per component")
+    parser.add_argument("--module", default="server")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    costs = import_costs(args.module)
+    print(f"{'import':<28}{'ms':>9}")
+    for package, ms in costs[:args.top]:
+        print(f"{package:<28}{ms:>9.1f}")
+    print(f"{'total':<28}{sum(ms for _, ms in costs):>9.1f}")
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    app_module = __import__(args.module)
+    profiler = getattr(app_module, "startup_profiler", None)
+    if profiler is not None:
+        print(f"\n{'init':<28}{'ms':>9}")
+        for name, seconds in profiler.timings.items():
+            print(f"{name:<28}{seconds * 1000:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+"""Streaming NDJSON export and import of a whole universe.
+
+One JSON object per line: {"kind": "universe" | "chapter" | "character" | "lore",
+"data": {...}}, universe first. Both directions work in fixed-size batches, so memory
+use depends on the batch size rather than on the size of the universe. Imports upsert
+on each document's natural key, so re-importing an archive updates it in place.
+
+    python -m universe_archive export "Neon Shadows" > neon-shadows.ndjson
+    python -m universe_archive import neon-shadows.ndjson --owner you@example.com
+"""
+import argparse
+import asyncio
+import json
+import sys
+from datetime import datetime, timezone
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from bson import ObjectId
+from fastapi import HTTPException
+from pydantic import ValidationError
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from chapter_bodies import detach_body
+from pagination import CHAPTER_SORT, INSERTION_SORT
+
+# kind -> (collection, natural key within the universe, export order)
+KINDS = {
+    "chapter": ("stories", "chapter_number", CHAPTER_SORT),
+    "character": ("characters", "name", INSERTION_SORT),
+    "lore": ("lore", "title", INSERTION_SORT),
+}
+
+MAX_LINE_BYTES = 16 * 1024 * 1024
+MAX_REPORTED_ERRORS = 100
+
+# Owner and derived fields are reassigned on import
+EXPORT_EXCLUDE = ("_id", "author", "author_email", "word_count", "excerpt")
+
+
+def _line(kind: str, doc: dict) -> str:
+    data = {k: v for k, v in doc.items() if k not in EXPORT_EXCLUDE}
+    return json.dumps({"kind": kind, "data": data}, default=str, ensure_ascii=False) + "\n"
+
+
+async def export_universe(db, chapter_bodies, universe: dict, batch_size: int = 200) -> AsyncIterator[bytes]:
+    """Yield the archive one batch of lines at a time."""
+    yield _line("universe", universe).encode("utf-8")
+    for kind, (collection, _, sort) in KINDS.items():
+        cursor = db[collection].find({"universe_id": universe["title"]}).sort(sort).batch_size(batch_size)
+        batch: List[dict] = []
+        async for doc in cursor:
+            batch.append(doc)
+            if len(batch) >= batch_size:
+                yield await _export_batch(db, chapter_bodies, kind, batch)
+                batch = []
+        if batch:
+            yield await _export_batch(db, chapter_bodies, kind, batch)
+
+
+async def _export_batch(db, chapter_bodies, kind: str, docs: List[dict]) -> bytes:
+    if kind == "chapter":
+        await chapter_bodies.attach(db, docs)
+    return "".join(_line(kind, doc) for doc in docs).encode("utf-8")
+
+
+async def iter_lines(chunks: AsyncIterator[bytes], max_line_bytes: int = MAX_LINE_BYTES) -> AsyncIterator[tuple]:
+    """(line number, line) pairs from a byte stream, holding at most one line in memory."""
+    # A line's pieces are joined once at its newline, so a line spread over many
+    # chunks is copied once rather than on every chunk
+    parts: List[bytes] = []
+    size = 0
+    number = 0
+    async for chunk in chunks:
+        start = 0
+        end = chunk.find(b"\n")
+        while end >= 0:
+            parts.append(chunk[start:end])
+            number += 1
+            yield number, b"".join(parts)
+            parts, size = [], 0
+            start = end + 1
+            end = chunk.find(b"\n", start)
+        if start < len(chunk):
+            parts.append(chunk[start:])
+            size += len(chunk) - start
+        if size > max_line_bytes:
+            raise HTTPException(status_code=413, detail=f"Line {number + 1} is longer than {max_line_bytes} bytes")
+    if parts:
+        yield number + 1, b"".join(parts)
+
+
+class UniverseImporter:
+
+    def __init__(self, db, chapter_bodies, models: Dict[str, type], owner: dict,
+                 on_batch: Optional[Callable[[str, List[dict]], Awaitable[None]]] = None, batch_size: int = 500):
+        # models: kind -> pydantic model validating that kind's "data"
+        self.db = db
+        self.chapter_bodies = chapter_bodies
+        self.models = models
+        self.owner = owner
+        self.on_batch = on_batch
+        self.batch_size = batch_size
+        self.universe: Optional[str] = None
+        self.counts = {kind: 0 for kind in KINDS}
+        self.errors: List[dict] = []
+        self.error_count = 0
+        self._pending: Dict[str, List[tuple]] = {kind: [] for kind in KINDS}
+
+    def _error(self, line: int, detail: str):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "detail": detail})
+
+    async def run(self, lines: AsyncIterator[tuple]) -> dict:
+        async for number, line in lines:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                kind, data = record["kind"], record["data"]
+                if self.universe is None:
+                    if kind != "universe":
+                        raise HTTPException(status_code=400, detail=f"Line {number}: the universe must come first")
+                    await self._import_universe(self.models["universe"].model_validate(data).model_dump())
+                    continue
+                if kind not in KINDS:
+                    raise ValueError(f"unknown kind {kind!r}")
+                doc = self.models[kind].model_validate({**data, "universe_id": self.universe}).model_dump()
+            except HTTPException:
+                raise
+            except (ValueError, KeyError, TypeError) as exc:
+                # json and pydantic errors are ValueErrors
+                if self.universe is None:
+                    raise HTTPException(status_code=400, detail=f"Line {number}: {exc}")
+                detail = "; ".join(e["msg"] for e in exc.errors()) if isinstance(exc, ValidationError) else str(exc)
+                self._error(number, detail)
+                continue
+
+            pending = self._pending[kind]
+            pending.append((number, doc))
+            if len(pending) >= self.batch_size:
+                await self._flush(kind)
+
+        if self.universe is None:
+            raise HTTPException(status_code=400, detail="Empty archive")
+        for kind in KINDS:
+            await self._flush(kind)
+        return {"universe": self.universe, "imported": self.counts, "error_count": self.error_count, "errors": self.errors}
+
+    async def _import_universe(self, universe: dict):
+        existing = await self.db.universes.find_one({"title": universe["title"]}, {"author_email": 1})
+        if existing and existing.get("author_email") != self.owner["email"]:
+            raise HTTPException(status_code=403, detail="Universe belongs to another author")
+        now = datetime.now(timezone.utc).isoformat()
+        universe.update(author=self.owner["username"], author_email=self.owner["email"], updated_at=now)
+        stored = await self.db.universes.find_one_and_update(
+            {"title": universe["title"]},
+            {"$set": universe, "$setOnInsert": {"status": "active", "created_at": now}},
+            projection={"_id": 1},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        universe["_id"] = stored["_id"]
+        self.universe = universe["title"]
+        if self.on_batch:
+            await self.on_batch("universe", [universe])
+
+    async def _flush(self, kind: str):
+        pending, self._pending[kind] = self._pending[kind], []
+        if not pending:
+            return
+        collection, key, _ = KINDS[kind]
+        now = datetime.now(timezone.utc).isoformat()
+        # Later lines win when an archive repeats a key
+        docs = {doc[key]: (number, doc) for number, doc in pending}
+
+        bodies = {}
+        planned = {}
+        if kind == "chapter":
+            # Bodies are stored before the metadata, so a reader never pairs the new
+            # word count/excerpt with the old body. New chapters get their _id up front.
+            existing = {}
+            async for doc in self.db[collection].find({"universe_id": self.universe, key: {"$in": list(docs)}}, {key: 1}):
+                existing[doc[key]] = doc["_id"]
+            for value, (_, doc) in docs.items():
+                planned[value] = existing.get(value) or ObjectId()
+                bodies[value] = detach_body(doc)
+                doc.update(author=self.owner["username"], author_email=self.owner["email"])
+            await self.chapter_bodies.save_many({planned[value]: bodies[value] for value in docs})
+
+        operations = []
+        for value, (_, doc) in docs.items():
+            doc["updated_at"] = now
+            insert_only = {"created_at": now}
+            if value in planned:
+                insert_only["_id"] = planned[value]
+            operations.append(UpdateOne(
+                {"universe_id": self.universe, key: value},
+                {"$set": doc, "$setOnInsert": insert_only},
+                upsert=True
+            ))
+
+        failed = set()
+        try:
+            await self.db[collection].bulk_write(operations, ordered=False)
+        except BulkWriteError as exc:
+            values = list(docs)
+            for error in exc.details.get("writeErrors", []):
+                value = values[error["index"]]
+                failed.add(value)
+                self._error(docs[value][0], error.get("errmsg", "write failed"))
+
+        written = [doc for value, (_, doc) in docs.items() if value not in failed]
+        ids = {}
+        async for doc in self.db[collection].find({"universe_id": self.universe, key: {"$in": [d[key] for d in written]}}, {key: 1}):
+            ids[doc[key]] = doc["_id"]
+        for doc in written:
+            doc["_id"] = ids.get(doc[key])
+        written = [doc for doc in written if doc["_id"] is not None]
+
+        if kind == "chapter":
+            # A new chapter whose insert failed, or that another writer created between
+            # the lookup and the upsert: move the body to the id that won, drop the rest
+            moved = {doc["_id"]: bodies[doc[key]] for doc in written if doc["_id"] != planned[doc[key]]}
+            if moved:
+                await self.chapter_bodies.save_many(moved)
+            await self.chapter_bodies.delete_many([
+                planned[value] for value in docs if value not in existing and ids.get(value) != planned[value]
+            ])
+            for doc in written:
+                doc["content"] = bodies[doc[key]]
+        self.counts[kind] += len(written)
+        if self.on_batch:
+            await self.on_batch(kind, written)
+
+
+# ---------- command line ----------
+
+async def _file_chunks(path: str, chunk_size: int = 1024 * 1024) -> AsyncIterator[bytes]:
+    with (sys.stdin.buffer if path == "-" else open(path, "rb")) as stream:
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+async def _cli(args):
+    # The server module owns the models and the configured database connection.
+    # Running servers pick up imported documents through their cache TTLs and search sync;
+    # the overview is shared in MongoDB, so it is rebuilt here.
+    import server
+
+    if args.command == "export":
+        universe = await server.db.universes.find_one({"title": args.universe})
+        if not universe:
+            sys.exit(f"Universe {args.universe!r} not found")
+        out = sys.stdout.buffer if args.output == "-" else open(args.output, "wb")
+        with out:
+            async for chunk in export_universe(server.db, server.chapter_bodies, universe, args.batch_size):
+                out.write(chunk)
+    else:
+        owner = await server.db.users.find_one({"email": args.owner}, {"username": 1, "email": 1})
+        if not owner:
+            sys.exit(f"User {args.owner!r} not found")
+        importer = UniverseImporter(server.db, server.chapter_bodies, server.ARCHIVE_MODELS, owner, batch_size=args.batch_size)
+        try:
+            summary = await importer.run(iter_lines(_file_chunks(args.input)))
+        except HTTPException as exc:
+            sys.exit(exc.detail)
+        if summary["universe"]:
+            await server.universe_overviews.rebuild(summary["universe"])
+        print(json.dumps(summary, indent=2))
+    server.client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help="write a universe archive")
+    export.add_argument("universe", help="universe title")
+    export.add_argument("-o", "--output", default="-")
+    export.add_argument("--batch-size", type=int, default=200)
+    load = commands.add_parser("import", help="load a universe archive")
+    load.add_argument("input", help="archive path, or - for stdin")
+    load.add_argument("--owner", required=True, help="email of the user who will own the universe")
+    load.add_argument("--batch-size", type=int, default=500)
+    asyncio.run(_cli(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
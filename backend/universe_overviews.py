@@ -0,0 +1,148 @@
+"""Materialized per-universe overview: the universe, chapter index, characters and lore.
+
+    {_id: title, universe_id, universe: {...}, chapters: [...], characters: [...], lore: [...],
+     counts: {chapters, characters, lore}, version, schema, updated_at}
+
+The Universe Detail page reads it with one _id lookup instead of four queries.
+create_story/create_character/create_lore patch it in place with $push/$inc; other
+changes (chapter edits, imports) rebuild it. Every change bumps `version`, and a rebuild
+only replaces the version it started from, so it can't overwrite an incremental update
+that landed meanwhile. `schema` changes with the document shape; an overview with an
+older schema is stale and is rebuilt when read. Lists are capped (counts are not); the
+rest is paged from the per-collection routes.
+"""
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Optional
+
+from pymongo.errors import DuplicateKeyError
+
+from pagination import CHAPTER_SORT, INSERTION_SORT
+
+logger = logging.getLogger(__name__)
+
+COLLECTION = "universe_overviews"
+SCHEMA = 1
+
+CHAPTER_FIELDS = ("title", "chapter_number", "status", "word_count", "created_at")
+CHARACTER_FIELDS = ("name", "role", "description")
+LORE_FIELDS = ("title", "category")
+
+
+def _entry(doc: dict, fields) -> dict:
+    entry = {"_id": str(doc["_id"])}
+    entry.update({field: doc.get(field) for field in fields})
+    return entry
+
+
+class UniverseOverviews:
+
+    def __init__(self, db, read_db=None, max_chapters: int = 500, max_entries: int = 100):
+        self.db = db
+        self.collection = db[COLLECTION]
+        self.read_collection = (read_db if read_db is not None else db)[COLLECTION]
+        self.max_chapters = max_chapters
+        self.max_entries = max_entries
+        self.incremental_updates = 0
+        self.rebuilds = 0
+        self.stale_reads = 0
+
+    async def get(self, universe_id: str) -> Optional[dict]:
+        overview = await self.read_collection.find_one({"_id": universe_id})
+        if overview is not None and overview.get("schema") == SCHEMA:
+            return overview
+        if overview is not None:
+            self.stale_reads += 1
+        elif await self.db.universes.find_one({"title": universe_id}, {"_id": 1}) is None:
+            # Unknown ids cost one indexed lookup, not a rebuild on every request
+            return None
+        return await self.rebuild(universe_id)
+
+    async def _build(self, universe_id: str, version: int) -> Optional[dict]:
+        query = {"universe_id": universe_id}
+        universe, chapters, characters, lore, *counts = await asyncio.gather(
+            self.db.universes.find_one({"title": universe_id}, {"_id": 0}),
+            self.db.stories.find(query, dict.fromkeys(CHAPTER_FIELDS, 1)).sort(CHAPTER_SORT).to_list(self.max_chapters),
+            self.db.characters.find(query, dict.fromkeys(CHARACTER_FIELDS, 1)).sort(INSERTION_SORT).to_list(self.max_entries),
+            self.db.lore.find(query, dict.fromkeys(LORE_FIELDS, 1)).sort(INSERTION_SORT).to_list(self.max_entries),
+            self.db.stories.count_documents(query),
+            self.db.characters.count_documents(query),
+            self.db.lore.count_documents(query),
+        )
+        if universe is None:
+            return None
+        return {
+            "_id": universe_id,
+            "universe_id": universe_id,
+            "universe": universe,
+            "chapters": [_entry(doc, CHAPTER_FIELDS) for doc in chapters],
+            "characters": [_entry(doc, CHARACTER_FIELDS) for doc in characters],
+            "lore": [_entry(doc, LORE_FIELDS) for doc in lore],
+            "counts": dict(zip(("chapters", "characters", "lore"), counts)),
+            "version": version,
+            "schema": SCHEMA,
+            "updated_at": datetime.now(timezone.utc).isoformat(),
+        }
+
+    async def rebuild(self, universe_id: str) -> Optional[dict]:
+        overview = None
+        for _ in range(3):
+            current = await self.collection.find_one({"_id": universe_id}, {"version": 1})
+            version = current["version"] if current else 0
+            overview = await self._build(universe_id, version + 1)
+            if overview is None:
+                await self.collection.delete_one({"_id": universe_id})
+                return None
+            try:
+                if current is None:
+                    await self.collection.insert_one(overview)
+                    self.rebuilds += 1
+                    return overview
+                result = await self.collection.replace_one({"_id": universe_id, "version": version}, overview)
+                if result.matched_count:
+                    self.rebuilds += 1
+                    return overview
+            except DuplicateKeyError:
+                pass
+            # Another write moved the version on while we read; read again
+        logger.warning("Overview for %s kept changing during rebuild; serving the last build", universe_id)
+        return overview
+
+    async def _push(self, universe_id: str, field: str, entry: dict, limit: int, sort=None):
+        push = {"$each": [entry], "$slice": limit}
+        if sort:
+            push["$sort"] = sort
+        # The $ne guard skips entries a concurrent rebuild already picked up
+        result = await self.collection.update_one(
+            {"_id": universe_id, "schema": SCHEMA, f"{field}._id": {"$ne": entry["_id"]}},
+            {
+                "$push": {field: push},
+                "$inc": {f"counts.{field}": 1, "version": 1},
+                "$set": {"updated_at": datetime.now(timezone.utc).isoformat()},
+            }
+        )
+        if result.matched_count:
+            self.incremental_updates += 1
+        else:
+            # Not built yet, stale or already holding the entry: build it from the
+            # collections, which include this write
+            await self.rebuild(universe_id)
+
+    async def add_chapter(self, story: dict):
+        # Kept in chapter order; chapters past the cap are only counted
+        await self._push(story["universe_id"], "chapters", _entry(story, CHAPTER_FIELDS), self.max_chapters, {"chapter_number": 1})
+
+    async def add_character(self, character: dict):
+        await self._push(character["universe_id"], "characters", _entry(character, CHARACTER_FIELDS), self.max_entries)
+
+    async def add_lore(self, lore: dict):
+        await self._push(lore["universe_id"], "lore", _entry(lore, LORE_FIELDS), self.max_entries)
+
+    def stats(self) -> dict:
+        return {
+            "schema": SCHEMA,
+            "incremental_updates": self.incremental_updates,
+            "rebuilds": self.rebuilds,
+            "stale_reads": self.stale_reads,
+        }
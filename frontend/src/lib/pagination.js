@@ -0,0 +1,13 @@
+import axios from 'axios';
+
+// Follows next_cursor until the last page and returns every item
+export async function fetchAllPages(url, params = {}) {
+  const items = [];
+  let cursor = null;
+  do {
+    const response = await axios.get(url, { params: cursor ? { ...params, cursor } : params });
+    items.push(...response.data.items);
+    cursor = response.data.next_cursor;
+  } while (cursor);
+  return items;
+}
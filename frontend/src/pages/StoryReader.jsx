@@ -4,6 +4,7 @@ import { Button } from '@/components/ui/button';
 import { Badge } from '@/components/ui/badge';
 import { ChevronLeft, ChevronRight, BookOpen, Users, Globe2 } from 'lucide-react';
 import axios from 'axios';
+import { fetchAllPages } from '@/lib/pagination';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
@@ -32,9 +33,8 @@ export const StoryReader = () => {
       const universeRes = await axios.get(`${API}/universes/${universeId}`);
       setUniverse(universeRes.data);
       
-      // Fetch all chapters
-      const chaptersRes = await axios.get(`${API}/stories/${universeId}`);
-      setAllChapters(chaptersRes.data);
+      // Fetch all chapters (the table of contents is paged)
+      setAllChapters(await fetchAllPages(`${API}/stories/${universeId}/toc`, { limit: 200 }));
     } catch (error) {
       console.error('Failed to fetch story:', error);
     } finally {
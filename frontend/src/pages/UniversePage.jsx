@@ -8,6 +8,7 @@ import {
   Sparkles, User, Play, Clock 
 } from 'lucide-react';
 import axios from 'axios';
+import { fetchAllPages } from '@/lib/pagination';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
@@ -29,17 +30,17 @@ export const UniversePage = () => {
     try {
       setIsLoading(true);
       
-      const [universeRes, chaptersRes, charactersRes, loreRes] = await Promise.all([
+      const [universeRes, chapterList, charactersRes, loreRes] = await Promise.all([
         axios.get(`${API}/universes/${universeId}`),
-        axios.get(`${API}/stories/${universeId}`),
+        fetchAllPages(`${API}/stories/${universeId}`, { limit: 200 }),
         axios.get(`${API}/characters/${universeId}`),
         axios.get(`${API}/lore/${universeId}`)
       ]);
       
       setUniverse(universeRes.data);
-      setChapters(chaptersRes.data);
-      setCharacters(charactersRes.data);
-      setLore(loreRes.data);
+      setChapters(chapterList);
+      setCharacters(charactersRes.data.items);
+      setLore(loreRes.data.items);
     } catch (error) {
       console.error('Failed to fetch universe data:', error);
     } finally {
@@ -215,7 +216,7 @@ export const UniversePage = () => {
                           {chapter.title}
                         </h3>
                         <p className="text-muted-foreground text-sm line-clamp-2">
-                          {chapter.content.substring(0, 200)}...
+                          {chapter.excerpt}...
                         </p>
                       </div>
                       <Button 
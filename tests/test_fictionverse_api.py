@@ -1,14 +1,26 @@
 """
 Fictionverse API Backend Tests
 Tests for: Auth, Universes, Stories, Characters, Lore endpoints
+
+The suite signs up many users from one address, so run the server under test with
+relaxed per-IP auth limits, e.g. RATE_LIMITS="signup=1000/60,login=1000/60".
 """
 import pytest
 import requests
 import os
+import json
+import sys
+import time
+import asyncio
 import uuid
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 
 BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
 
+# Backend modules tested in-process (no server needed)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
 # Test user credentials
 TEST_USER = {
     "username": f"TEST_user_{uuid.uuid4().hex[:8]}",
@@ -16,6 +28,43 @@ TEST_USER = {
     "password": "testpassword123"
 }
 
+# Optional admin account (granted with `python -m admin_users grant <email>`)
+ADMIN_USER = {
+    "username": "TEST_admin",
+    "email": os.environ.get('TEST_ADMIN_EMAIL', ''),
+    "password": os.environ.get('TEST_ADMIN_PASSWORD', '')
+}
+
+
+def signed_in_session(prefix="TEST_session"):
+    """Sign up a fresh user and return a session carrying its auth cookie"""
+    session = requests.Session()
+    response = session.post(f"{BASE_URL}/api/auth/signup", json={
+        "username": f"{prefix}_{uuid.uuid4().hex[:8]}",
+        "email": f"{prefix}_{uuid.uuid4().hex[:8]}@fictionverse.io",
+        "password": "testpassword123"
+    })
+    assert response.status_code == 200
+    return session
+
+
+_admin_session = None
+
+
+def admin_session():
+    """Session signed in as ADMIN_USER (created on first use, signed in once per run)"""
+    global _admin_session
+    if _admin_session is None:
+        session = requests.Session()
+        session.post(f"{BASE_URL}/api/auth/signup", json=ADMIN_USER)
+        response = session.post(f"{BASE_URL}/api/auth/login", json={
+            "email": ADMIN_USER["email"],
+            "password": ADMIN_USER["password"]
+        })
+        assert response.status_code == 200
+        _admin_session = session
+    return _admin_session
+
 
 class TestHealthCheck:
     """Basic API health check tests"""
@@ -137,14 +186,14 @@ class TestStoriesEndpoints:
         response = requests.get(f"{BASE_URL}/api/stories/Neon%20Shadows")
         assert response.status_code == 200
         data = response.json()
-        assert isinstance(data, list)
-        assert len(data) >= 2  # Seeded with 2 chapters
+        assert isinstance(data["items"], list)
+        assert len(data["items"]) >= 2  # Seeded with 2 chapters
     
     def test_get_stories_sorted_by_chapter(self):
         """Test stories are sorted by chapter number"""
         response = requests.get(f"{BASE_URL}/api/stories/Neon%20Shadows")
         assert response.status_code == 200
-        data = response.json()
+        data = response.json()["items"]
         
         if len(data) > 1:
             for i in range(len(data) - 1):
@@ -175,8 +224,8 @@ class TestCharactersEndpoints:
         response = requests.get(f"{BASE_URL}/api/characters/Neon%20Shadows")
         assert response.status_code == 200
         data = response.json()
-        assert isinstance(data, list)
-        assert len(data) >= 2  # Seeded with 2 characters
+        assert isinstance(data["items"], list)
+        assert len(data["items"]) >= 2  # Seeded with 2 characters
     
     def test_characters_have_required_fields(self):
         """Test characters have all required fields"""
@@ -184,7 +233,7 @@ class TestCharactersEndpoints:
         assert response.status_code == 200
         data = response.json()
         
-        for character in data:
+        for character in data["items"]:
             assert "name" in character
             assert "description" in character
             assert "role" in character
@@ -199,8 +248,8 @@ class TestLoreEndpoints:
         response = requests.get(f"{BASE_URL}/api/lore/Neon%20Shadows")
         assert response.status_code == 200
         data = response.json()
-        assert isinstance(data, list)
-        assert len(data) >= 2  # Seeded with 2 lore entries
+        assert isinstance(data["items"], list)
+        assert len(data["items"]) >= 2  # Seeded with 2 lore entries
     
     def test_lore_has_required_fields(self):
         """Test lore entries have all required fields"""
@@ -208,7 +257,7 @@ class TestLoreEndpoints:
         assert response.status_code == 200
         data = response.json()
         
-        for entry in data:
+        for entry in data["items"]:
             assert "title" in entry
             assert "content" in entry
             assert "category" in entry
@@ -222,7 +271,7 @@ class TestClubsEndpoints:
         response = requests.get(f"{BASE_URL}/api/clubs")
         assert response.status_code == 200
         data = response.json()
-        assert isinstance(data, list)
+        assert isinstance(data["items"], list)
 
 
 class TestForumEndpoints:
@@ -233,7 +282,7 @@ class TestForumEndpoints:
         response = requests.get(f"{BASE_URL}/api/forum/posts")
         assert response.status_code == 200
         data = response.json()
-        assert isinstance(data, list)
+        assert isinstance(data["items"], list)
 
 
 class TestChallengesEndpoints:
@@ -244,7 +293,7 @@ class TestChallengesEndpoints:
         response = requests.get(f"{BASE_URL}/api/challenges")
         assert response.status_code == 200
         data = response.json()
-        assert isinstance(data, list)
+        assert isinstance(data["items"], list)
 
 
 class TestUniverseFilterEndpoints:
@@ -255,11 +304,1323 @@ class TestUniverseFilterEndpoints:
         response = requests.get(f"{BASE_URL}/api/universes/filter/Cyberpunk")
         assert response.status_code == 200
         data = response.json()
-        assert isinstance(data, list)
+        assert isinstance(data["items"], list)
         
-        for universe in data:
+        for universe in data["items"]:
             assert universe["genre"] == "Cyberpunk"
 
 
+class TestCursorPagination:
+    """Keyset cursor pagination on list endpoints"""
+
+    def test_list_response_shape(self):
+        """Test list endpoints return items and next_cursor"""
+        response = requests.get(f"{BASE_URL}/api/characters/Neon%20Shadows")
+        assert response.status_code == 200
+        data = response.json()
+        assert "items" in data
+        assert "next_cursor" in data
+
+    def test_second_page_does_not_overlap(self):
+        """Test following next_cursor returns the following items only"""
+        first = requests.get(f"{BASE_URL}/api/stories/Neon%20Shadows", params={"limit": 1}).json()
+        assert len(first["items"]) == 1
+        assert first["next_cursor"] is not None
+
+        second = requests.get(f"{BASE_URL}/api/stories/Neon%20Shadows", params={"limit": 1, "cursor": first["next_cursor"]}).json()
+        assert len(second["items"]) == 1
+        assert second["items"][0]["chapter_number"] > first["items"][0]["chapter_number"]
+
+    def test_last_page_has_null_cursor(self):
+        """Test the final page reports next_cursor as null"""
+        cursor = None
+        seen = []
+        for _ in range(50):
+            params = {"limit": 1}
+            if cursor:
+                params["cursor"] = cursor
+            data = requests.get(f"{BASE_URL}/api/lore/Neon%20Shadows", params=params).json()
+            seen.extend(entry["title"] for entry in data["items"])
+            cursor = data["next_cursor"]
+            if cursor is None:
+                break
+        assert cursor is None
+        assert len(seen) == len(set(seen))
+        assert len(seen) >= 2
+
+    def test_invalid_cursor(self):
+        """Test a malformed cursor returns 400"""
+        response = requests.get(f"{BASE_URL}/api/clubs", params={"cursor": "not-a-cursor"})
+        assert response.status_code == 400
+
+    def test_limit_out_of_range(self):
+        """Test limit above the maximum page size is rejected"""
+        response = requests.get(f"{BASE_URL}/api/challenges", params={"limit": 100000})
+        assert response.status_code == 422
+
+
+
+class TestAdminEndpoints:
+    """Index bootstrap, query plans and admin access"""
+
+    def test_admin_requires_auth(self):
+        """Test admin routes reject anonymous requests"""
+        response = requests.get(f"{BASE_URL}/api/admin/stats")
+        assert response.status_code == 401
+
+    def test_admin_forbidden_for_regular_user(self):
+        """Test admin routes return 403 for accounts without the admin role"""
+        session = signed_in_session("TEST_nonadmin")
+        assert session.get(f"{BASE_URL}/api/admin/stats").status_code == 403
+        assert session.get(f"{BASE_URL}/api/admin/query-plans").status_code == 403
+
+    def test_signup_cannot_claim_admin(self):
+        """Test a role sent at signup is ignored"""
+        session = requests.Session()
+        response = session.post(f"{BASE_URL}/api/auth/signup", json={
+            "username": "TEST_claim", "email": f"TEST_claim_{uuid.uuid4().hex[:8]}@fictionverse.io",
+            "password": "testpassword123", "role": "admin"
+        })
+        assert response.status_code == 200
+        assert response.json()["user"]["role"] == "traveler"
+        assert session.get(f"{BASE_URL}/api/admin/stats").status_code == 403
+
+    @pytest.mark.skipif(not ADMIN_USER["email"], reason="TEST_ADMIN_EMAIL not set")
+    def test_stats_for_admin(self):
+        """Test an admin account reads the runtime stats"""
+        response = admin_session().get(f"{BASE_URL}/api/admin/stats")
+        assert response.status_code == 200
+        assert {"read_cache", "search_index", "mongo_pool", "rate_limits"} <= set(response.json())
+
+    @pytest.mark.skipif(not ADMIN_USER["email"], reason="TEST_ADMIN_EMAIL not set")
+    def test_query_plans_use_indexes(self):
+        """Test every route's query shape is served by an index"""
+        response = admin_session().get(f"{BASE_URL}/api/admin/query-plans")
+        assert response.status_code == 200
+        data = response.json()
+        assert len(data["plans"]) > 0
+        assert data["collscans"] == []
+
+
+
+class TestPasswordHashing:
+    """Password hashing runs off the event loop"""
+
+    def test_concurrent_logins(self):
+        """Test parallel logins all succeed and the API keeps answering meanwhile"""
+        user = {
+            "username": f"TEST_hash_{uuid.uuid4().hex[:8]}",
+            "email": f"TEST_hash_{uuid.uuid4().hex[:8]}@fictionverse.io",
+            "password": "testpassword123"
+        }
+        assert requests.post(f"{BASE_URL}/api/auth/signup", json=user).status_code == 200
+
+        def login():
+            return requests.post(f"{BASE_URL}/api/auth/login", json={
+                "email": user["email"],
+                "password": user["password"]
+            }).status_code
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            logins = [pool.submit(login) for _ in range(8)]
+            assert requests.get(f"{BASE_URL}/api/").status_code == 200
+            assert [future.result() for future in logins] == [200] * 8
+
+    def test_wrong_password_rejected(self):
+        """Test verification still rejects a wrong password"""
+        user = {
+            "username": f"TEST_hash_{uuid.uuid4().hex[:8]}",
+            "email": f"TEST_hash_{uuid.uuid4().hex[:8]}@fictionverse.io",
+            "password": "testpassword123"
+        }
+        requests.post(f"{BASE_URL}/api/auth/signup", json=user)
+        response = requests.post(f"{BASE_URL}/api/auth/login", json={
+            "email": user["email"],
+            "password": "not-the-password"
+        })
+        assert response.status_code == 401
+
+
+
+class TestReadCache:
+    """Cached reads are invalidated by writes"""
+
+    def test_new_character_visible_after_cached_read(self):
+        """Test creating a character invalidates the cached character list"""
+        session = signed_in_session("TEST_cache")
+        universe_id = f"TEST_cache_{uuid.uuid4().hex[:8]}"
+        assert requests.get(f"{BASE_URL}/api/characters/{universe_id}").json()["items"] == []
+
+        response = session.post(f"{BASE_URL}/api/characters", json={
+            "universe_id": universe_id,
+            "name": "Cache Probe",
+            "description": "Created after the list was cached",
+            "role": "supporting"
+        })
+        assert response.status_code == 200
+
+        names = [c["name"] for c in requests.get(f"{BASE_URL}/api/characters/{universe_id}").json()["items"]]
+        assert names == ["Cache Probe"]
+
+    def test_edited_chapter_served_after_cached_read(self):
+        """Test updating a chapter invalidates its cached copy"""
+        session = signed_in_session("TEST_cache")
+        universe_id = f"TEST_cache_{uuid.uuid4().hex[:8]}"
+        chapter = {"universe_id": universe_id, "title": "Draft", "content": "first draft", "chapter_number": 1}
+        story_id = session.post(f"{BASE_URL}/api/stories", json=chapter).json()["_id"]
+        assert requests.get(f"{BASE_URL}/api/stories/{universe_id}/1").json()["content"] == "first draft"
+
+        chapter["content"] = "second draft"
+        assert session.put(f"{BASE_URL}/api/stories/{story_id}", json=chapter).status_code == 200
+        assert requests.get(f"{BASE_URL}/api/stories/{universe_id}/1").json()["content"] == "second draft"
+
+    def test_load_racing_a_write_is_not_cached(self):
+        """Test a value read before an invalidation isn't cached after it"""
+        from cache import MemoryCache
+
+        async def scenario():
+            cache = MemoryCache()
+            key, group = ("lore", "u", 50, None, None), ("lore", "u")
+            generation = await cache.generation(key)
+            # A write lands while the load is reading the database
+            await cache.delete(key)
+            await cache.set(key, {"items": ["old"]}, generation=generation)
+            assert await cache.get(key) is None
+
+            generation = await cache.generation(key)
+            await cache.invalidate_group(group)
+            await cache.set(key, {"items": ["old"]}, group=group, generation=generation)
+            assert await cache.get(key) is None
+            assert cache.stats()["stale_sets"] == 2
+
+            # Untouched since the generation was taken: cached as usual
+            generation = await cache.generation(key)
+            await cache.delete(("lore", "other", 50, None, None))
+            await cache.set(key, {"items": ["new"]}, group=group, generation=generation)
+            assert await cache.get(key) == {"items": ["new"]}
+
+        asyncio.run(scenario())
+
+
+
+class TestSharedCacheInvalidation:
+    """RedisCache near caches are invalidated across instances (fakeredis)"""
+
+    async def _wait_for(self, check, timeout=2.0):
+        deadline = time.monotonic() + timeout
+        while not await check():
+            assert time.monotonic() < deadline, "invalidation was not delivered"
+            await asyncio.sleep(0.01)
+
+    async def _two_workers(self):
+        fakeredis = pytest.importorskip("fakeredis")
+        from redis_cache import RedisCache
+        server = fakeredis.FakeServer()
+        workers = [RedisCache(fakeredis.FakeAsyncRedis(server=server), local_ttl=60) for _ in range(2)]
+        for worker in workers:
+            await worker.start()
+        # Let both subscribers attach before anything is published
+        await asyncio.sleep(0.1)
+        return workers
+
+    def test_delete_drops_other_workers_local_copy(self):
+        """Test one worker's invalidation clears another worker's near cache"""
+        async def scenario():
+            writer, reader = await self._two_workers()
+            key = ("chapter", "Neon Shadows", 1)
+            await writer.set(key, {"content": "old"})
+            assert await reader.get(key) == {"content": "old"}
+            assert key in reader.local._entries
+
+            await writer.delete(key)
+
+            async def dropped():
+                return key not in reader.local._entries
+            await self._wait_for(dropped)
+            assert await reader.get(key) is None
+            assert reader.stats()["broadcasts_received"] == 1
+            for worker in (writer, reader):
+                await worker.close()
+
+        asyncio.run(scenario())
+
+    def test_group_invalidation_reaches_other_workers(self):
+        """Test invalidating a group clears every page of it on other workers"""
+        async def scenario():
+            writer, reader = await self._two_workers()
+            group = ("lore", "Neon Shadows")
+            for cursor in (None, "page2"):
+                await writer.set(("lore", "Neon Shadows", 50, cursor, None), {"items": []}, group=group)
+                assert await reader.get(("lore", "Neon Shadows", 50, cursor, None)) == {"items": []}
+
+            await writer.invalidate_group(group)
+
+            async def dropped():
+                return not reader.local._entries
+            await self._wait_for(dropped)
+            assert await reader.get(("lore", "Neon Shadows", 50, None, None)) is None
+            for worker in (writer, reader):
+                await worker.close()
+
+        asyncio.run(scenario())
+
+    def test_load_racing_another_workers_write_is_not_cached(self):
+        """Test a load can't cache what a write on another worker invalidated meanwhile"""
+        async def scenario():
+            writer, reader = await self._two_workers()
+            key = ("chapter", "Neon Shadows", 1)
+            generation = await reader.generation(key)
+            await writer.delete(key)
+            await reader.set(key, {"content": "old"}, generation=generation)
+            assert await reader.get(key) is None
+            assert await writer.get(key) is None
+
+            generation = await reader.generation(key)
+            await reader.set(key, {"content": "new"}, generation=generation)
+            assert await writer.get(key) == {"content": "new"}
+            for worker in (writer, reader):
+                await worker.close()
+
+        asyncio.run(scenario())
+
+
+
+class TestConditionalGet:
+    """ETag / Last-Modified revalidation on single-document reads"""
+
+    def test_chapter_not_modified(self):
+        """Test a chapter re-request with its ETag returns 304 and no body"""
+        response = requests.get(f"{BASE_URL}/api/stories/Neon%20Shadows/1")
+        assert response.status_code == 200
+        etag = response.headers["ETag"]
+        assert "Last-Modified" in response.headers
+
+        revalidated = requests.get(f"{BASE_URL}/api/stories/Neon%20Shadows/1", headers={"If-None-Match": etag})
+        assert revalidated.status_code == 304
+        assert revalidated.content == b""
+        assert revalidated.headers["ETag"] == etag
+
+    def test_universe_not_modified(self):
+        """Test a universe re-request with its ETag returns 304"""
+        etag = requests.get(f"{BASE_URL}/api/universes/Neon%20Shadows").headers["ETag"]
+        response = requests.get(f"{BASE_URL}/api/universes/Neon%20Shadows", headers={"If-None-Match": etag})
+        assert response.status_code == 304
+
+    def test_edit_changes_etag(self):
+        """Test an edited chapter no longer matches its old ETag"""
+        session = signed_in_session("TEST_etag")
+        universe_id = f"TEST_etag_{uuid.uuid4().hex[:8]}"
+        chapter = {"universe_id": universe_id, "title": "Draft", "content": "first draft", "chapter_number": 1}
+        story_id = session.post(f"{BASE_URL}/api/stories", json=chapter).json()["_id"]
+        etag = requests.get(f"{BASE_URL}/api/stories/{universe_id}/1").headers["ETag"]
+
+        chapter["content"] = "second draft"
+        session.put(f"{BASE_URL}/api/stories/{story_id}", json=chapter)
+        response = requests.get(f"{BASE_URL}/api/stories/{universe_id}/1", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["ETag"] != etag
+        assert response.json()["content"] == "second draft"
+
+    def test_handler_headers_survive_revalidation(self):
+        """Test headers the route sets are also sent on a 304"""
+        first = requests.get(f"{BASE_URL}/api/universes/Neon%20Shadows/overview")
+        response = requests.get(f"{BASE_URL}/api/universes/Neon%20Shadows/overview", headers={"If-None-Match": first.headers["ETag"]})
+        assert response.status_code == 304
+        assert response.headers["X-Overview-Version"] == first.headers["X-Overview-Version"]
+        assert response.headers["ETag"] == first.headers["ETag"]
+        assert "Content-Type" not in response.headers and response.content == b""
+
+
+
+class TestTableOfContents:
+    """Chapter table of contents and fields= projection"""
+
+    def test_toc_has_no_bodies(self):
+        """Test the TOC lists chapters in order without their text"""
+        response = requests.get(f"{BASE_URL}/api/stories/Neon%20Shadows/toc")
+        assert response.status_code == 200
+        items = response.json()["items"]
+        assert len(items) >= 2
+        assert [c["chapter_number"] for c in items] == sorted(c["chapter_number"] for c in items)
+        for chapter in items:
+            assert "content" not in chapter
+            assert set(chapter) <= {"title", "chapter_number", "status", "word_count", "created_at"}
+
+    def test_fields_projection(self):
+        """Test fields= returns only the requested fields"""
+        response = requests.get(f"{BASE_URL}/api/stories/Neon%20Shadows", params={"fields": "title,chapter_number"})
+        assert response.status_code == 200
+        for chapter in response.json()["items"]:
+            assert set(chapter) == {"title", "chapter_number"}
+
+    def test_unknown_field_rejected(self):
+        """Test fields= with an unknown name returns 400"""
+        response = requests.get(f"{BASE_URL}/api/characters/Neon%20Shadows", params={"fields": "name,password"})
+        assert response.status_code == 400
+
+    def test_long_toc_is_paged(self):
+        """Test a TOC longer than one page is complete when following next_cursor"""
+        session = signed_in_session("TEST_toc")
+        universe_id = f"TEST_toc_{uuid.uuid4().hex[:8]}"
+        for number in range(1, 56):
+            session.post(f"{BASE_URL}/api/stories", json={
+                "universe_id": universe_id, "title": f"Chapter {number}", "content": "Text", "chapter_number": number
+            })
+
+        first = requests.get(f"{BASE_URL}/api/stories/{universe_id}/toc").json()
+        assert len(first["items"]) == 50
+        assert first["next_cursor"] is not None
+        rest = requests.get(f"{BASE_URL}/api/stories/{universe_id}/toc", params={"cursor": first["next_cursor"]}).json()
+        assert rest["next_cursor"] is None
+        assert [c["chapter_number"] for c in first["items"] + rest["items"]] == list(range(1, 56))
+
+
+
+class TestUniverseGrouping:
+    """Server-side universe buckets, totals and genre counts"""
+
+    def test_buckets_hold_their_type(self):
+        """Test each bucket only holds universes of its type"""
+        data = requests.get(f"{BASE_URL}/api/universes").json()
+        assert all(u["type"] == "Original" for u in data["original"])
+        assert all(u["type"] == "Inspired" for u in data["inspired"])
+
+    def test_counts_match_paged_buckets(self):
+        """Test walking the cursor visits exactly `counts` universes per bucket"""
+        first = requests.get(f"{BASE_URL}/api/universes", params={"limit": 1}).json()
+        seen = {"original": [], "inspired": []}
+        data = first
+        for _ in range(200):
+            for bucket in seen:
+                seen[bucket].extend(u["title"] for u in data[bucket])
+            if data["next_cursor"] is None:
+                break
+            data = requests.get(f"{BASE_URL}/api/universes", params={"limit": 1, "cursor": data["next_cursor"]}).json()
+        assert data["next_cursor"] is None
+        for bucket, titles in seen.items():
+            assert len(titles) == len(set(titles))
+            assert len(titles) == first["counts"][bucket]
+
+    def test_genre_counts(self):
+        """Test genre_counts covers every genre, most common first"""
+        data = requests.get(f"{BASE_URL}/api/universes/filter/Cyberpunk").json()
+        counts = data["genre_counts"]
+        assert counts["Cyberpunk"] == len(data["items"])
+        assert list(counts.values()) == sorted(counts.values(), reverse=True)
+
+
+
+class TestSearch:
+    """Full-text search endpoint tests"""
+
+    def test_search_finds_new_character(self):
+        """Test a newly created character is searchable right away"""
+        session = signed_in_session("TEST_search")
+        term = f"zq{uuid.uuid4().hex[:10]}"
+        session.post(f"{BASE_URL}/api/characters", json={
+            "universe_id": "Neon Shadows",
+            "name": f"Searchable {term}",
+            "description": "A character created by the search test",
+            "role": "supporting"
+        })
+        response = requests.get(f"{BASE_URL}/api/search", params={"q": term})
+        assert response.status_code == 200
+        data = response.json()
+        assert data["total"] == 1
+        assert data["results"][0]["type"] == "character"
+        assert data["results"][0]["universe_id"] == "Neon Shadows"
+
+    def test_search_reflects_chapter_edit(self):
+        """Test an edited chapter is found by its new text and not its old text"""
+        session = signed_in_session("TEST_search")
+        old_term, new_term = f"zq{uuid.uuid4().hex[:10]}", f"zq{uuid.uuid4().hex[:10]}"
+        universe_id = f"TEST_search_{uuid.uuid4().hex[:8]}"
+        chapter = {"universe_id": universe_id, "title": "Searchable", "content": f"before {old_term}", "chapter_number": 1}
+        story_id = session.post(f"{BASE_URL}/api/stories", json=chapter).json()["_id"]
+        assert requests.get(f"{BASE_URL}/api/search", params={"q": old_term}).json()["total"] == 1
+
+        chapter["content"] = f"after {new_term}"
+        session.put(f"{BASE_URL}/api/stories/{story_id}", json=chapter)
+        assert requests.get(f"{BASE_URL}/api/search", params={"q": old_term}).json()["total"] == 0
+        results = requests.get(f"{BASE_URL}/api/search", params={"q": new_term}).json()["results"]
+        assert [r["id"] for r in results] == [story_id]
+        assert "<mark>" in results[0]["snippet"]
+
+    def test_search_type_and_universe_filters(self):
+        """Test type and universe filters narrow the results"""
+        response = requests.get(f"{BASE_URL}/api/search", params={"q": "neon", "types": "universe", "universe_id": "Neon Shadows"})
+        assert response.status_code == 200
+        for result in response.json()["results"]:
+            assert result["type"] == "universe"
+            assert result["universe_id"] == "Neon Shadows"
+
+    def test_search_unknown_type(self):
+        """Test an unknown type filter returns 400"""
+        response = requests.get(f"{BASE_URL}/api/search", params={"q": "neon", "types": "spaceship"})
+        assert response.status_code == 400
+
+    def test_snippet_escapes_before_marking(self):
+        """Test terms that look like entity names don't break escaped text"""
+        session = signed_in_session("TEST_search")
+        term = f"zq{uuid.uuid4().hex[:10]}"
+        universe_id = f"TEST_search_{uuid.uuid4().hex[:8]}"
+        session.post(f"{BASE_URL}/api/stories", json={
+            "universe_id": universe_id, "title": "Escapes", "content": f'Tom & "Jerry" <b>{term}</b> amp quot', "chapter_number": 1
+        })
+        results = requests.get(f"{BASE_URL}/api/search", params={"q": f"{term} amp quot", "universe_id": universe_id}).json()["results"]
+        snippet = results[0]["snippet"]
+        assert snippet.startswith('Tom &amp; &quot;Jerry&quot; &lt;b&gt;')
+        assert f"<mark>{term}</mark>&lt;/b&gt; <mark>amp</mark> <mark>quot</mark>" in snippet
+        assert "&<mark>" not in snippet
+
+
+
+class TestChapterBodies:
+    """Chapter text stored compressed outside the stories collection"""
+
+    def test_long_chapter_round_trip(self):
+        """Test a large chapter comes back byte-for-byte with its word count"""
+        session = signed_in_session("TEST_body")
+        universe_id = f"TEST_body_{uuid.uuid4().hex[:8]}"
+        content = "\n\n".join(f"Paragraph {i}: the neon rain fell on Ālvarez — again. 雨" for i in range(3000))
+        response = session.post(f"{BASE_URL}/api/stories", json={
+            "universe_id": universe_id, "title": "Long", "content": content, "chapter_number": 1
+        })
+        assert response.status_code == 200
+
+        chapter = requests.get(f"{BASE_URL}/api/stories/{universe_id}/1").json()
+        assert chapter["content"] == content
+        toc = requests.get(f"{BASE_URL}/api/stories/{universe_id}/toc").json()["items"]
+        assert toc[0]["word_count"] == len(content.split())
+
+    @pytest.mark.skipif(not ADMIN_USER["email"], reason="TEST_ADMIN_EMAIL not set")
+    def test_long_bodies_compressed_off_the_event_loop(self):
+        """Test saving and reading a long chapter goes through the thread pool"""
+        before = admin_session().get(f"{BASE_URL}/api/admin/stats").json()["chapter_bodies"]["offloaded"]
+        session = signed_in_session("TEST_body")
+        universe_id = f"TEST_body_{uuid.uuid4().hex[:8]}"
+        session.post(f"{BASE_URL}/api/stories", json={
+            "universe_id": universe_id, "title": "Long", "content": "word " * 40000, "chapter_number": 1
+        })
+        assert requests.get(f"{BASE_URL}/api/stories/{universe_id}/1").status_code == 200
+        after = admin_session().get(f"{BASE_URL}/api/admin/stats").json()["chapter_bodies"]["offloaded"]
+        assert after - before == 2
+
+    @pytest.mark.parametrize("codec", ["zlib", "zstd", "brotli"])
+    def test_codecs_round_trip(self, codec):
+        """Test every supported codec restores the text exactly"""
+        import chapter_bodies
+        if chapter_bodies.available_codec(codec) != codec:
+            pytest.skip(f"{codec} is not installed")
+        text = "Ālvarez — neon rain, 雨. " * 2000
+        data = chapter_bodies.compress(text, codec)
+        assert len(data) < len(text.encode("utf-8"))
+        assert chapter_bodies.decompress(data, codec) == text
+
+    def test_list_omits_bodies(self):
+        """Test chapter lists never carry chapter text"""
+        response = requests.get(f"{BASE_URL}/api/stories/Neon%20Shadows")
+        for chapter in response.json()["items"]:
+            assert "content" not in chapter
+
+
+class TestTokenVerification:
+    """JWT verification cache and session revocation"""
+
+    def test_authenticated_request(self):
+        """Test a signed-in session reaches a protected route"""
+        session = signed_in_session("TEST_jwt")
+        response = session.get(f"{BASE_URL}/api/profile")
+        assert response.status_code == 200
+        assert response.json()["role"] == "traveler"
+
+    def test_tampered_token_rejected(self):
+        """Test a token with a modified signature is rejected"""
+        session = signed_in_session("TEST_jwt")
+        token = session.cookies["fv_token"]
+        response = requests.get(f"{BASE_URL}/api/profile", cookies={"fv_token": token[:-2] + ("AA" if not token.endswith("AA") else "BB")})
+        assert response.status_code == 401
+
+    def test_logout_all_revokes_existing_tokens(self):
+        """Test logout-all invalidates tokens issued before it, even recently verified ones"""
+        session = signed_in_session("TEST_jwt")
+        token = session.cookies["fv_token"]
+        assert requests.get(f"{BASE_URL}/api/profile", cookies={"fv_token": token}).status_code == 200
+
+        assert session.post(f"{BASE_URL}/api/auth/logout-all").status_code == 200
+        response = requests.get(f"{BASE_URL}/api/profile", cookies={"fv_token": token})
+        assert response.status_code == 401
+
+
+class TestForumThreads:
+    """Forum thread read model with embedded first page and paged replies"""
+
+    def _post(self, session):
+        response = session.post(f"{BASE_URL}/api/forum/posts", json={
+            "title": "TEST thread", "content": "Thread body", "category": "general"
+        })
+        assert response.status_code == 200
+        return response.json()["_id"]
+
+    def test_thread_pages_through_all_replies(self):
+        """Test the thread embeds the first 20 replies and the cursor pages the rest"""
+        session = signed_in_session("TEST_thread")
+        post_id = self._post(session)
+        for i in range(25):
+            response = session.post(f"{BASE_URL}/api/forum/replies", json={"post_id": post_id, "content": f"reply {i}"})
+            assert response.status_code == 200
+
+        thread = requests.get(f"{BASE_URL}/api/forum/posts/{post_id}").json()
+        assert thread["replies_count"] == 25
+        assert [r["content"] for r in thread["replies"]] == [f"reply {i}" for i in range(20)]
+        assert thread["replies_next_cursor"] is not None
+
+        rest = requests.get(f"{BASE_URL}/api/forum/posts/{post_id}/replies", params={"cursor": thread["replies_next_cursor"]}).json()
+        assert [r["content"] for r in rest["items"]] == [f"reply {i}" for i in range(20, 25)]
+        assert rest["next_cursor"] is None
+
+    def test_exactly_one_page_has_no_cursor(self):
+        """Test a thread with exactly 20 replies doesn't point at an empty second page"""
+        session = signed_in_session("TEST_thread")
+        post_id = self._post(session)
+        for i in range(20):
+            session.post(f"{BASE_URL}/api/forum/replies", json={"post_id": post_id, "content": f"reply {i}"})
+
+        thread = requests.get(f"{BASE_URL}/api/forum/posts/{post_id}").json()
+        assert len(thread["replies"]) == 20
+        assert thread["replies_next_cursor"] is None
+
+        session.post(f"{BASE_URL}/api/forum/replies", json={"post_id": post_id, "content": "reply 20"})
+        thread = requests.get(f"{BASE_URL}/api/forum/posts/{post_id}").json()
+        assert thread["replies_next_cursor"] is not None
+
+    def test_reply_to_missing_post(self):
+        """Test replying to a missing post returns 404 and stores nothing"""
+        session = signed_in_session("TEST_thread")
+        missing = "0123456789abcdef01234567"
+        response = session.post(f"{BASE_URL}/api/forum/replies", json={"post_id": missing, "content": "orphan"})
+        assert response.status_code == 404
+        assert requests.get(f"{BASE_URL}/api/forum/posts/{missing}/replies").json()["items"] == []
+
+    def test_post_list_omits_embedded_replies(self):
+        """Test the post list does not carry the embedded reply page"""
+        session = signed_in_session("TEST_thread")
+        self._post(session)
+        for post in requests.get(f"{BASE_URL}/api/forum/posts").json()["items"]:
+            assert "first_replies" not in post
+
+
+
+class TestRealtime:
+    """WebSocket push channel for replies and chapters"""
+
+    def _connect(self, query):
+        client = pytest.importorskip("websockets.sync.client")
+        ws_url = BASE_URL.replace("https://", "wss://").replace("http://", "ws://")
+        return client.connect(f"{ws_url}/api/realtime?{query}", open_timeout=5)
+
+    def test_reply_pushed_to_thread_subscribers(self):
+        """Test a new reply is pushed to connections watching its thread"""
+        session = signed_in_session("TEST_realtime")
+        post_id = session.post(f"{BASE_URL}/api/forum/posts", json={
+            "title": "TEST live thread", "content": "Body", "category": "general"
+        }).json()["_id"]
+
+        with self._connect(f"thread={post_id}") as websocket:
+            session.post(f"{BASE_URL}/api/forum/replies", json={"post_id": post_id, "content": "live reply"})
+            event = json.loads(websocket.recv(timeout=5))
+        assert event["type"] == "forum_reply_created"
+        assert event["channel"] == f"thread:{post_id}"
+        assert event["data"]["content"] == "live reply"
+
+    def test_chapter_pushed_after_subscribe_message(self):
+        """Test subscribing by message delivers new chapters for that universe"""
+        session = signed_in_session("TEST_realtime")
+        universe_id = f"TEST_live_{uuid.uuid4().hex[:8]}"
+        with self._connect("forum=false") as websocket:
+            websocket.send(json.dumps({"action": "subscribe", "channel": f"universe:{universe_id}"}))
+            # The subscribe message is handled asynchronously; give it a moment to land
+            time.sleep(0.2)
+            session.post(f"{BASE_URL}/api/stories", json={
+                "universe_id": universe_id, "title": "Live", "content": "text", "chapter_number": 1
+            })
+            event = json.loads(websocket.recv(timeout=5))
+        assert event["type"] == "story_created"
+        assert event["data"]["universe_id"] == universe_id
+
+    def test_invalid_channel(self):
+        """Test subscribing to an unknown channel returns an error frame"""
+        with self._connect("forum=true") as websocket:
+            websocket.send(json.dumps({"action": "subscribe", "channel": "admin:all"}))
+            event = json.loads(websocket.recv(timeout=5))
+        assert event == {"type": "error", "detail": "Invalid channel"}
+
+
+
+class TestUniverseArchive:
+    """Streaming NDJSON import and export of whole universes"""
+
+    def _archive(self, title):
+        lines = [{"kind": "universe", "data": {"title": title, "description": "Imported", "type": "Original", "genre": "Fantasy"}}]
+        lines += [{"kind": "chapter", "data": {"universe_id": title, "title": f"Chapter {n}", "content": f"Text of chapter {n}", "chapter_number": n}} for n in (1, 2)]
+        lines.append({"kind": "character", "data": {"universe_id": title, "name": "Archivist", "description": "Keeps records", "role": "supporting"}})
+        lines.append({"kind": "lore", "data": {"universe_id": title, "title": "The Archive", "content": "Everything is kept", "category": "culture"}})
+        return "".join(json.dumps(line) + "\n" for line in lines)
+
+    def test_import_then_export(self):
+        """Test an imported archive is served by the API and exported back"""
+        session = signed_in_session("TEST_archive")
+        title = f"TEST_archive_{uuid.uuid4().hex[:8]}"
+        response = session.post(f"{BASE_URL}/api/universes/import", data=self._archive(title), headers={"Content-Type": "application/x-ndjson"})
+        assert response.status_code == 200
+        result = response.json()
+        assert result["universe"] == title
+        assert result["imported"] == {"chapter": 2, "character": 1, "lore": 1}
+        assert requests.get(f"{BASE_URL}/api/stories/{title}/2").json()["content"] == "Text of chapter 2"
+
+        export = session.get(f"{BASE_URL}/api/universes/{title}/export")
+        assert export.status_code == 200
+        assert export.headers["Content-Type"].startswith("application/x-ndjson")
+        lines = [json.loads(line) for line in export.text.splitlines()]
+        assert [line["kind"] for line in lines] == ["universe", "chapter", "chapter", "character", "lore"]
+        assert lines[1]["data"]["content"] == "Text of chapter 1"
+
+    def test_reimport_is_idempotent(self):
+        """Test importing the same archive twice updates in place"""
+        session = signed_in_session("TEST_archive")
+        title = f"TEST_archive_{uuid.uuid4().hex[:8]}"
+        for _ in range(2):
+            assert session.post(f"{BASE_URL}/api/universes/import", data=self._archive(title)).status_code == 200
+        assert len(requests.get(f"{BASE_URL}/api/stories/{title}").json()["items"]) == 2
+        assert len(requests.get(f"{BASE_URL}/api/characters/{title}").json()["items"]) == 1
+
+    def test_invalid_lines_reported(self):
+        """Test malformed lines are reported without failing the import"""
+        session = signed_in_session("TEST_archive")
+        title = f"TEST_archive_{uuid.uuid4().hex[:8]}"
+        archive = self._archive(title) + "not json\n" + json.dumps({"kind": "chapter", "data": {"title": "No number"}}) + "\n"
+        result = session.post(f"{BASE_URL}/api/universes/import", data=archive).json()
+        assert result["error_count"] == 2
+        assert result["imported"]["chapter"] == 2
+
+    def test_reimport_replaces_chapter_bodies(self):
+        """Test a re-import serves the new body alongside the new metadata"""
+        session = signed_in_session("TEST_archive")
+        title = f"TEST_archive_{uuid.uuid4().hex[:8]}"
+        archive = self._archive(title)
+        assert session.post(f"{BASE_URL}/api/universes/import", data=archive).status_code == 200
+        revised = archive.replace("Text of chapter 2", "Revised text of chapter two")
+        assert session.post(f"{BASE_URL}/api/universes/import", data=revised).status_code == 200
+        chapter = requests.get(f"{BASE_URL}/api/stories/{title}/2").json()
+        assert chapter["content"] == "Revised text of chapter two"
+        assert chapter["word_count"] == 5
+
+    def test_lines_split_across_chunks(self):
+        """Test lines arriving in many small chunks are reassembled, and overlong ones rejected"""
+        from fastapi import HTTPException
+        from universe_archive import iter_lines
+
+        async def chunks(data, size):
+            for start in range(0, len(data), size):
+                yield data[start:start + size]
+
+        async def collect(data, size, max_line_bytes=1000):
+            return [pair async for pair in iter_lines(chunks(data, size), max_line_bytes)]
+
+        data = b"first line\n" + b"x" * 500 + b"\n\nlast"
+        assert asyncio.run(collect(data, 7)) == [(1, b"first line"), (2, b"x" * 500), (3, b""), (4, b"last")]
+        assert asyncio.run(collect(data, len(data))) == asyncio.run(collect(data, 1))
+        with pytest.raises(HTTPException) as error:
+            asyncio.run(collect(b"ok\n" + b"y" * 2000, 64))
+        assert error.value.status_code == 413
+        assert "Line 2" in error.value.detail
+
+    def test_export_requires_author(self):
+        """Test only the universe's author can export it"""
+        response = signed_in_session("TEST_archive").get(f"{BASE_URL}/api/universes/Neon%20Shadows/export")
+        assert response.status_code == 403
+
+
+
+class TestLoadBenchmark:
+    """Load driver and regression comparison used by benchmarks/api_benchmark.py"""
+
+    def test_drive_reports_latency_percentiles(self):
+        """Test the load driver runs every request against the API and reports percentiles"""
+        httpx = pytest.importorskip("httpx")
+        from benchmarks.api_benchmark import drive
+
+        async def scenario():
+            async with httpx.AsyncClient(base_url=BASE_URL) as client:
+                return await drive(client, "GET", lambda: "/api/universes/Neon%20Shadows", None, total=40, concurrency=8)
+
+        result = asyncio.run(scenario())
+        assert result["requests"] == 40
+        assert result["errors"] == 0
+        assert result["rps"] > 0
+        assert 0 < result["p50_ms"] <= result["p95_ms"] <= result["p99_ms"]
+
+    def test_compare_flags_only_real_regressions(self):
+        """Test p95 growth past the threshold is flagged, sub-millisecond jitter is not"""
+        from benchmarks.api_benchmark import compare
+        baseline = {
+            "slower": {"p95_ms": 10.0, "rps": 100.0},
+            "jitter": {"p95_ms": 0.5, "rps": 100.0},
+            "faster": {"p95_ms": 10.0, "rps": 100.0},
+        }
+        results = {
+            "slower": {"p95_ms": 15.0, "rps": 80.0},
+            "jitter": {"p95_ms": 0.9, "rps": 100.0},
+            "faster": {"p95_ms": 5.0, "rps": 150.0},
+            "new endpoint": {"p95_ms": 50.0, "rps": 10.0},
+        }
+        assert compare(results, baseline, threshold=0.2) == ["slower"]
+
+    def test_refuses_to_drop_other_databases(self):
+        """Test the benchmark only drops databases carrying the benchmark prefix unless forced"""
+        from argparse import Namespace
+        from benchmarks.api_benchmark import check_database
+        with pytest.raises(SystemExit):
+            check_database(Namespace(mongo="local", db="fictionverse", force=False))
+        check_database(Namespace(mongo="local", db="fictionverse_bench_ci", force=False))
+        check_database(Namespace(mongo="local", db="fictionverse", force=True))
+        check_database(Namespace(mongo="mock", db="fictionverse", force=False))
+
+
+
+class TestRequestMetrics:
+    """Per-route latency, DB time and payload size on /metrics"""
+
+    def _sample(self, text, name, labels):
+        for line in text.splitlines():
+            if line.startswith(name + "{") and all(f'{k}="{v}"' in line for k, v in labels.items()):
+                return float(line.rsplit(" ", 1)[1])
+        return 0.0
+
+    def test_requests_counted_per_route_template(self):
+        """Test requests are counted under the route template, with DB and size histograms"""
+        labels = {"method": "GET", "route": "/api/lore/{universe_id}"}
+        before = requests.get(f"{BASE_URL}/metrics").text
+        for universe_id in ("Neon%20Shadows", f"TEST_metrics_{uuid.uuid4().hex[:8]}"):
+            assert requests.get(f"{BASE_URL}/api/lore/{universe_id}").status_code == 200
+        response = requests.get(f"{BASE_URL}/metrics")
+        assert response.status_code == 200
+        assert response.headers["Content-Type"].startswith("text/plain")
+        after = response.text
+
+        count = "fv_request_duration_seconds_count"
+        assert self._sample(after, count, labels) - self._sample(before, count, labels) >= 2
+        assert self._sample(after, "fv_responses_total", {**labels, "status": "200"}) >= 2
+        assert self._sample(after, "fv_request_db_calls_count", labels) >= 2
+        assert self._sample(after, "fv_response_bytes_sum", labels) > 0
+        assert "TEST_metrics_" not in after
+
+
+
+class TestJSONResponses:
+    """orjson response rendering"""
+
+    def test_headers_and_cookies_carried_over(self):
+        """Test headers and cookies set by a handler survive the fast JSON path"""
+        response = requests.post(f"{BASE_URL}/api/auth/signup", json={
+            "username": f"TEST_json_{uuid.uuid4().hex[:8]}",
+            "email": f"TEST_json_{uuid.uuid4().hex[:8]}@fictionverse.io",
+            "password": "testpassword123"
+        })
+        assert response.status_code == 200
+        assert response.headers["Content-Type"] == "application/json"
+        assert "fv_token" in response.cookies
+
+    def test_created_document_serialized(self):
+        """Test ObjectIds, timestamps and non-ASCII text render as plain JSON"""
+        session = signed_in_session("TEST_json")
+        response = session.post(f"{BASE_URL}/api/lore", json={
+            "universe_id": f"TEST_json_{uuid.uuid4().hex[:8]}",
+            "title": "Ōkami lore — 狼",
+            "content": "Emoji 🐺 and accents: é à ü",
+            "category": "culture"
+        })
+        assert response.status_code == 200
+        assert "狼".encode("utf-8") in response.content
+        data = response.json()
+        assert isinstance(data["_id"], str) and len(data["_id"]) == 24
+        assert data["created_at"].startswith("20")
+        assert data["content"] == "Emoji 🐺 and accents: é à ü"
+
+    def test_errors_stay_json(self):
+        """Test error responses keep FastAPI's {"detail": ...} body"""
+        response = requests.get(f"{BASE_URL}/api/stories/Neon%20Shadows/999")
+        assert response.status_code == 404
+        assert response.json() == {"detail": "Chapter not found"}
+
+
+
+class TestCounterWriteBehind:
+    """Write-behind aggregation of thread counters"""
+
+    def test_concurrent_replies_counted_exactly(self):
+        """Test replies past the embedded page are counted right away and once flushed"""
+        session = signed_in_session("TEST_counter")
+        title = f"TEST hot thread {uuid.uuid4().hex[:8]}"
+        post_id = session.post(f"{BASE_URL}/api/forum/posts", json={
+            "title": title, "content": "Body", "category": "general"
+        }).json()["_id"]
+
+        def reply(i):
+            return session.post(f"{BASE_URL}/api/forum/replies", json={"post_id": post_id, "content": f"reply {i}"}).json()
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            replies = list(pool.map(reply, range(26)))
+        latest = max(r["created_at"] for r in replies)
+
+        # Pending increments are overlaid on the thread read
+        thread = requests.get(f"{BASE_URL}/api/forum/posts/{post_id}").json()
+        assert thread["replies_count"] == 26
+        assert thread["last_activity_at"] == latest
+
+        # The post list reads the stored document, which catches up once flushed
+        stored = None
+        for _ in range(50):
+            posts = requests.get(f"{BASE_URL}/api/forum/posts", params={"limit": 200}).json()["items"]
+            stored = next((p for p in posts if p["title"] == title), None)
+            if stored and stored["replies_count"] == 26:
+                break
+            time.sleep(0.1)
+        assert stored is not None
+        assert stored["replies_count"] == 26
+        assert stored["last_activity_at"] == latest
+
+    def test_batch_visible_until_write_acknowledged(self):
+        """Test a read during a flush still sees the batch being written"""
+        from counters import CounterAggregator
+
+        class SlowCollection:
+            def __init__(self):
+                self.started, self.release = asyncio.Event(), asyncio.Event()
+
+            async def bulk_write(self, operations, ordered=True):
+                self.started.set()
+                await self.release.wait()
+
+        async def scenario():
+            collection = SlowCollection()
+            counters = CounterAggregator({"forum_posts": collection})
+            counters.increment("forum_posts", "p1", "replies_count", 3)
+            flush = asyncio.create_task(counters.flush())
+            await collection.started.wait()
+            counters.increment("forum_posts", "p1", "replies_count", 1)
+            during = counters.overlay("forum_posts", "p1", {"replies_count": 10})["replies_count"]
+            collection.release.set()
+            await flush
+            after = counters.overlay("forum_posts", "p1", {"replies_count": 13})["replies_count"]
+            return during, after
+
+        assert asyncio.run(scenario()) == (14, 14)
+
+
+
+class TestReadingProgress:
+    """Reading progress and bookmarks"""
+
+    def test_progress_merges_chapters_read(self):
+        """Test scroll updates keep the latest position and every chapter read"""
+        session = signed_in_session("TEST_progress")
+        universe_id = f"TEST.progress ${uuid.uuid4().hex[:6]}"
+        for chapter, position in ((1, 0.95), (3, 1.0), (2, 0.4)):
+            response = session.put(f"{BASE_URL}/api/progress/{universe_id}", json={"chapter_number": chapter, "position": position})
+            assert response.status_code == 200
+
+        progress = session.get(f"{BASE_URL}/api/progress/{universe_id}").json()
+        assert progress["universe_id"] == universe_id
+        assert progress["last_chapter"] == 2
+        assert progress["position"] == 0.4
+        assert progress["read"] == [1, 3]
+
+        # Still the same once the write-behind flush has stored it
+        time.sleep(1.5)
+        assert session.get(f"{BASE_URL}/api/progress/{universe_id}").json()["read"] == [1, 3]
+        summary = session.get(f"{BASE_URL}/api/progress").json()
+        assert [u["chapters_read"] for u in summary["universes"]] == [2]
+
+    def test_bookmarks(self):
+        """Test adding, listing and removing a bookmark"""
+        session = signed_in_session("TEST_progress")
+        response = session.post(f"{BASE_URL}/api/bookmarks", json={"universe_id": "Neon Shadows", "chapter_number": 2})
+        assert response.status_code == 200
+        bookmarks = session.get(f"{BASE_URL}/api/progress").json()["bookmarks"]
+        assert [(b["universe_id"], b["chapter_number"]) for b in bookmarks] == [("Neon Shadows", 2)]
+
+        assert session.delete(f"{BASE_URL}/api/bookmarks/Neon%20Shadows/2").status_code == 200
+        assert session.delete(f"{BASE_URL}/api/bookmarks/Neon%20Shadows/2").status_code == 404
+        assert session.get(f"{BASE_URL}/api/progress").json()["bookmarks"] == []
+
+    def test_progress_validation(self):
+        """Test out-of-range positions are rejected"""
+        session = signed_in_session("TEST_progress")
+        response = session.put(f"{BASE_URL}/api/progress/Neon%20Shadows", json={"chapter_number": 1, "position": 1.5})
+        assert response.status_code == 422
+
+
+
+class TestReadiness:
+    """Readiness probe and MongoDB connection pool gauges"""
+
+    def test_ready(self):
+        """Test the probe passes and reports the pool it checked"""
+        response = requests.get(f"{BASE_URL}/api/ready")
+        assert response.status_code == 200
+        data = response.json()
+        assert data["ready"] is True
+        assert data["reasons"] == []
+        assert data["pool"]["max_pool_size"] > 0
+        assert isinstance(data["warmup_pending"], list)
+
+    def test_pool_gauges_in_metrics(self):
+        """Test /metrics exposes the pool gauges"""
+        body = requests.get(f"{BASE_URL}/metrics").text
+        for name in ("fv_mongo_pool_open", "fv_mongo_pool_in_use", "fv_mongo_pool_waiting", "fv_mongo_pool_utilization"):
+            assert f"# TYPE {name} gauge" in body
+        assert "fv_mongo_pool_checkout_failures_total " in body
+
+    def test_saturated_pool_is_unready(self):
+        """Test a full pool with queued operations fails readiness"""
+        from types import SimpleNamespace
+        from mongo_pool import PoolMonitor, Readiness
+
+        class Admin:
+            async def command(self, name):
+                return {"ok": 1}
+
+        monitor = PoolMonitor()
+        event = SimpleNamespace(address=("db", 27017))
+        for _ in range(2):
+            monitor.connection_created(event)
+            monitor.connection_check_out_started(event)
+            monitor.connection_checked_out(event)
+        monitor.connection_check_out_started(event)
+
+        readiness = Readiness(SimpleNamespace(admin=Admin()), monitor, max_pool_size=2)
+        status = asyncio.run(readiness.check())
+        assert status["ready"] is False
+        assert status["reasons"] == ["connection pool to db:27017 saturated"]
+        assert status["pool"]["servers"]["db:27017"] == {"open": 2, "in_use": 2, "waiting": 1, "utilization": 1.0}
+
+        # The queued operation gets a connection: busy but nothing waiting
+        monitor.connection_checked_in(event)
+        monitor.connection_checked_out(event)
+        assert asyncio.run(readiness.check())["ready"] is True
+
+
+
+class TestSampleData:
+    """Sample content seeded once, however many workers start"""
+
+    def test_sample_universes_seeded_once(self):
+        """Test every sample universe exists exactly once"""
+        data = requests.get(f"{BASE_URL}/api/universes", params={"limit": 200}).json()
+        titles = [u["title"] for u in data["original"] + data["inspired"]]
+        for title in ("Chronicles of Aether", "Neon Shadows", "The Last Garden", "Wizards United",
+                      "Middle Earth: The Fourth Age", "Starfleet Academy Chronicles"):
+            assert titles.count(title) == 1
+
+    def test_neon_shadows_content(self):
+        """Test the sample chapters, characters and lore are present once each"""
+        toc = requests.get(f"{BASE_URL}/api/stories/Neon%20Shadows/toc").json()["items"]
+        assert [c["chapter_number"] for c in toc] == [1, 2]
+        assert all(c["word_count"] > 0 for c in toc)
+        assert requests.get(f"{BASE_URL}/api/stories/Neon%20Shadows/1").json()["content"]
+
+        # Other tests add their own entries to Neon Shadows
+        names = [c["name"] for c in requests.get(f"{BASE_URL}/api/characters/Neon%20Shadows", params={"limit": 200}).json()["items"]]
+        assert names.count("Jax Rivera") == names.count("Kira 'Ghost Protocol' Chen") == 1
+        lore = [entry["title"] for entry in requests.get(f"{BASE_URL}/api/lore/Neon%20Shadows", params={"limit": 200}).json()["items"]]
+        assert lore.count("Neo-Tokyo Overview") == lore.count("Neural Implants") == 1
+
+    def test_edited_chapter_keeps_new_body(self):
+        """Test an edit replaces the chapter text and its word count"""
+        session = signed_in_session("TEST_seed")
+        universe_id = f"TEST_edit_{uuid.uuid4().hex[:8]}"
+        chapter = {"universe_id": universe_id, "title": "Draft", "content": "first draft", "chapter_number": 1}
+        story_id = session.post(f"{BASE_URL}/api/stories", json=chapter).json()["_id"]
+
+        chapter["content"] = "the final revised text"
+        assert session.put(f"{BASE_URL}/api/stories/{story_id}", json=chapter).status_code == 200
+        assert requests.get(f"{BASE_URL}/api/stories/{universe_id}/1").json()["content"] == "the final revised text"
+        toc = requests.get(f"{BASE_URL}/api/stories/{universe_id}/toc").json()["items"]
+        assert toc[0]["word_count"] == 4
+
+
+
+class TestStartup:
+    """Blocking migrations, then background warmup"""
+
+    def test_warmup_completes(self):
+        """Test the background warmup steps all finish while the app serves"""
+        deadline = time.time() + 30
+        while True:
+            response = requests.get(f"{BASE_URL}/api/ready")
+            assert response.status_code == 200
+            if not response.json()["warmup_pending"] or time.time() > deadline:
+                break
+            time.sleep(0.5)
+        assert response.json()["warmup_pending"] == []
+
+    @pytest.mark.skipif(not ADMIN_USER["email"], reason="TEST_ADMIN_EMAIL not set")
+    def test_migrations_run_before_ready(self):
+        """Test migrations are timed as a startup step, not left to the warmup"""
+        startup = admin_session().get(f"{BASE_URL}/api/admin/stats").json()["startup"]
+        assert "migrations" in startup["components_ms"]
+        assert startup["warmup_failed"] == []
+
+    @pytest.mark.skipif(not ADMIN_USER["email"], reason="TEST_ADMIN_EMAIL not set")
+    def test_migrations_recorded(self):
+        """Test each migration leaves a marker so later starts skip it"""
+        migrations = admin_session().get(f"{BASE_URL}/api/admin/stats").json()["migrations"]
+        assert {"inline_chapter_bodies", "thread_read_models"} <= set(migrations)
+
+    def test_recorded_migrations_are_skipped(self):
+        """Test a start against a migrated database runs nothing and takes no lease"""
+        from migrations import run_migrations
+
+        class Markers:
+            def find(self, query, projection=None):
+                async def docs():
+                    for name in query["_id"]["$in"]:
+                        yield {"_id": name}
+                return docs()
+
+        async def must_not_run():
+            raise AssertionError("migration ran twice")
+
+        # Only the markers collection exists: any lease or data access would fail
+        db = {"migrations": Markers()}
+        assert asyncio.run(run_migrations(db, [("one", must_not_run), ("two", must_not_run)])) == []
+
+    def test_thread_read_model_fields_stay_internal(self):
+        """Test a new thread reads its replies and lists without read-model fields"""
+        session = signed_in_session("TEST_startup")
+        title = f"TEST startup thread {uuid.uuid4().hex[:8]}"
+        post = session.post(f"{BASE_URL}/api/forum/posts", json={"title": title, "content": "Body", "category": "general"}).json()
+        assert "replies_embedded" not in post
+        session.post(f"{BASE_URL}/api/forum/replies", json={"post_id": post["_id"], "content": "First!"})
+
+        thread = requests.get(f"{BASE_URL}/api/forum/posts/{post['_id']}").json()
+        assert [r["content"] for r in thread["replies"]] == ["First!"]
+        assert "replies_embedded" not in thread
+        listed = next(p for p in requests.get(f"{BASE_URL}/api/forum/posts", params={"limit": 200}).json()["items"] if p["title"] == title)
+        assert "first_replies" not in listed and "replies_embedded" not in listed
+
+
+
+class TestRateLimits:
+    """Token-bucket rate limits and client address resolution"""
+
+    def test_reply_limit_per_user(self):
+        """Test the 31st reply within a minute is refused with Retry-After"""
+        session = signed_in_session("TEST_limit")
+        post_id = session.post(f"{BASE_URL}/api/forum/posts", json={
+            "title": "TEST rate limit", "content": "Body", "category": "general"
+        }).json()["_id"]
+        for i in range(30):
+            response = session.post(f"{BASE_URL}/api/forum/replies", json={"post_id": post_id, "content": f"Reply {i}"})
+            assert response.status_code == 200
+        response = session.post(f"{BASE_URL}/api/forum/replies", json={"post_id": post_id, "content": "One too many"})
+        assert response.status_code == 429
+        assert int(response.headers["Retry-After"]) >= 1
+
+        # Another user has their own bucket
+        other = signed_in_session("TEST_limit")
+        response = other.post(f"{BASE_URL}/api/forum/replies", json={"post_id": post_id, "content": "Still allowed"})
+        assert response.status_code == 200
+
+    @pytest.mark.skipif(not ADMIN_USER["email"], reason="TEST_ADMIN_EMAIL not set")
+    def test_auth_rules_on_by_default(self):
+        """Test signup and login are limited without any RATE_LIMITS setting"""
+        rules = admin_session().get(f"{BASE_URL}/api/admin/stats").json()["rate_limits"]["rules"]
+        assert {"signup", "login", "login_account"} <= set(rules)
+
+    def test_login_limit_per_account(self):
+        """Test repeated failed logins on one account are refused, whatever the address"""
+        email = f"TEST_limit_{uuid.uuid4().hex[:8]}@fictionverse.io"
+        for i in range(10):
+            response = requests.post(f"{BASE_URL}/api/auth/login", json={"email": email, "password": f"guess{i}"},
+                                     headers={"X-Forwarded-For": f"198.51.100.{i}"})
+            assert response.status_code == 401
+        response = requests.post(f"{BASE_URL}/api/auth/login", json={"email": email.upper(), "password": "guess"})
+        assert response.status_code == 429
+        assert int(response.headers["Retry-After"]) >= 1
+
+        # Other accounts are unaffected
+        response = requests.post(f"{BASE_URL}/api/auth/login", json={"email": f"other_{email}", "password": "guess"})
+        assert response.status_code == 401
+
+    def test_forwarded_for_needs_trusted_proxy(self):
+        """Test X-Forwarded-For is only used when the peer is a trusted proxy"""
+        from starlette.requests import Request
+        from rate_limit import client_ip, parse_networks
+
+        def connection(peer, forwarded):
+            return Request({"type": "http", "client": (peer, 1234), "headers": [(b"x-forwarded-for", forwarded.encode())]})
+
+        proxies = parse_networks("10.0.0.0/8, 192.168.1.7")
+        assert client_ip(connection("203.0.113.9", "198.51.100.1"), proxies) == "203.0.113.9"
+        assert client_ip(connection("10.1.2.3", "198.51.100.1"), proxies) == "198.51.100.1"
+        # A spoofed left-most entry is skipped; only our proxies' hops are stripped
+        assert client_ip(connection("10.1.2.3", "1.1.1.1, 198.51.100.1, 192.168.1.7"), proxies) == "198.51.100.1"
+        assert client_ip(connection("10.1.2.3", "1.1.1.1, 198.51.100.1"), ()) == "10.1.2.3"
+
+
+
+class TestSingleFlight:
+    """Identical concurrent reads share one load"""
+
+    def _chapter_counters(self):
+        counts = {}
+        for line in requests.get(f"{BASE_URL}/metrics").text.splitlines():
+            for metric in ("fv_singleflight_loads_total", "fv_singleflight_coalesced_total"):
+                if line.startswith(f'{metric}{{route="chapter"}}'):
+                    counts[metric] = float(line.rsplit(" ", 1)[1])
+        return counts
+
+    def test_concurrent_chapter_reads(self):
+        """Test a burst of reads of a new chapter all get the same chapter"""
+        session = signed_in_session("TEST_flight")
+        universe_id = f"TEST_flight_{uuid.uuid4().hex[:8]}"
+        session.post(f"{BASE_URL}/api/stories", json={
+            "universe_id": universe_id, "title": "Drop", "content": "Fresh chapter " * 500, "chapter_number": 1
+        })
+        before = self._chapter_counters()
+
+        with ThreadPoolExecutor(max_workers=20) as pool:
+            responses = list(pool.map(lambda _: requests.get(f"{BASE_URL}/api/stories/{universe_id}/1"), range(20)))
+        assert all(r.status_code == 200 for r in responses)
+        assert len({r.text for r in responses}) == 1
+
+        after = self._chapter_counters()
+        loads = after.get("fv_singleflight_loads_total", 0) - before.get("fv_singleflight_loads_total", 0)
+        coalesced = after.get("fv_singleflight_coalesced_total", 0) - before.get("fv_singleflight_coalesced_total", 0)
+        # Requests after the load landed are cache hits and skip the single-flight
+        assert 1 <= loads + coalesced <= 20
+
+    def test_concurrent_missing_chapter(self):
+        """Test readers sharing a failed load all get its 404"""
+        universe_id = f"TEST_flight_{uuid.uuid4().hex[:8]}"
+        with ThreadPoolExecutor(max_workers=10) as pool:
+            responses = list(pool.map(lambda _: requests.get(f"{BASE_URL}/api/stories/{universe_id}/1"), range(10)))
+        assert [r.status_code for r in responses] == [404] * 10
+
+    def test_one_load_per_key(self):
+        """Test waiters share the leader's result and error, and a later call loads again"""
+        from single_flight import SingleFlight
+
+        async def scenario():
+            flight = SingleFlight()
+            calls = []
+
+            async def load():
+                calls.append(1)
+                await asyncio.sleep(0.05)
+                return {"title": "Drop"}
+
+            results = await asyncio.gather(*(flight.do(("chapter", "u", 1), load) for _ in range(10)))
+            assert results == [{"title": "Drop"}] * 10
+            assert len(calls) == 1
+            assert flight.stats() == {"in_flight": 0, "loads": {"chapter": 1}, "coalesced": {"chapter": 9}, "forgotten": 0}
+
+            async def fail():
+                await asyncio.sleep(0.01)
+                raise LookupError("missing")
+
+            failures = await asyncio.gather(*(flight.do(("chapter", "u", 2), fail) for _ in range(3)), return_exceptions=True)
+            assert all(isinstance(error, LookupError) for error in failures)
+
+            await flight.do(("chapter", "u", 1), load)
+            assert len(calls) == 2
+
+        asyncio.run(scenario())
+
+    def test_write_during_load_not_served_afterwards(self):
+        """Test callers arriving after an invalidation start a fresh load instead of joining the stale one"""
+        from cache import MemoryCache
+        from single_flight import SingleFlight
+
+        async def scenario():
+            cache, flight = MemoryCache(), SingleFlight()
+            cache.on_invalidate(lambda name: flight.forget(name[1]) if name[0] == "key" else flight.forget_group(name[1]))
+            stored = {"title": "Old"}
+            read, release = asyncio.Event(), asyncio.Event()
+            key = ("chapter", "u", 1)
+
+            async def load():
+                generation = await cache.generation(key)
+                value = dict(stored)
+                read.set()
+                await release.wait()
+                await cache.set(key, value, generation=generation)
+                return value
+
+            early = asyncio.ensure_future(flight.do(key, load))
+            joined = asyncio.ensure_future(flight.do(key, load))
+            await read.wait()
+            # The write lands while the load that read "Old" is still in flight
+            stored["title"] = "New"
+            await cache.delete(key)
+            late = asyncio.ensure_future(flight.do(key, load))
+            release.set()
+
+            assert [r["title"] for r in await asyncio.gather(early, joined)] == ["Old", "Old"]
+            assert (await late)["title"] == "New"
+            assert (await cache.get(key))["title"] == "New"
+            assert flight.stats()["forgotten"] == 1
+            assert flight.stats()["in_flight"] == 0
+
+        asyncio.run(scenario())
+
+
+
+class TestUniverseOverview:
+    """Precomputed universe overview for the detail page"""
+
+    def test_sample_overview(self):
+        """Test the overview carries the universe, chapter index, characters and lore"""
+        response = requests.get(f"{BASE_URL}/api/universes/Neon%20Shadows/overview")
+        assert response.status_code == 200
+        overview = response.json()
+        assert overview["universe"]["title"] == "Neon Shadows"
+        assert [c["chapter_number"] for c in overview["chapters"]][:2] == [1, 2]
+        assert all("content" not in c for c in overview["chapters"])
+        assert overview["counts"]["characters"] >= 2 and overview["counts"]["lore"] >= 2
+        assert response.headers["X-Overview-Version"] == str(overview["version"])
+
+        revalidated = requests.get(f"{BASE_URL}/api/universes/Neon%20Shadows/overview", headers={"If-None-Match": response.headers["ETag"]})
+        assert revalidated.status_code == 304
+
+    def test_missing_universe(self):
+        """Test an unknown universe is a 404 every time"""
+        for _ in range(2):
+            response = requests.get(f"{BASE_URL}/api/universes/TEST_missing_{uuid.uuid4().hex[:8]}/overview")
+            assert response.status_code == 404
+
+    def test_updates_bump_version(self):
+        """Test new characters and chapters appear with a new version and ETag"""
+        session = signed_in_session("TEST_overview")
+        title = f"TEST_overview_{uuid.uuid4().hex[:8]}"
+        assert session.post(f"{BASE_URL}/api/universes", json={
+            "title": title, "description": "Overview test", "type": "Original", "genre": "Fantasy"
+        }).status_code == 200
+        first = requests.get(f"{BASE_URL}/api/universes/{title}/overview")
+        assert first.json()["counts"] == {"chapters": 0, "characters": 0, "lore": 0}
+
+        session.post(f"{BASE_URL}/api/characters", json={"universe_id": title, "name": "Scout", "description": "Looks ahead", "role": "protagonist"})
+        session.post(f"{BASE_URL}/api/stories", json={"universe_id": title, "title": "Opening", "content": "It begins", "chapter_number": 1})
+        second = requests.get(f"{BASE_URL}/api/universes/{title}/overview", headers={"If-None-Match": first.headers["ETag"]})
+        assert second.status_code == 200
+        overview = second.json()
+        assert overview["version"] > first.json()["version"]
+        assert overview["counts"] == {"chapters": 1, "characters": 1, "lore": 0}
+        assert [c["name"] for c in overview["characters"]] == ["Scout"]
+        assert overview["chapters"][0]["word_count"] == 2
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])